@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Open-loop load generation and latency SLO checks for MCP endpoints
+Steps through request rates per server, records HDR latency histograms and finds saturation points
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+from mcp_probes import INITIALIZE_PARAMS, ProbeClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "modal"))
+from mcp_metrics import HdrHistogram  # noqa: E402
+
+SLO_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp_slo.json")
+
+# A step is saturated once achieved throughput falls this far below the offered rate
+THROUGHPUT_SATURATION_RATIO = 0.9
+
+
+def load_slo_config(path: str = SLO_CONFIG_FILE) -> dict:
+    """Per-server settings merged over the config defaults"""
+    with open(path) as f:
+        config = json.load(f)
+    defaults = config.get("defaults", {})
+    return {name: {**defaults, **settings} for name, settings in config.get("servers", {}).items()}
+
+
+def mcp_target(client: ProbeClient, url: str, settings: dict, headers: dict = None):
+    """Request factory issuing one JSON-RPC call per request against an MCP HTTP endpoint"""
+    method = settings.get("method", "initialize")
+    params = settings.get("params", INITIALIZE_PARAMS if method == "initialize" else None)
+
+    async def send(request_id):
+        response = await client.rpc(url, method, params, headers, request_id=request_id)
+        reply = response.json()
+        if response.status >= 400 or not isinstance(reply, dict) or "error" in reply:
+            raise RuntimeError(f"HTTP {response.status}")
+
+    return send
+
+
+def modal_router_target(settings: dict):
+    """Request factory calling the deployed mcp_task_router through the Modal client"""
+    import modal
+    router = modal.Function.from_name(settings.get("app", "mcp-gpu-functions-simple"), "mcp_task_router")
+    task_type = settings.get("task_type", "web_scraping")
+    task_data = settings.get("task_data", {"urls": ["https://example.com"], "extract_type": "title"})
+
+    async def send(request_id):
+        result = await router.remote.aio(task_type, task_data)
+        if not result.get("success"):
+            raise RuntimeError(result.get("error", "router error"))
+
+    return send
+
+
+async def run_step(send, rate: float, duration_s: float, timeout_s: float) -> dict:
+    """
+    Fire requests on a fixed schedule regardless of completions (open loop)
+    Latency is measured from each request's intended start, so queueing behind a
+    saturated server is counted instead of hidden (no coordinated omission)
+    """
+    histogram = HdrHistogram()
+    errors = 0
+    completed = 0
+    interval = 1.0 / rate
+    total = max(1, int(rate * duration_s))
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    async def one(index):
+        nonlocal errors, completed
+        intended = start + index * interval
+        delay = intended - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            await asyncio.wait_for(send(index + 1), timeout_s)
+            completed += 1
+        except Exception:
+            errors += 1
+        histogram.record(int((loop.time() - intended) * 1_000_000))
+
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = loop.time() - start
+    return {
+        "offered_rps": rate,
+        "achieved_rps": round(completed / elapsed, 2) if elapsed else 0,
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4),
+        "p50_ms": histogram.value_at_quantile(0.5) / 1000,
+        "p95_ms": histogram.value_at_quantile(0.95) / 1000,
+        "p99_ms": histogram.value_at_quantile(0.99) / 1000,
+        "max_ms": histogram.max_value / 1000,
+        "histogram": histogram.to_dict()
+    }
+
+
+def evaluate_step(step: dict, settings: dict) -> list:
+    """SLO violations for one rate step"""
+    violations = []
+    if step["p95_ms"] > settings.get("p95_ms", float("inf")):
+        violations.append(f"p95 {step['p95_ms']:.0f}ms > {settings['p95_ms']}ms")
+    if step["p99_ms"] > settings.get("p99_ms", float("inf")):
+        violations.append(f"p99 {step['p99_ms']:.0f}ms > {settings['p99_ms']}ms")
+    if step["error_rate"] > settings.get("max_error_rate", 1.0):
+        violations.append(f"errors {step['error_rate']:.1%} > {settings['max_error_rate']:.1%}")
+    if step["achieved_rps"] < step["offered_rps"] * THROUGHPUT_SATURATION_RATIO:
+        violations.append(f"throughput {step['achieved_rps']}/{step['offered_rps']} rps")
+    return violations
+
+
+async def load_test_server(name: str, send, settings: dict, log=print) -> dict:
+    """
+    Step through configured rates until the SLO breaks
+    The saturation point is the first rate that violates it; the last passing rate is the safe capacity
+    """
+    steps = []
+    saturation_rps = None
+    max_passing_rps = None
+    for rate in settings.get("rates", [1, 5, 10]):
+        step = await run_step(send, rate, settings.get("duration_s", 10), settings.get("timeout_s", 30))
+        step["violations"] = evaluate_step(step, settings)
+        steps.append(step)
+        marker = "✅" if not step["violations"] else "❌"
+        log(f"  {marker} {name:<18} {rate:>7.1f} rps -> {step['achieved_rps']:>7.1f} rps "
+            f"p95={step['p95_ms']:.0f}ms p99={step['p99_ms']:.0f}ms errors={step['error_rate']:.1%}"
+            + (f"  ({'; '.join(step['violations'])})" if step["violations"] else ""))
+        if step["violations"]:
+            saturation_rps = rate
+            break
+        max_passing_rps = rate
+    return {
+        "server": name,
+        "slo": {key: settings.get(key) for key in ("p95_ms", "p99_ms", "max_error_rate")},
+        "slo_met": saturation_rps is None,
+        "max_passing_rps": max_passing_rps,
+        "saturation_rps": saturation_rps,
+        "steps": steps
+    }
+
+
+async def run_load_tests(endpoints: dict, config_path: str = SLO_CONFIG_FILE, servers: list = None,
+                         auth_headers: dict = None, log=print) -> list:
+    """
+    Load-test every configured server concurrently
+    mcp_task_router goes through Modal unless endpoints supplies an HTTP stand-in for it
+    """
+    config = load_slo_config(config_path)
+    selected = [name for name in config if not servers or name in servers]
+    async with ProbeClient(timeout=30, max_idle_per_origin=256) as client:
+        tasks = []
+        for name in selected:
+            settings = config[name]
+            if name in endpoints:
+                send = mcp_target(client, endpoints[name], settings, (auth_headers or {}).get(name))
+            elif name == "mcp_task_router":
+                send = modal_router_target(settings)
+            else:
+                log(f"  ⚠️  No endpoint configured for {name}, skipping")
+                continue
+            tasks.append(load_test_server(name, send, settings, log))
+        return list(await asyncio.gather(*tasks))
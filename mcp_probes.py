@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+In-process MCP endpoint probes
+Pooled asyncio HTTP/1.1 client with DNS/connect/TLS/TTFB timings and MCP initialize handshakes
+"""
+
+import asyncio
+import json
+import socket
+import ssl
+import time
+from urllib.parse import urlsplit
+
+PROTOCOL_VERSION = "2025-03-26"
+CLIENT_INFO = {"name": "mcp-probe", "version": "1.0.0"}
+INITIALIZE_PARAMS = {"protocolVersion": PROTOCOL_VERSION, "capabilities": {}, "clientInfo": CLIENT_INFO}
+
+
+class ProbeResponse:
+    """HTTP response with per-phase timings in milliseconds"""
+
+    def __init__(self, status, headers, body, phases, reused):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.phases = phases
+        self.reused = reused
+
+    def json(self):
+        """Decode a JSON body, or the first data event of a text/event-stream body"""
+        if "text/event-stream" in self.headers.get("content-type", ""):
+            data = [line[5:].strip() for line in self.body.decode(errors="replace").splitlines()
+                    if line.startswith("data:")]
+            return json.loads(data[0]) if data else None
+        return json.loads(self.body or b"null")
+
+
+class _Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class ProbeClient:
+    """
+    Keep-alive connection pool per origin
+    Reused connections report zero DNS/connect/TLS time, which is the point of pooling
+    """
+
+    def __init__(self, timeout: float = 10, max_idle_per_origin: int = 4):
+        self.timeout = timeout
+        self.max_idle_per_origin = max_idle_per_origin
+        self._idle = {}
+        self._ssl_context = ssl.create_default_context()
+
+    async def close(self):
+        for connections in self._idle.values():
+            for connection in connections:
+                connection.close()
+        self._idle.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _open(self, scheme, host, port, phases):
+        loop = asyncio.get_running_loop()
+        t = time.perf_counter()
+        infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        phases["dns"] = (time.perf_counter() - t) * 1000
+        address = infos[0][4][0]
+
+        t = time.perf_counter()
+        reader, writer = await asyncio.open_connection(address, port)
+        phases["connect"] = (time.perf_counter() - t) * 1000
+
+        if scheme == "https":
+            t = time.perf_counter()
+            await writer.start_tls(self._ssl_context, server_hostname=host)
+            phases["tls"] = (time.perf_counter() - t) * 1000
+        return _Connection(reader, writer)
+
+    async def _read_response(self, connection, started, phases):
+        reader = connection.reader
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed before response")
+        phases["ttfb"] = (time.perf_counter() - started) * 1000
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        t = time.perf_counter()
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if "text/event-stream" in headers.get("content-type", ""):
+            # Streams stay open; read the first complete event and retire the connection
+            body = b""
+            while not body.endswith(b"\n\n") and not body.endswith(b"\r\n\r\n"):
+                chunk = await reader.readline()
+                if not chunk:
+                    break
+                body += chunk
+            keep_alive = False
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                body += await reader.readexactly(size)
+                await reader.readline()
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        elif status in (204, 304) or 100 <= status < 200:
+            body = b""
+        else:
+            body = await reader.read()
+            keep_alive = False
+        phases["download"] = (time.perf_counter() - t) * 1000
+        return status, headers, body, keep_alive
+
+    async def request(self, method: str, url: str, headers: dict = None, body: bytes = None) -> ProbeResponse:
+        parts = urlsplit(url)
+        scheme = parts.scheme
+        host = parts.hostname
+        port = parts.port or (443 if scheme == "https" else 80)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        origin = (scheme, host, port)
+
+        request_headers = {"Host": parts.netloc, "User-Agent": "mcp-probe/1.0", "Accept": "*/*",
+                           "Connection": "keep-alive", **(headers or {})}
+        if body is not None:
+            request_headers["Content-Length"] = str(len(body))
+        payload = f"{method} {path} HTTP/1.1\r\n".encode() + b"".join(
+            f"{name}: {value}\r\n".encode() for name, value in request_headers.items()
+        ) + b"\r\n" + (body or b"")
+
+        for attempt in range(2):
+            phases = {"dns": 0.0, "connect": 0.0, "tls": 0.0}
+            idle = self._idle.get(origin)
+            reused = bool(idle) and attempt == 0
+            connection = idle.pop() if reused else await asyncio.wait_for(
+                self._open(scheme, host, port, phases), self.timeout)
+            try:
+                started = time.perf_counter()
+                connection.writer.write(payload)
+                await connection.writer.drain()
+                status, response_headers, response_body, keep_alive = await asyncio.wait_for(
+                    self._read_response(connection, started, phases), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                connection.close()
+                if reused:
+                    # Server closed an idle keep-alive connection; retry once on a fresh one
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+            pool = self._idle.setdefault(origin, [])
+            if keep_alive and len(pool) < self.max_idle_per_origin:
+                pool.append(connection)
+            else:
+                connection.close()
+            return ProbeResponse(status, response_headers, response_body,
+                                 {name: round(ms, 2) for name, ms in phases.items()}, reused)
+        raise ConnectionError(f"Unable to reach {url}")
+
+    async def rpc(self, url: str, method: str, params: dict = None, headers: dict = None,
+                  request_id: int = 1) -> ProbeResponse:
+        """Send one MCP JSON-RPC request over streamable HTTP"""
+        message = {"jsonrpc": "2.0", "id": request_id, "method": method}
+        if params is not None:
+            message["params"] = params
+        return await self.request("POST", url, {
+            "Content-Type": "application/json",
+            "Accept": "application/json, text/event-stream",
+            **(headers or {})
+        }, json.dumps(message).encode())
+
+    async def mcp_initialize(self, url: str, headers: dict = None) -> dict:
+        """
+        Perform an MCP streamable-HTTP initialize handshake
+        Returns protocol health, negotiated version, server info and phase timings
+        """
+        started = time.perf_counter()
+        try:
+            response = await self.rpc(url, "initialize", INITIALIZE_PARAMS, headers)
+        except Exception as e:
+            return {"reachable": False, "protocol_ok": False, "error": str(e) or type(e).__name__,
+                    "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+        outcome = {
+            "reachable": True,
+            "http_status": response.status,
+            "phases": response.phases,
+            "connection_reused": response.reused,
+            "protocol_ok": False
+        }
+        try:
+            reply = response.json()
+        except ValueError:
+            reply = None
+        result = reply.get("result") if isinstance(reply, dict) else None
+        if result and "protocolVersion" in result:
+            outcome.update({
+                "protocol_ok": True,
+                "protocol_version": result["protocolVersion"],
+                "server_info": result.get("serverInfo", {})
+            })
+            session_headers = {
+                "Content-Type": "application/json",
+                "Accept": "application/json, text/event-stream",
+                **(headers or {})
+            }
+            if "mcp-session-id" in response.headers:
+                session_headers["Mcp-Session-Id"] = response.headers["mcp-session-id"]
+            try:
+                await self.request("POST", url, session_headers, json.dumps(
+                    {"jsonrpc": "2.0", "method": "notifications/initialized"}).encode())
+            except Exception:
+                pass
+        else:
+            outcome["error"] = (reply or {}).get("error", {}).get("message") if isinstance(reply, dict) \
+                else f"Non-MCP response (HTTP {response.status})"
+        outcome["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return outcome
+
+
+async def modal_app_deployed(app_name: str) -> dict:
+    """Check a deployed Modal app through the Python client instead of `modal app list`"""
+    started = time.perf_counter()
+    try:
+        import modal
+        from modal.exception import NotFoundError
+    except ImportError:
+        return {"deployed": False, "error": "modal package not installed"}
+    try:
+        await asyncio.to_thread(modal.App.lookup, app_name, create_if_missing=False)
+        deployed, error = True, None
+    except NotFoundError:
+        deployed, error = False, f"App {app_name} not found"
+    except Exception as e:
+        deployed, error = False, str(e)
+    outcome = {"deployed": deployed, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+    if error:
+        outcome["error"] = error
+    return outcome
+
+
+if __name__ == "__main__":
+    import sys
+
+    async def _main(urls):
+        async with ProbeClient() as client:
+            for url in urls:
+                print(json.dumps({"url": url, **await client.mcp_initialize(url)}, indent=2))
+
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the external MCP endpoints used by test_all_mcp_servers.py
+Runs mock streamable-HTTP MCP servers and a stub CLI so the suite can run offline
+"""
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SERVER_INFO = {"name": "mock-mcp", "version": "1.0.0"}
+PROTOCOL_VERSION = "2025-03-26"
+
+# Output the stub CLI prints in place of each external command
+CLI_OUTPUT = {
+    "n8n": "Usage: n8n-mcp [options]\n",
+    "pythonanywhere": "usage: pythonanywhere-mcp-server [-h] [--version]\n",
+    "browser-use": "Usage: mcp-server-browser-use [OPTIONS]\n"
+}
+
+
+class MockMCPHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET with 200 and JSON-RPC POSTs with minimal MCP responses
+    service_time_ms and capacity model a server that saturates under load
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; avoid Nagle/delayed-ACK stalls on keep-alive
+    disable_nagle_algorithm = True
+    service_time_ms = 0
+    capacity = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._send_json(200, {"server": SERVER_INFO, "transport": "streamable-http"})
+
+    def do_POST(self):
+        if self.capacity is not None:
+            with self.capacity:
+                self._serve_rpc()
+        else:
+            self._serve_rpc()
+
+    def _serve_rpc(self):
+        if self.service_time_ms:
+            time.sleep(self.service_time_ms / 1000)
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            message = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"jsonrpc": "2.0", "error": {"code": -32700, "message": "Parse error"}})
+            return
+        method = message.get("method")
+        if method == "initialize":
+            result = {
+                "protocolVersion": PROTOCOL_VERSION,
+                "capabilities": {"tools": {}},
+                "serverInfo": SERVER_INFO
+            }
+        elif method == "tools/list":
+            result = {"tools": [{"name": "say_hello", "inputSchema": {"type": "object"}}]}
+        elif method == "ping":
+            result = {}
+        elif method == "tools/call":
+            result = {"content": [{"type": "text", "text": "ok"}], "isError": False}
+        else:
+            self._send_json(200, {"jsonrpc": "2.0", "id": message.get("id"),
+                                  "error": {"code": -32601, "message": f"Method not found: {method}"}})
+            return
+        self._send_json(200, {"jsonrpc": "2.0", "id": message.get("id"), "result": result})
+
+
+class MockMCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Deep accept backlog so load tests measure queueing, not connection refusals
+    request_queue_size = 512
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0, handler=MockMCPHandler,
+                      service_time_ms: float = 0, capacity: int = None):
+    """
+    Start a mock MCP server on a background thread and return (server, url)
+    capacity limits concurrently served requests, so throughput tops out near
+    capacity / service_time and latency climbs past that point
+    """
+    if service_time_ms or capacity:
+        handler = type("LimitedMockMCPHandler", (handler,), {
+            "service_time_ms": service_time_ms,
+            "capacity": threading.BoundedSemaphore(capacity) if capacity else None
+        })
+    server = MockMCPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/mcp"
+
+
+def offline_stand_ins(service_time_ms: float = 0, capacity: int = None) -> dict:
+    """
+    Start mock servers for every HTTP endpoint (including a stand-in for mcp_task_router),
+    point every command at the stub CLI and list both Modal apps
+    """
+    cli = f"{sys.executable} {__file__} cli"
+    _, render_url = start_mock_server(service_time_ms=service_time_ms, capacity=capacity)
+    _, smithery_url = start_mock_server(service_time_ms=service_time_ms, capacity=capacity)
+    _, router_url = start_mock_server(service_time_ms=service_time_ms, capacity=capacity)
+    return {
+        "endpoints": {"render": render_url, "smithery": smithery_url, "mcp_task_router": router_url},
+        "commands": {
+            "n8n": f"{cli} n8n",
+            "pythonanywhere": f"{cli} pythonanywhere",
+            "browser-use": f"{cli} browser-use"
+        },
+        "modal_apps": ["mcp-gpu-functions", "mcp-gpu-functions-simple"]
+    }
+
+
+def main():
+    if len(sys.argv) >= 3 and sys.argv[1] == "cli":
+        sys.stdout.write(CLI_OUTPUT.get(sys.argv[2], ""))
+        return
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    service_time_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+    capacity = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    server, url = start_mock_server(port=port, service_time_ms=service_time_ms, capacity=capacity)
+    print(f"Mock MCP server listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Serialization benchmark for MCP results
+Compares the loose dict results (pickle, as Modal ships them, and JSON, as the MCP
+boundary does) against the typed MessagePack wire formats from mcp_schemas, plain and
+interned + zstd-compressed (with and without a trained dictionary). End-to-end time is
+encode + transfer at --mbps + decode
+
+Usage:
+  python modal/bench_serialization.py                 # 1,000-URL comprehensive analysis
+  python modal/bench_serialization.py --urls 10000 --repeat 5 --mbps 1000
+"""
+
+import argparse
+import json
+import pickle
+import random
+import time
+
+from mcp_schemas import UrlAnalysisResult, pack_result, train_dictionary, unpack_result
+
+# A typical response header set (CDN-fronted page), as dict(response.headers) returned it
+SAMPLE_HEADERS = {
+    "Content-Type": "text/html; charset=utf-8",
+    "Content-Encoding": "gzip",
+    "Cache-Control": "public, max-age=0, must-revalidate",
+    "Date": "Mon, 06 Jan 2025 12:00:00 GMT",
+    "Server": "cloudflare",
+    "Vary": "Accept-Encoding",
+    "ETag": 'W/"5f3c-1a2b3c4d5e6f"',
+    "Last-Modified": "Sun, 05 Jan 2025 08:30:00 GMT",
+    "Strict-Transport-Security": "max-age=31536000; includeSubDomains; preload",
+    "X-Frame-Options": "SAMEORIGIN",
+    "X-Content-Type-Options": "nosniff",
+    "Referrer-Policy": "strict-origin-when-cross-origin",
+    "Permissions-Policy": "geolocation=(), microphone=(), camera=()",
+    "Content-Security-Policy": "default-src 'self'; script-src 'self' https://cdn.example.com; img-src *",
+    "Set-Cookie": "session=abcdef0123456789; Path=/; HttpOnly; Secure; SameSite=Lax",
+    "CF-Cache-Status": "DYNAMIC",
+    "CF-RAY": "8fd2c1a2b3c4d5e6-IAD",
+    "Report-To": '{"endpoints":[{"url":"https://a.nel.cloudflare.com/report/v4?s=abc"}],"group":"cf-nel"}',
+    "NEL": '{"success_fraction":0,"report_to":"cf-nel","max_age":604800}',
+    "Alt-Svc": 'h3=":443"; ma=86400',
+    "Transfer-Encoding": "chunked",
+    "Connection": "keep-alive"
+}
+
+
+def fresh_headers(i: int) -> dict:
+    """
+    Per-response header dict with its own string objects (as parsed off the wire), so
+    pickle's memo cannot share them across URLs; per-request values vary
+    """
+    headers = {k.encode().decode(): v.encode().decode() for k, v in SAMPLE_HEADERS.items()}
+    headers["Date"] = f"Mon, 06 Jan 2025 12:{i // 60 % 60:02d}:{i % 60:02d} GMT"
+    headers["CF-RAY"] = f"8fd2c1a2{i:08x}-IAD"
+    headers["ETag"] = f'W/"{i:x}-1a2b3c4d5e6f"'
+    headers["Set-Cookie"] = f"session={i:016x}; Path=/; HttpOnly; Secure; SameSite=Lax"
+    return headers
+
+
+def sample_result(n: int, offset: int = 0, seed: int = 42) -> dict:
+    """parallel_url_analysis-shaped comprehensive result for n URLs"""
+    rng = random.Random(seed)
+    results = []
+    for i in range(offset, offset + n):
+        results.append({
+            "url": f"https://site{i % 97}.example.com/section/{i}/article-title-{i}",
+            "status_code": 200,
+            "load_time": round(rng.uniform(0.05, 2.0), 3),
+            "content_length": rng.randint(5000, 400000),
+            "title": f"Article {i} - Example Site {i % 97}",
+            "meta_description": f"Example page {i} used to benchmark result serialization across the MCP boundary",
+            "links_count": rng.randint(20, 400),
+            "images_count": rng.randint(0, 80),
+            "forms_count": rng.randint(0, 3),
+            "scripts_count": rng.randint(2, 40),
+            "text_length": rng.randint(1000, 60000),
+            "headings": {"h1": 1, "h2": rng.randint(0, 12), "h3": rng.randint(0, 30)},
+            "external_links": rng.randint(0, 60),
+            "has_ssl": True,
+            "response_headers": {k.lower(): v for k, v in fresh_headers(i).items()},
+            "success": True
+        })
+    return {
+        "success": True,
+        "analysis_type": "comprehensive",
+        "aggregated_stats": {"total_urls": n, "successful_analyses": n, "failed_analyses": 0},
+        "link_graph": None,
+        "detailed_results": results,
+        "processing_info": {"gpu_used": "A10G", "parallel_processing": True, "timestamp": time.time()}
+    }
+
+
+def timed(fn, repeat: int) -> float:
+    """Best-of-repeat milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def measure(name, encode, decode, repeat: int, mbps: float) -> tuple:
+    payload = encode()
+    size = len(payload)
+    encode_ms = timed(encode, repeat)
+    decode_ms = timed(lambda: decode(payload), repeat)
+    transfer_ms = size * 8 / (mbps * 1e6) * 1000
+    return name, size, encode_ms, decode_ms, encode_ms + transfer_ms + decode_ms
+
+
+def print_rows(title: str, rows: list, mbps: float):
+    print(title)
+    print(f"{'format':<28}{'bytes':>12}{'encode ms':>12}{'decode ms':>12}{f'e2e ms @{mbps:g}Mb/s':>20}")
+    for name, size, encode_ms, decode_ms, e2e_ms in rows:
+        print(f"{name:<28}{size:>12,}{encode_ms:>12.2f}{decode_ms:>12.2f}{e2e_ms:>20.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MCP result serialization formats")
+    parser.add_argument("--urls", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--mbps", type=float, default=100.0, help="Link bandwidth for the end-to-end estimate")
+    parser.add_argument("--small-urls", type=int, default=10, help="Result size for the dictionary comparison")
+    args = parser.parse_args()
+
+    full = sample_result(args.urls)
+    # Dictionary trained on other (differently seeded) small results, as it would be in production
+    dictionary = train_dictionary(
+        [sample_result(args.small_urls, offset=i * args.small_urls, seed=i) for i in range(200)],
+        UrlAnalysisResult
+    )
+
+    def formats(result):
+        return [
+            measure("dict + pickle (current)", lambda: pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL),
+                    pickle.loads, args.repeat, args.mbps),
+            measure("dict + JSON", lambda: json.dumps(result).encode(), json.loads, args.repeat, args.mbps),
+            measure("typed msgpack", lambda: pack_result(result, UrlAnalysisResult, "msgpack"),
+                    lambda p: unpack_result(p, UrlAnalysisResult), args.repeat, args.mbps),
+            measure("msgpack+zstd", lambda: pack_result(result, UrlAnalysisResult, "msgpack+zstd"),
+                    lambda p: unpack_result(p, UrlAnalysisResult), args.repeat, args.mbps),
+            measure("msgpack+zstd + dictionary",
+                    lambda: pack_result(result, UrlAnalysisResult, "msgpack+zstd", dictionary=dictionary),
+                    lambda p: unpack_result(p, UrlAnalysisResult, dictionary=dictionary), args.repeat, args.mbps)
+        ]
+
+    rows = formats(full)
+    print_rows(f"📦 Serialization of a {args.urls}-URL comprehensive analysis result", rows, args.mbps)
+    print(f"✅ msgpack+zstd is {rows[3][1] / rows[0][1]:.1%} of the pickled size, "
+          f"end-to-end {rows[0][4] / rows[3][4]:.1f}x faster")
+
+    small_rows = formats(sample_result(args.small_urls, offset=10 ** 6, seed=7))
+    print()
+    print_rows(f"📦 {args.small_urls}-URL result (where the shared dictionary matters)", small_rows, args.mbps)
+    print(f"✅ dictionary shrinks it a further {1 - small_rows[4][1] / small_rows[3][1]:.0%} over plain zstd")
+
+
+if __name__ == "__main__":
+    main()
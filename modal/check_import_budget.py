@@ -0,0 +1,272 @@
+"""
+Import-time budget check for MCP Modal functions
+Measures `python -X importtime` for each function's entry path (the app module's
+module-level imports plus the function body's imports) and fails on regressions,
+on functions without a budget entry and on entry paths that no longer import
+Local and in-image measurements are budgeted separately; a local run skips entry
+paths whose third-party packages are only installed in the images
+
+Usage:
+  python modal/check_import_budget.py              # measure locally, compare with import_budget.json
+  python modal/check_import_budget.py --update     # record local measurements as the local budget
+  python modal/check_import_budget.py --in-image   # measure inside each function's Modal image
+  python modal/check_import_budget.py --in-image --update   # record in-image measurements as the image budget
+"""
+
+import argparse
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+MODAL_DIR = os.path.dirname(os.path.abspath(__file__))
+BUDGET_FILE = os.path.join(MODAL_DIR, "import_budget.json")
+APP_MODULES = ["mcp_gpu_functions", "mcp_gpu_functions_simple"]
+
+# Allowed slack over the recorded budget before the check fails; the absolute
+# allowance keeps fast entry paths from flapping on interpreter noise
+DEFAULT_TOLERANCE = 0.25
+ABSOLUTE_SLACK_MS = 20
+# Developer machines and CI runners are shared and noisier than a dedicated container
+LOCAL_TOLERANCE = 0.5
+
+# Package set of the former monolithic gpu_image, kept only as the comparison baseline
+MONOLITHIC_PACKAGES = [
+    "playwright", "browser-use", "torch", "transformers", "opencv-python-headless",
+    "pillow", "numpy", "requests", "beautifulsoup4", "selenium"
+]
+
+
+def missing_package(error: str):
+    """Top-level package named by a ModuleNotFoundError message when it is not one of the helper modules"""
+    match = re.search(r"No module named '([^']+)'", error)
+    if not match:
+        return None
+    package = match.group(1).split(".")[0]
+    return None if os.path.exists(os.path.join(MODAL_DIR, f"{package}.py")) else package
+
+
+def _imported_modules(nodes) -> list:
+    imports = []
+    for node in nodes:
+        for child in ast.walk(node):
+            if isinstance(child, ast.Import):
+                imports += [alias.name for alias in child.names]
+            elif isinstance(child, ast.ImportFrom) and child.module and child.level == 0:
+                imports.append(child.module)
+    return imports
+
+
+def discover_functions():
+    """
+    Statically find every @app.function / @app.cls in the app modules with its image
+    variable and its entry path: the app module's module-level imports (run by every
+    container on start) plus the modules the function or class body imports
+    """
+    functions = []
+    for module_name in APP_MODULES:
+        with open(os.path.join(MODAL_DIR, f"{module_name}.py")) as f:
+            tree = ast.parse(f.read())
+        module_imports = _imported_modules(
+            node for node in tree.body if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+        )
+        for node in tree.body:
+            if not isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+                continue
+            image = None
+            for decorator in node.decorator_list:
+                if isinstance(decorator, ast.Call) and getattr(decorator.func, "attr", None) in ("function", "cls"):
+                    for keyword in decorator.keywords:
+                        if keyword.arg == "image" and isinstance(keyword.value, ast.Name):
+                            image = keyword.value.id
+            if image is None:
+                continue
+            functions.append({
+                "key": f"{module_name}.{node.name}",
+                "module": module_name,
+                "function": node.name,
+                "image": image,
+                "imports": sorted(set(module_imports + _imported_modules([node])))
+            })
+    return functions
+
+
+def parse_importtime(stderr: str) -> float:
+    """Sum cumulative microseconds of top-level imports from -X importtime output"""
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented under their parent; only count top-level entries
+        if not name.startswith("  ") and name.strip():
+            total_us += int(cumulative.strip())
+    return total_us / 1000
+
+
+def _importtime_ms(code: str, cwd: str):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=cwd
+    )
+    if result.returncode != 0:
+        raise ImportError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    return parse_importtime(result.stderr)
+
+
+def measure_imports(modules: list, cwd: str = MODAL_DIR, repeat: int = 3) -> dict:
+    """
+    Import-time for a list of modules in fresh interpreters, best of `repeat` runs
+    (interpreter startup imports are measured separately and subtracted)
+    """
+    code = "; ".join(f"import {name}" for name in modules) or "pass"
+    try:
+        measured = min(_importtime_ms(code, cwd) for _ in range(repeat))
+        baseline = min(_importtime_ms("pass", cwd) for _ in range(repeat))
+    except ImportError as e:
+        return {"ok": False, "error": str(e)}
+    return {"ok": True, "import_ms": round(max(0.0, measured - baseline), 2)}
+
+
+def site_packages_mb() -> float:
+    """Installed package footprint of the current interpreter"""
+    import site
+    total = 0
+    for root_dir in site.getsitepackages():
+        for root, _, files in os.walk(root_dir):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+    return round(total / 1e6, 1)
+
+
+def measure_in_images(functions: list) -> dict:
+    """
+    Run the measurement inside each function's Modal image
+    Reports import time, image site-packages size and observed cold start per function,
+    plus the same numbers for the former monolithic image as a baseline
+    """
+    import modal
+    sys.path.insert(0, MODAL_DIR)
+    import importlib
+    import mcp_images
+
+    app = modal.App("mcp-import-budget-check")
+
+    def probe(modules: list) -> dict:
+        return {**measure_imports(modules, cwd="/root"), "image_mb": site_packages_mb()}
+
+    images = {}
+    for fn in functions:
+        module = importlib.import_module(fn["module"])
+        images.setdefault(fn["image"], getattr(module, fn["image"]))
+    monolithic = mcp_images.with_local_sources(
+        modal.Image.debian_slim(python_version="3.11").pip_install(MONOLITHIC_PACKAGES)
+    )
+    images["monolithic"] = monolithic
+
+    probes = {
+        name: app.function(image=image, name=f"probe_{name}", serialized=True, timeout=600)(probe)
+        for name, image in images.items()
+    }
+
+    results = {}
+    with modal.enable_output(), app.run():
+        # First call per image pays the cold start; later calls reuse the warm container
+        cold_start_ms = {}
+        for name, fn_probe in probes.items():
+            called = time.time()
+            fn_probe.remote([])
+            cold_start_ms[name] = round((time.time() - called) * 1000, 1)
+        for fn in functions:
+            for image_name, slot in ((fn["image"], "image"), ("monolithic", "monolithic")):
+                measured = probes[image_name].remote(fn["imports"])
+                measured["cold_start_ms"] = cold_start_ms[image_name]
+                results.setdefault(fn["key"], {})[slot] = measured
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time budget check for MCP Modal functions")
+    parser.add_argument("--in-image", action="store_true", help="Measure inside each function's Modal image")
+    parser.add_argument("--update", action="store_true", help="Write current measurements to the budget file")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help=f"Allowed regression over budget (default {DEFAULT_TOLERANCE:.0%} in-image, "
+                             f"{LOCAL_TOLERANCE:.0%} locally)")
+    args = parser.parse_args(argv)
+    if args.tolerance is None:
+        args.tolerance = DEFAULT_TOLERANCE if args.in_image else LOCAL_TOLERANCE
+
+    functions = discover_functions()
+    section = "in_image" if args.in_image else "local"
+    budgets = {}
+    if os.path.exists(BUDGET_FILE):
+        with open(BUDGET_FILE) as f:
+            budgets = json.load(f)
+    budget = budgets.get(section, {})
+    if not budget and not args.update:
+        flag = " --in-image" if args.in_image else ""
+        print(f"❌ No {section} budget in {BUDGET_FILE}; record one with{flag} --update")
+        return 1
+
+    if args.in_image:
+        measurements = measure_in_images(functions)
+    else:
+        measurements = {fn["key"]: {"image": measure_imports(fn["imports"])} for fn in functions}
+
+    print("⏱️  Import-time budget check")
+    print("=" * 60)
+    failures = 0
+    new_budget = {}
+    for fn in functions:
+        measured = measurements[fn["key"]]["image"]
+        key = fn["key"]
+        if key in budget:
+            new_budget[key] = budget[key]
+        if not measured["ok"] and not args.in_image and missing_package(measured["error"]):
+            # Only the function's image installs this package; the in-image check covers it
+            print(f"⏭️  {key:<50} skipped locally: {missing_package(measured['error'])} not installed")
+            continue
+        if not measured["ok"]:
+            # An entry path that cannot be imported cannot be vouched for
+            failures += 1
+            print(f"❌ {key:<50} import failed: {measured['error']}")
+            continue
+        limit = budget.get(key, {}).get("import_ms")
+        line = f"{key:<50} {measured['import_ms']:>8.1f} ms"
+        if limit is None:
+            failures += 1
+            print(f"❌ {line}  NO BUDGET")
+        elif measured["import_ms"] > limit * (1 + args.tolerance) + ABSOLUTE_SLACK_MS:
+            failures += 1
+            print(f"❌ {line} (budget {limit:.1f} ms)  REGRESSION")
+        else:
+            print(f"✅ {line} (budget {limit:.1f} ms)")
+        baseline = measurements[fn["key"]].get("monolithic")
+        if baseline and baseline.get("ok"):
+            print(f"     image {measured['image_mb']:.0f} MB vs monolithic {baseline['image_mb']:.0f} MB, "
+                  f"cold start {measured['cold_start_ms']:.0f} ms vs {baseline['cold_start_ms']:.0f} ms")
+        new_budget[key] = {"import_ms": measured["import_ms"], "image": fn["image"], "imports": fn["imports"]}
+
+    if args.update:
+        budgets[section] = new_budget
+        with open(BUDGET_FILE, "w") as f:
+            json.dump(budgets, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"💾 {section} budget written to {BUDGET_FILE}")
+        return 0
+
+    if failures:
+        print(f"\n❌ {failures} function(s) failed the import-time budget check")
+        return 1
+    print("\n✅ All functions within import-time budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
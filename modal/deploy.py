@@ -1,91 +1,368 @@
 """
 Modal Deployment Script for MCP GPU Functions
 Deploys GPU-accelerated browser automation to Modal Labs
+
+Each function is fingerprinted from its source, decorator config, image definition and the
+helper modules shipped with it. Fingerprints of the last deploy are kept on Modal (the
+mcp-deploy-manifest Dict) and the deploy is tagged with them; an app is only skipped when
+its live deployment still carries that tag, so deploys by others or a plain `modal deploy`
+are never mistaken for the recorded one. Changed apps are redeployed concurrently and
+their changed functions pre-warmed afterwards.
+
+Usage:
+  python modal/deploy.py            # deploy what changed
+  python modal/deploy.py --dry-run  # print the diff only
+  python modal/deploy.py --force    # redeploy every app
 """
 
-import modal
+import argparse
+import ast
+import hashlib
+import json
 import os
+import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-def deploy_mcp_functions():
-    """Deploy MCP GPU functions to Modal"""
-    
-    print("🚀 Deploying MCP GPU functions to Modal Labs...")
-    
-    # Import the app
+MODAL_DIR = os.path.dirname(os.path.abspath(__file__))
+# Shared deploy record: app name -> {"tag", "fingerprints", "deployed_at"}
+MANIFEST_DICT_NAME = "mcp-deploy-manifest"
+
+# Deployed app name -> module defining it
+APPS = {
+    "mcp-gpu-functions": "mcp_gpu_functions",
+    "mcp-gpu-functions-simple": "mcp_gpu_functions_simple"
+}
+
+# How long to wait for a pre-warmed container to come up
+PREWARM_TIMEOUT = 180
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+def _sha256(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+def _segment(source, node):
+    """Source of a node including its decorators"""
+    lines = source.splitlines()
+    start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+    return "\n".join(lines[start - 1:node.end_lineno])
+
+def _is_modal_decorated(node):
+    for decorator in node.decorator_list:
+        target = decorator.func if isinstance(decorator, ast.Call) else decorator
+        if getattr(target, "attr", None) in ("function", "cls"):
+            return True
+    return False
+
+def _image_name(node):
+    for decorator in node.decorator_list:
+        if isinstance(decorator, ast.Call):
+            for keyword in decorator.keywords:
+                if keyword.arg == "image" and isinstance(keyword.value, ast.Name):
+                    return keyword.value.id
+    return None
+
+def helper_sources_hash():
+    """Hash of mcp_images.py plus every helper module it ships into the images"""
+    images_source = _read(os.path.join(MODAL_DIR, "mcp_images.py"))
+    local_modules = []
+    for node in ast.parse(images_source).body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == "LOCAL_MODULES" for t in node.targets):
+            local_modules = list(ast.literal_eval(node.value))
+    sources = [images_source]
+    for name in sorted(local_modules):
+        path = os.path.join(MODAL_DIR, f"{name}.py")
+        sources.append(_read(path) if os.path.exists(path) else "")
+    return _sha256(*sources)
+
+def fingerprint_app(module_name, helpers_hash=None):
+    """
+    Per-function content hashes for one app module
+    A hash covers the function (with decorator config), its image assignment,
+    module-level code shared by every function and the shipped helper modules
+    """
+    source = _read(os.path.join(MODAL_DIR, f"{module_name}.py"))
+    tree = ast.parse(source)
+    helpers_hash = helpers_hash or helper_sources_hash()
+
+    assignments = {}
+    shared = []
+    entries = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)) and _is_modal_decorated(node):
+            entries.append(node)
+        elif isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            assignments[node.targets[0].id] = _segment(source, node)
+            if not node.targets[0].id.endswith("_image"):
+                shared.append(assignments[node.targets[0].id])
+        elif isinstance(node, ast.If):
+            continue  # __main__ block does not affect the deployed app
+        else:
+            shared.append(_segment(source, node))
+
+    shared_hash = _sha256(*shared)
+    return {
+        node.name: _sha256(_segment(source, node), assignments.get(_image_name(node), ""), shared_hash, helpers_hash)
+        for node in entries
+    }
+
+def modal_classes(module_name):
+    """Names of the @app.cls classes in an app module (pre-warmed through modal.Cls)"""
+    tree = ast.parse(_read(os.path.join(MODAL_DIR, f"{module_name}.py")))
+    return {node.name for node in tree.body if isinstance(node, ast.ClassDef) and _is_modal_decorated(node)}
+
+def deploy_tag(fingerprints):
+    """Version tag for a deploy: one hash over every function fingerprint of the app"""
+    return "fp-" + _sha256(*(f"{name}={value}" for name, value in sorted(fingerprints.items())))
+
+def _manifest_store():
+    import modal
+    return modal.Dict.from_name(MANIFEST_DICT_NAME, create_if_missing=True)
+
+def load_manifest():
+    """Deploy records from Modal; empty (everything counts as changed) when unreachable"""
     try:
-        from mcp_gpu_functions import app
-        print("✅ MCP GPU functions app loaded successfully")
-    except ImportError as e:
-        print(f"❌ Failed to import MCP GPU functions: {e}")
-        return False
-    
+        store = _manifest_store()
+        return {app_name: store.get(app_name) or {} for app_name in APPS}
+    except Exception as e:
+        print(f"⚠️  Deploy manifest unavailable ({e}); treating every function as changed")
+        return {}
+
+def save_manifest_entry(app_name, fingerprints):
+    try:
+        _manifest_store()[app_name] = {
+            "tag": deploy_tag(fingerprints),
+            "fingerprints": fingerprints,
+            "deployed_at": time.time()
+        }
+    except Exception as e:
+        print(f"⚠️  Could not record the deploy of {app_name}: {e}")
+
+def live_deploy_tag(app_name):
+    """Tag of the app's current deployment (None if undeployed, untagged or unreadable)"""
+    try:
+        result = subprocess.run(["modal", "app", "history", app_name, "--json"],
+                                capture_output=True, text=True, timeout=60)
+        versions = json.loads(result.stdout) if result.returncode == 0 else []
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return None
+    if not versions:
+        return None
+    latest = max(versions, key=lambda row: int(str(row.get("version", "v0")).lstrip("v") or 0))
+    return latest.get("tag") or None
+
+def diff_apps(manifest, force=False, verify=True):
+    """
+    Compare current fingerprints with the last recorded deploy
+    With verify, an app whose live deployment does not carry the recorded tag is
+    redeployed even if nothing changed here (someone else deployed it since)
+    """
+    helpers_hash = helper_sources_hash()
+    plan = {}
+    for app_name, module_name in APPS.items():
+        current = fingerprint_app(module_name, helpers_hash)
+        record = manifest.get(app_name) or {}
+        previous = record.get("fingerprints", {})
+        changes = {
+            "added": sorted(set(current) - set(previous)),
+            "removed": sorted(set(previous) - set(current)),
+            "changed": sorted(name for name in current if name in previous and current[name] != previous[name]),
+            "unchanged": sorted(name for name in current if previous.get(name) == current[name])
+        }
+        needs_deploy = force or bool(changes["added"] or changes["removed"] or changes["changed"])
+        drifted = False
+        if not needs_deploy and verify:
+            drifted = live_deploy_tag(app_name) != record.get("tag")
+            if drifted:
+                # The live app is not the recorded deploy, so every function may differ from here
+                changes["changed"], changes["unchanged"] = changes["unchanged"], []
+                needs_deploy = True
+        plan[app_name] = {"module": module_name, "fingerprints": current, "changes": changes,
+                          "deploy": needs_deploy, "drifted": drifted, "classes": modal_classes(module_name)}
+    return plan
+
+def print_plan(plan):
+    print("\n📋 Deployment plan:")
+    for app_name, entry in plan.items():
+        changes = entry["changes"]
+        status = "skip (unchanged)"
+        if entry["deploy"]:
+            status = "deploy (live deployment differs from the recorded one)" if entry["drifted"] else "deploy"
+        print(f"  📦 {app_name}: {status}")
+        for name in changes["added"]:
+            print(f"     + {name}")
+        for name in changes["changed"]:
+            print(f"     ~ {name}")
+        for name in changes["removed"]:
+            print(f"     - {name}")
+        if changes["unchanged"]:
+            print(f"     = {len(changes['unchanged'])} unchanged")
+
+def deploy_app(app_name, module_name, tag=""):
+    """Import and deploy one app; returns (app_name, success, seconds, error)"""
+    started = time.time()
+    try:
+        module = __import__(module_name)
+        module.app.deploy(name=app_name, tag=tag)
+        return app_name, True, time.time() - started, None
+    except Exception as e:
+        return app_name, False, time.time() - started, str(e)
+
+def prewarm_function(app_name, function_name, is_class=False):
+    """
+    Bring one container up for a freshly deployed function or class, then hand scaling back
+    The container idles until its scaledown window, so the next real call is warm
+    """
+    import modal
+
+    started = time.time()
     try:
-        # Deploy the app
-        print("📡 Deploying to Modal...")
-        app.deploy("mcp-gpu-functions")
-        print("✅ Successfully deployed MCP GPU functions!")
-        
+        if is_class:
+            # Autoscaling is set on an instance; stats come from the class's service function
+            target = modal.Cls.from_name(app_name, function_name)()
+            stats = modal.Function.from_name(app_name, f"{function_name}.*")
+        else:
+            target = stats = modal.Function.from_name(app_name, function_name)
+        target.update_autoscaler(min_containers=1)
+        try:
+            while time.time() - started < PREWARM_TIMEOUT:
+                if stats.get_current_stats().num_total_runners > 0:
+                    return function_name, True, time.time() - started
+                time.sleep(2)
+            return function_name, False, time.time() - started
+        finally:
+            target.update_autoscaler(min_containers=0)
+    except Exception:
+        return function_name, False, time.time() - started
+
+def deploy_mcp_functions(force=False, dry_run=False, prewarm=True):
+    """Deploy MCP GPU functions to Modal, skipping apps whose functions are unchanged"""
+
+    print("🚀 Deploying MCP GPU functions to Modal Labs...")
+
+    manifest = load_manifest()
+    plan = diff_apps(manifest, force=force, verify=not force)
+    print_plan(plan)
+
+    to_deploy = [app_name for app_name, entry in plan.items() if entry["deploy"]]
+    if dry_run:
+        print("\n🔎 Dry run: nothing deployed")
+        return True
+    if not to_deploy:
+        print("\n✅ Everything up to date, nothing to deploy")
+        return True
+
+    # Deploy the apps concurrently
+    print(f"\n📡 Deploying {', '.join(to_deploy)}...")
+    with ThreadPoolExecutor(max_workers=len(to_deploy)) as executor:
+        outcomes = list(executor.map(
+            lambda name: deploy_app(name, plan[name]["module"], deploy_tag(plan[name]["fingerprints"])), to_deploy
+        ))
+
+    success = True
+    for app_name, ok, seconds, error in outcomes:
+        if ok:
+            print(f"✅ {app_name} deployed in {seconds:.1f}s")
+            save_manifest_entry(app_name, plan[app_name]["fingerprints"])
+        else:
+            print(f"❌ Deployment of {app_name} failed: {error}")
+            success = False
+
+    if prewarm:
+        targets = [
+            (app_name, name, name in plan[app_name]["classes"])
+            for app_name, ok, _, _ in outcomes if ok
+            for name in plan[app_name]["changes"]["added"] + plan[app_name]["changes"]["changed"]
+        ]
+        if targets:
+            print(f"\n🔥 Pre-warming {len(targets)} changed function(s)...")
+            with ThreadPoolExecutor(max_workers=min(len(targets), 8)) as executor:
+                for name, warmed, seconds in executor.map(lambda t: prewarm_function(*t), targets):
+                    marker = "✅" if warmed else "⚠️ "
+                    print(f"  {marker} {name} {'warm' if warmed else 'not confirmed warm'} after {seconds:.1f}s")
+
+    if success:
         print("\n📋 Deployed Functions:")
         print("  🖥️  heavy_browser_automation - GPU T4")
-        print("  🔍 deep_web_research - GPU A10G") 
+        print("  🔍 deep_web_research - GPU A10G")
         print("  📄 lightweight_web_scraping - CPU only")
         print("  📝 ai_powered_form_filling - GPU T4")
-        print("  📊 multi_site_monitoring - GPU A10G")
-        
+        print("  📊 multi_site_monitoring - CPU workers")
+        print("  ⏰ monitoring_scheduler - every minute")
+
         print("\n💡 Usage:")
         print("  modal run modal/mcp_gpu_functions.py::heavy_browser_automation --task 'Navigate to example.com'")
         print("  modal run modal/mcp_gpu_functions.py::deep_web_research --research-topic 'AI trends 2024'")
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ Deployment failed: {e}")
-        return False
+
+    return success
 
 def check_modal_setup():
     """Check if Modal is properly configured"""
-    
+
     print("🔍 Checking Modal setup...")
-    
+
     # Check if modal is installed
     try:
         import modal
+        from modal.exception import AuthError, NotFoundError
         print("✅ Modal package installed")
     except ImportError:
         print("❌ Modal package not found. Install with: pip install modal")
         return False
-    
-    # Check if authenticated
+
+    # Check if authenticated with a real API round trip (a lookup only succeeds with valid credentials)
     try:
-        # This will fail if not authenticated
-        modal.App("test-auth")
+        modal.App.lookup(next(iter(APPS)), create_if_missing=False)
         print("✅ Modal authentication configured")
-    except Exception as e:
+    except NotFoundError:
+        print("✅ Modal authentication configured (app not deployed yet)")
+    except AuthError as e:
         print("❌ Modal authentication required. Run: modal setup")
         print(f"   Error: {e}")
         return False
-    
+    except Exception as e:
+        print("❌ Unable to reach Modal. Check network access and run: modal setup")
+        print(f"   Error: {e}")
+        return False
+
     # Check for required secrets
     print("⚠️  Required Modal secrets:")
     print("  - google-api-key (for AI browser automation)")
     print("  Create with: modal secret create google-api-key GOOGLE_API_KEY=your_key_here")
-    
+
     return True
 
-def main():
+def main(argv=None):
     """Main deployment function"""
-    
+
+    parser = argparse.ArgumentParser(description="Incremental deployment of the MCP Modal apps")
+    parser.add_argument("--dry-run", action="store_true", help="Print the deployment diff without deploying")
+    parser.add_argument("--force", action="store_true", help="Redeploy every app regardless of changes")
+    parser.add_argument("--no-prewarm", action="store_true", help="Skip pre-warming changed functions")
+    args = parser.parse_args(argv)
+
     print("🔧 Modal MCP GPU Functions Deployment")
     print("=" * 50)
-    
+
+    if args.dry_run:
+        deploy_mcp_functions(force=args.force, dry_run=True)
+        return
+
     # Check Modal setup
     if not check_modal_setup():
         print("\n❌ Modal setup incomplete. Please fix issues above.")
         sys.exit(1)
-    
+
     # Deploy functions
-    if deploy_mcp_functions():
+    if deploy_mcp_functions(force=args.force, prewarm=not args.no_prewarm):
         print("\n🎉 Deployment successful!")
         print("\n🔗 Integration with MCP:")
         print("  1. Functions are now available via Modal")
@@ -100,4 +377,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
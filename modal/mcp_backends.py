@@ -0,0 +1,104 @@
+"""
+Execution backends for routed MCP tasks
+"remote" calls the deployed Modal function; "local-thread" and "local-process" run the
+same function body on the caller's machine (Function.local), for tiny interactive tasks,
+offline use, tests and benchmarks. Volume mounts map to a local data directory there
+"""
+
+import importlib
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+BACKENDS = ("remote", "local-thread", "local-process")
+
+# "auto" runs these task types in-process when their size is at or under the threshold
+LOCAL_AUTO_TASKS = {"light_scraping"}
+LOCAL_SIZE_THRESHOLD = int(os.environ.get("MCP_LOCAL_SIZE_THRESHOLD", "3"))
+
+LOCAL_DATA_DIR = os.environ.get("MCP_LOCAL_DATA_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mcp-modal"))
+MODAL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def running_locally() -> bool:
+    """True outside a Modal container (including when modal is not installed at all)"""
+    try:
+        import modal
+    except ImportError:
+        return True
+    return modal.is_local()
+
+
+def data_dir(mount: str) -> str:
+    """A Volume's mount path inside a container, or its stand-in under LOCAL_DATA_DIR"""
+    if running_locally():
+        return os.path.join(LOCAL_DATA_DIR, mount.strip("/"))
+    return mount
+
+
+def sync_volume(volume, action: str):
+    """volume.commit() / volume.reload() inside a container; local runs use plain files"""
+    if volume is None or running_locally():
+        return
+    getattr(volume, action)()
+
+
+def task_size(kwargs: dict) -> int:
+    for key in ("urls", "sites", "source_urls"):
+        if kwargs.get(key):
+            return len(kwargs[key])
+    return 1
+
+
+def choose_backend(task_type: str, kwargs: dict, backend: str = "auto") -> str:
+    """Explicit backend (or MCP_EXECUTION_BACKEND) wins; auto keeps only tiny tasks local"""
+    backend = backend if backend != "auto" else os.environ.get("MCP_EXECUTION_BACKEND", "auto")
+    if backend in BACKENDS:
+        return backend
+    if backend != "auto":
+        raise ValueError(f"Unknown backend: {backend} (expected auto or one of {BACKENDS})")
+    if task_type in LOCAL_AUTO_TASKS and task_size(kwargs) <= LOCAL_SIZE_THRESHOLD:
+        return "local-thread"
+    return "remote"
+
+
+def _pool(kind: str):
+    """Long-lived pools, so repeated local calls skip thread/process and import startup"""
+    with _pools_lock:
+        if kind not in _pools:
+            if kind == "local-process":
+                import multiprocessing
+                _pools[kind] = ProcessPoolExecutor(max_workers=os.cpu_count() or 2,
+                                                   mp_context=multiprocessing.get_context("spawn"))
+            else:
+                _pools[kind] = ThreadPoolExecutor(max_workers=8, thread_name_prefix="mcp-local")
+        return _pools[kind]
+
+
+def _call_in_process(module_name: str, function_name: str, kwargs: dict):
+    """Child-process entry point: import the app module there and run the function body"""
+    if MODAL_DIR not in sys.path:
+        sys.path.insert(0, MODAL_DIR)
+    module = importlib.import_module(module_name)
+    return getattr(module, function_name).local(**kwargs)
+
+
+def execute(module_name: str, function_name: str, kwargs: dict, backend: str):
+    """
+    Run one Modal function on the chosen backend and return its result
+    local-thread uses a worker thread so functions that call asyncio.run still work
+    when the caller is itself inside an event loop
+    """
+    module = sys.modules.get(module_name) or importlib.import_module(module_name)
+    function = getattr(module, function_name)
+    if backend == "remote":
+        return function.remote(**kwargs)
+    if backend == "local-thread":
+        return _pool(backend).submit(function.local, **kwargs).result()
+    if backend == "local-process":
+        return _pool(backend).submit(_call_in_process, module_name, function_name, kwargs).result()
+    raise ValueError(f"Unknown backend: {backend}")
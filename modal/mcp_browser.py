@@ -0,0 +1,193 @@
+"""
+Shared Playwright and browser-use helpers for the MCP browser functions
+Field extraction, stable selectors and normalized agent actions
+"""
+
+import os
+
+from mcp_llm import GEMINI_MODEL, cached
+
+# Agent action names across browser-use releases, normalized to one vocabulary
+ACTION_ALIASES = {
+    "go_to_url": "navigate",
+    "navigate": "navigate",
+    "open_tab": "navigate",
+    "click_element_by_index": "click",
+    "click_element": "click",
+    "click": "click",
+    "input_text": "fill",
+    "input": "fill",
+    "select_dropdown_option": "select",
+    "select_dropdown": "select",
+    "send_keys": "keys",
+    "scroll_down": "scroll",
+    "scroll_up": "scroll",
+    "scroll": "scroll",
+    "wait": "wait",
+    "done": "done"
+}
+
+# Visible controls of the form the task is about, in DOM order, each with a selector that
+# matches exactly one element. Given form_data keys, the form with the most controls matching
+# them wins (then the one with the most controls), so search boxes and newsletter forms
+# are skipped. Radios also carry a group selector, to pick an option by value
+FIELD_EXTRACTION_JS = """
+(keys) => {
+  const norm = (text) => String(text || '').toLowerCase().replace(/[^a-z0-9]/g, '');
+  const quote = (value) => '"' + String(value).replace(/["\\\\]/g, '\\\\$&') + '"';
+  const labelFor = (el) => {
+    if (el.labels && el.labels.length) return el.labels[0].innerText.trim();
+    return el.getAttribute('aria-label') || '';
+  };
+  const controlsOf = (root) => Array.from(root.querySelectorAll('input, select, textarea, button'))
+    .filter((el) => el.type !== 'hidden' && (el.tagName !== 'BUTTON' || el.type === 'submit'));
+  const wanted = (keys || []).map(norm).filter(Boolean);
+  const matches = (el) => {
+    const names = [el.name, el.id, labelFor(el), el.getAttribute('placeholder')].map(norm).filter(Boolean);
+    return wanted.filter((key) => names.some((n) => n === key || n.includes(key) || key.includes(n))).length;
+  };
+  const score = (form) => {
+    const controls = controlsOf(form);
+    return [controls.reduce((total, el) => total + matches(el), 0), controls.length];
+  };
+  const forms = Array.from(document.forms).map((form) => [form, score(form)]);
+  forms.sort((a, b) => b[1][0] - a[1][0] || b[1][1] - a[1][1]);
+  const form = forms.length ? forms[0][0] : document.body;
+  const unique = (selector) => document.querySelectorAll(selector).length === 1;
+  const selectorFor = (el) => {
+    const tag = el.tagName.toLowerCase();
+    const candidates = [];
+    if (el.id) candidates.push(`[id=${quote(el.id)}]`);
+    if (el.name) {
+      candidates.push(`${tag}[name=${quote(el.name)}]`);
+      if (el.type === 'radio' || el.type === 'checkbox') candidates.push(`${tag}[name=${quote(el.name)}][value=${quote(el.value)}]`);
+    }
+    const found = candidates.find(unique);
+    if (found) return found;
+    const path = [];
+    for (let node = el; node && node.nodeType === 1 && node !== document.body; node = node.parentElement) {
+      let index = 1;
+      for (let sib = node.previousElementSibling; sib; sib = sib.previousElementSibling) {
+        if (sib.tagName === node.tagName) index++;
+      }
+      path.unshift(`${node.tagName.toLowerCase()}:nth-of-type(${index})`);
+    }
+    return 'body > ' + path.join(' > ');
+  };
+  return controlsOf(form).map((el) => ({
+    tag: el.tagName.toLowerCase(),
+    type: (el.type || '').toLowerCase(),
+    name: el.name || '',
+    id: el.id || '',
+    label: labelFor(el),
+    placeholder: el.getAttribute('placeholder') || '',
+    value: el.type === 'radio' || el.type === 'checkbox' ? el.value : '',
+    selector: selectorFor(el),
+    group: el.type === 'radio' && el.name ? `input[type="radio"][name=${quote(el.name)}]` : ''
+  }));
+}
+"""
+
+
+def gemini_llm(cache_mode: str = "exact"):
+    """
+    Chat model used by every browser-use agent, behind the LLM response cache
+    cache_mode: "exact", "semantic" or "off"; the wrapper's report() gives hit ratio and saved latency
+    """
+    from browser_use import ChatGoogle
+    from browser_use.llm.views import ChatInvokeCompletion
+    llm = ChatGoogle(model=GEMINI_MODEL, api_key=os.environ.get("GOOGLE_API_KEY"))
+    return cached(llm, cache_mode, lambda completion, usage: ChatInvokeCompletion(completion=completion, usage=usage))
+
+
+async def extract_form_fields(page, keys=None) -> list:
+    """Controls of the page's form for these form_data keys (else its largest form), in DOM order"""
+    return await page.evaluate(FIELD_EXTRACTION_JS, list(keys or []))
+
+
+def _quote(value) -> str:
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def element_selector(element) -> str:
+    """Stable selector for an element recorded in agent history (id, then name, then xpath)"""
+    if element is None:
+        return None
+    attributes = getattr(element, "attributes", None) or {}
+    tag = (getattr(element, "tag_name", None) or "").lower() or "*"
+    if attributes.get("id"):
+        return f'[id={_quote(attributes["id"])}]'
+    if attributes.get("name"):
+        # Radios and checkboxes share a name across the group
+        if attributes.get("type", "").lower() in ("radio", "checkbox") and attributes.get("value") is not None:
+            return f'{tag}[name={_quote(attributes["name"])}][value={_quote(attributes["value"])}]'
+        return f'{tag}[name={_quote(attributes["name"])}]'
+    xpath = getattr(element, "xpath", None)
+    return f"xpath=/{xpath.lstrip('/')}" if xpath else None
+
+
+def _normalize_action(name: str, params, element) -> dict:
+    params = params if isinstance(params, dict) else {}
+    action = {"action": ACTION_ALIASES.get(name, name), "raw": name, "selector": element_selector(element)}
+    for key in ("url", "text", "keys"):
+        if key in params:
+            action[key] = params[key]
+    if action["action"] == "select":
+        action["option"] = params.get("option", params.get("text"))
+    return action
+
+
+def agent_actions(history) -> list:
+    """
+    Concrete actions an agent run performed, as plain dicts
+    Each has action (navigate, click, fill, select, keys, ...), selector and the
+    text, url or option it used; raw keeps the browser-use action name
+    """
+    actions = []
+    for model_action in history.model_actions():
+        element = model_action.get("interacted_element")
+        for name, params in model_action.items():
+            if name != "interacted_element":
+                actions.append(_normalize_action(name, params, element))
+    return actions
+
+
+def recorded_steps(history) -> list:
+    """
+    Agent actions with a DOM checkpoint each: the page URL the action ran on and
+    the tag, type and name of the element it touched
+    """
+    steps = []
+    for item in history.history:
+        if item.model_output is None:
+            continue
+        state = item.state
+        elements = list(getattr(state, "interacted_element", None) or [])
+        for i, action_model in enumerate(item.model_output.action):
+            element = elements[i] if i < len(elements) else None
+            for name, params in action_model.model_dump(exclude_unset=True).items():
+                step = _normalize_action(name, params, element)
+                attributes = getattr(element, "attributes", None) or {}
+                step["checkpoint"] = {
+                    "url": getattr(state, "url", None),
+                    "tag": (getattr(element, "tag_name", None) or "").lower() or None,
+                    "type": attributes.get("type"),
+                    "name": attributes.get("name")
+                }
+                steps.append(step)
+    return steps
+
+
+async def fill_field(page, selector: str, value, field_type: str = "text", timeout_ms: int = 5000):
+    """
+    Set one control with the Playwright call that matches its type
+    A radio group selector takes the value of the option to check
+    """
+    if field_type == "radio" and not isinstance(value, bool) and value is not None:
+        await page.check(f"{selector}[value={_quote(value)}]", timeout=timeout_ms)
+    elif field_type in ("checkbox", "radio"):
+        await page.set_checked(selector, bool(value), timeout=timeout_ms)
+    elif field_type.startswith("select"):
+        await page.select_option(selector, str(value), timeout=timeout_ms)
+    else:
+        await page.fill(selector, "" if value is None else str(value), timeout=timeout_ms)
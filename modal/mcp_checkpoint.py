@@ -0,0 +1,182 @@
+"""
+Checkpointed, resumable execution for long-running batch functions
+Completed items are appended to a JSONL file on a Volume and committed periodically,
+so a timed-out or preempted run can be resumed (or its partial results read) by token.
+Each run writes its own files under the token, so concurrent identical calls never
+truncate each other's progress
+"""
+
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from mcp_backends import data_dir, sync_volume
+
+CHECKPOINT_VOLUME_NAME = "mcp-checkpoints"
+CHECKPOINT_DIR = "/checkpoints"
+
+# Commit to the Volume after this many new items or seconds, whichever comes first
+FLUSH_EVERY_ITEMS = 25
+FLUSH_EVERY_S = 10.0
+
+
+def derive_token(function_name: str, *args) -> str:
+    """Deterministic token from a call's arguments, so retries of the same call line up"""
+    payload = json.dumps([function_name, *args], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:20]
+
+
+def _folder(function_name: str, root: str = None) -> str:
+    return os.path.join(root or data_dir(CHECKPOINT_DIR), function_name)
+
+
+def _paths(function_name: str, token: str, run_id: str, root: str = None):
+    base = os.path.join(_folder(function_name, root), f"{token}.{run_id}")
+    return f"{base}.jsonl", f"{base}.meta.json"
+
+
+def _runs(function_name: str, token: str, root: str = None) -> list:
+    """Every run recorded under a token, oldest update first: {"run_id", "data_path", "meta_path", "meta"}"""
+    runs = []
+    for meta_path in glob.glob(os.path.join(_folder(function_name, root), f"{glob.escape(token)}.*.meta.json")):
+        run_id = os.path.basename(meta_path)[len(token) + 1:-len(".meta.json")]
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        data_path, _ = _paths(function_name, token, run_id, root)
+        runs.append({"run_id": run_id, "data_path": data_path, "meta_path": meta_path, "meta": meta})
+    return sorted(runs, key=lambda run: run["meta"].get("updated_at", 0))
+
+
+def _read_items(runs: list) -> dict:
+    done = {}
+    for run in runs:
+        if not os.path.exists(run["data_path"]):
+            continue
+        with open(run["data_path"]) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                done[record["key"]] = record["result"]
+    return done
+
+
+def read_checkpoint(function_name: str, token: str, root: str = None) -> dict:
+    """
+    Completed items (key -> result) across the token's runs, and the metadata of the most
+    recently updated run; a torn last line from a crash is ignored
+    """
+    runs = _runs(function_name, token, root)
+    meta = dict(runs[-1]["meta"]) if runs else {}
+    if runs:
+        meta["runs"] = len(runs)
+    return {"done": _read_items(runs), "meta": meta}
+
+
+class Checkpoint:
+    """
+    Progress log for one batch call
+    With an explicit resume_token, finished items are always reused. With a derived
+    token (the default), a checkpoint is reused only if that run did not complete (and,
+    with max_age_s, was updated recently), so retries resume while fresh calls with the
+    same arguments start over
+    """
+
+    def __init__(self, function_name: str, call_args: list, resume_token: str = None,
+                 volume=None, root: str = None, max_age_s: float = None):
+        self.function_name = function_name
+        self.volume = volume
+        self.root = root
+        self.token = resume_token or derive_token(function_name, *call_args)
+        self.run_id = uuid.uuid4().hex[:8]
+        try:
+            sync_volume(volume, "reload")
+        except Exception:
+            pass
+
+        def fresh(run):
+            return max_age_s is None or time.time() - run["meta"].get("updated_at", 0) <= max_age_s
+
+        runs = _runs(function_name, self.token, root)
+        reused = [run for run in runs if resume_token is not None or (not run["meta"].get("complete") and fresh(run))]
+        self.done = _read_items(reused)
+        self.resumed = len(self.done)
+        # Finished or abandoned runs of a derived token are superseded; live ones are never touched
+        for run in runs:
+            if run not in reused:
+                for path in (run["data_path"], run["meta_path"]):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        os.makedirs(_folder(function_name, root), exist_ok=True)
+        self.data_path, self.meta_path = _paths(function_name, self.token, self.run_id, root)
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._write_meta(complete=False)
+        # Flushes on a timer too, so a slow tail is not left buffered (and the run looks alive)
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True, name="mcp-checkpoint-flush")
+        self._flusher.start()
+
+    def _write_meta(self, complete: bool, total: int = None):
+        with open(self.meta_path, "w") as f:
+            json.dump({"function": self.function_name, "complete": complete, "items": len(self.done),
+                       "total": total, "updated_at": time.time()}, f)
+
+    def pending(self, keys: list) -> list:
+        return [key for key in keys if key not in self.done]
+
+    def record(self, key: str, result):
+        """Mark one item finished; flushed every few items, and every few seconds by a timer"""
+        with self._lock:
+            self.done[key] = result
+            self._buffer.append(json.dumps({"key": key, "result": result}, default=str))
+            due = len(self._buffer) >= FLUSH_EVERY_ITEMS
+        if due:
+            self.flush()
+
+    def _flush_loop(self):
+        while not self._closed.wait(FLUSH_EVERY_S):
+            try:
+                self.flush(heartbeat=True)
+            except Exception:
+                pass
+
+    def flush(self, heartbeat: bool = False):
+        """Append buffered items and commit; a heartbeat also refreshes updated_at when idle"""
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+            if lines:
+                with open(self.data_path, "a") as f:
+                    f.write("\n".join(lines) + "\n")
+            if lines or heartbeat:
+                self._write_meta(complete=False)
+        if lines or heartbeat:
+            sync_volume(self.volume, "commit")
+
+    def close(self):
+        """Stop the timer and flush what is buffered; callers run this in a finally"""
+        if not self._closed.is_set():
+            self._closed.set()
+            self.flush()
+
+    def complete(self, total: int = None) -> dict:
+        """Final flush; returns the checkpoint summary for the function result"""
+        self.close()
+        with self._lock:
+            self._write_meta(complete=True, total=total)
+        sync_volume(self.volume, "commit")
+        return self.summary(total)
+
+    def summary(self, total: int = None) -> dict:
+        return {"resume_token": self.token, "resumed_items": self.resumed,
+                "completed_items": len(self.done), "total_items": total}
@@ -0,0 +1,212 @@
+"""
+Memory-aware adaptive concurrency for batch fetch-and-parse work
+A worker slot is admitted only while the concurrency limit, the in-flight byte budget
+and the container's memory allow it. The limit grows by one per round while latency
+stays near its baseline, shrinks multiplicatively when latency climbs, and halves as
+soon as RSS crosses the hard watermark
+"""
+
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 32
+INITIAL_CONCURRENCY = 4
+
+# Fractions of the container memory limit: no growth above soft, shrink above hard
+SOFT_MEMORY_FRACTION = 0.70
+HARD_MEMORY_FRACTION = 0.85
+# A parsed BeautifulSoup tree costs several times its HTML; in-flight bytes count both
+PARSE_MEMORY_FACTOR = 8
+INITIAL_PAGE_BYTES = 256 * 1024
+MIN_BYTE_BUDGET = 64 * 1024 * 1024
+
+# Latency feedback: shrink when the EWMA exceeds the baseline by this factor
+LATENCY_EWMA_ALPHA = 0.3
+LATENCY_TOLERANCE = 2.0
+# The baseline creeps up slowly so one unusually fast response does not pin it
+BASELINE_DRIFT = 0.001
+DECREASE_FACTOR = 0.75
+MAX_TRAJECTORY_POINTS = 500
+
+
+def memory_limit_bytes() -> int:
+    """Container memory limit: MCP_MEMORY_LIMIT_MB, the cgroup limit, else physical memory"""
+    if os.environ.get("MCP_MEMORY_LIMIT_MB"):
+        return int(float(os.environ["MCP_MEMORY_LIMIT_MB"]) * 1024 * 1024)
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+
+def current_rss_bytes() -> int:
+    """Resident set size now (Linux /proc), else the peak from getrusage"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Slot:
+    """One admitted item; observe_bytes() swaps the estimate for the page's real size"""
+
+    def __init__(self, limiter, reserved: int):
+        self.limiter = limiter
+        self.reserved = reserved
+
+    def observe_bytes(self, n: int):
+        self.reserved = self.limiter.rebalance(self.reserved, n)
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limiter driven by memory and latency
+    Workers wrap each item in slot(); inside it, slot.observe_bytes(n) replaces the
+    byte estimate with the real page size once it is known
+    """
+
+    def __init__(self, initial: int = INITIAL_CONCURRENCY, min_limit: int = MIN_CONCURRENCY,
+                 max_limit: int = MAX_CONCURRENCY, memory_limit: int = None):
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.limit = min(max(initial, min_limit), self.max_limit)
+        self.memory_limit = memory_limit or memory_limit_bytes()
+        self.soft_bytes = int(self.memory_limit * SOFT_MEMORY_FRACTION)
+        self.hard_bytes = int(self.memory_limit * HARD_MEMORY_FRACTION)
+        self.start_rss = current_rss_bytes()
+        self.byte_budget = max(MIN_BYTE_BUDGET, self.soft_bytes - self.start_rss)
+        self.in_flight = 0
+        self.in_flight_bytes = 0
+        self.page_bytes = INITIAL_PAGE_BYTES
+        self.latency_ewma = None
+        self.latency_baseline = None
+        self.completed = 0
+        self._since_change = 0
+        self._started = time.perf_counter()
+        self._cond = threading.Condition()
+        self.peaks = {"rss": self.start_rss, "in_flight_bytes": 0, "in_flight": 0}
+        self.memory_waits = 0
+        self.trajectory = [self._point("initial", self.start_rss)]
+
+    def _point(self, reason: str, rss: int) -> dict:
+        return {
+            "t_s": round(time.perf_counter() - self._started, 3),
+            "limit": self.limit,
+            "reason": reason,
+            "rss_mb": round(rss / 2 ** 20, 1),
+            "in_flight_mb": round(self.in_flight_bytes / 2 ** 20, 2)
+        }
+
+    def _set_limit(self, limit: int, reason: str, rss: int):
+        limit = min(max(limit, self.min_limit), self.max_limit)
+        if limit == self.limit:
+            return
+        self.limit = limit
+        self._since_change = 0
+        if len(self.trajectory) < MAX_TRAJECTORY_POINTS:
+            self.trajectory.append(self._point(reason, rss))
+
+    def _sample_rss(self) -> int:
+        rss = current_rss_bytes()
+        self.peaks["rss"] = max(self.peaks["rss"], rss)
+        return rss
+
+    def _admissible(self, reserve: int, rss: int) -> bool:
+        if self.in_flight >= self.limit:
+            return False
+        # Always let one item run, so a single oversized page cannot deadlock the batch
+        if self.in_flight == 0:
+            return True
+        return self.in_flight_bytes + reserve <= self.byte_budget and rss < self.hard_bytes
+
+    def acquire(self) -> int:
+        """Block until a slot is free; returns the bytes reserved for it"""
+        with self._cond:
+            reserve = self.page_bytes * PARSE_MEMORY_FACTOR
+            waited_for_memory = False
+            while not self._admissible(reserve, self._sample_rss()):
+                if self.in_flight < self.limit and not waited_for_memory:
+                    waited_for_memory = True
+                    self.memory_waits += 1
+                self._cond.wait(timeout=0.5)
+            self.in_flight += 1
+            self.in_flight_bytes += reserve
+            self.peaks["in_flight"] = max(self.peaks["in_flight"], self.in_flight)
+            self.peaks["in_flight_bytes"] = max(self.peaks["in_flight_bytes"], self.in_flight_bytes)
+            return reserve
+
+    def rebalance(self, reserved: int, actual_bytes: int) -> int:
+        """Swap a slot's estimate for its real footprint; returns the new reservation"""
+        actual = actual_bytes * PARSE_MEMORY_FACTOR
+        with self._cond:
+            self.in_flight_bytes += actual - reserved
+            self.peaks["in_flight_bytes"] = max(self.peaks["in_flight_bytes"], self.in_flight_bytes)
+            self.page_bytes = int(self.page_bytes + LATENCY_EWMA_ALPHA * (actual_bytes - self.page_bytes))
+        return actual
+
+    def release(self, reserved: int, latency_s: float = None):
+        """Free a slot and adapt the limit from its latency and current memory"""
+        with self._cond:
+            self.in_flight -= 1
+            self.in_flight_bytes -= reserved
+            self.completed += 1
+            self._since_change += 1
+            rss = self._sample_rss()
+            if latency_s is not None:
+                self.latency_ewma = latency_s if self.latency_ewma is None else \
+                    self.latency_ewma + LATENCY_EWMA_ALPHA * (latency_s - self.latency_ewma)
+                self.latency_baseline = latency_s if self.latency_baseline is None else \
+                    min(latency_s, self.latency_baseline * (1 + BASELINE_DRIFT))
+            # Adjust at most once per round (limit completions), except under memory pressure
+            if rss >= self.hard_bytes:
+                self._set_limit(self.limit // 2, "memory", rss)
+            elif self._since_change >= self.limit and self.latency_ewma is not None:
+                if self.latency_ewma > self.latency_baseline * LATENCY_TOLERANCE:
+                    self._set_limit(int(self.limit * DECREASE_FACTOR), "latency", rss)
+                elif rss < self.soft_bytes and self.in_flight_bytes + self.page_bytes * PARSE_MEMORY_FACTOR \
+                        <= self.byte_budget:
+                    self._set_limit(self.limit + 1, "increase", rss)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        slot = Slot(self, self.acquire())
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield slot
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            # Failures say nothing reliable about latency under load
+            self.release(slot.reserved, None if failed else time.perf_counter() - started)
+
+    def report(self) -> dict:
+        with self._cond:
+            limits = [p["limit"] for p in self.trajectory]
+            return {
+                "initial_limit": self.trajectory[0]["limit"],
+                "final_limit": self.limit,
+                "min_limit_reached": min(limits),
+                "max_limit_reached": max(limits),
+                "peak_in_flight": self.peaks["in_flight"],
+                "peak_in_flight_mb": round(self.peaks["in_flight_bytes"] / 2 ** 20, 2),
+                "peak_rss_mb": round(max(self.peaks["rss"], current_rss_bytes()) / 2 ** 20, 1),
+                "start_rss_mb": round(self.start_rss / 2 ** 20, 1),
+                "memory_limit_mb": round(self.memory_limit / 2 ** 20, 1),
+                "memory_waits": self.memory_waits,
+                "latency_baseline_s": round(self.latency_baseline, 3) if self.latency_baseline else None,
+                "latency_ewma_s": round(self.latency_ewma, 3) if self.latency_ewma else None,
+                "trajectory": list(self.trajectory)
+            }
@@ -0,0 +1,262 @@
+"""
+Token-budgeted content distillation for LLM prompts
+Strips page boilerplate (chrome tags, nav/footer-like containers, link-dense blocks),
+splits the remaining text into heading-scoped chunks and packs the chunks most relevant
+to the query into a token budget, keeping document order
+"""
+
+import functools
+import math
+import re
+
+DEFAULT_TOKEN_BUDGET = 1500
+CHUNK_TOKENS = 256
+TOKENIZER_ENCODING = "cl100k_base"
+
+# Never content
+CHROME_TAGS = ("script", "style", "noscript", "template", "svg", "canvas", "iframe", "form", "button", "select")
+# Site chrome by element or ARIA role
+LAYOUT_TAGS = ("nav", "footer", "aside")
+LAYOUT_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "menu", "menubar"}
+# Whole class/id tokens naming site chrome; "has-sidebar" or "menu-open" name states of the content
+BOILERPLATE_TOKENS = {
+    "nav", "navbar", "navigation", "menu", "site-nav", "main-nav", "footer", "site-footer", "page-footer",
+    "sidebar", "breadcrumb", "breadcrumbs", "cookie", "cookies", "cookie-banner", "cookie-consent", "consent",
+    "banner", "promo", "ad", "ads", "advert", "advertisement", "share", "sharing", "social", "social-share",
+    "related", "related-posts", "comments", "newsletter", "subscribe", "popup", "modal", "skip-link"
+}
+# A class/id match is only chrome when it is small or mostly links; a large prose container is content
+MAX_BOILERPLATE_CHARS = 600
+
+BLOCK_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "pre", "blockquote", "td", "th", "dd", "dt",
+              "figcaption")
+HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+MIN_BLOCK_CHARS = 40
+MAX_LINK_DENSITY = 0.5
+# Small bonus for early chunks, which usually carry a page's lede
+POSITION_WEIGHT = 0.05
+
+_WORD_PIECES = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    """tiktoken BPE when installed (and its vocabulary is cached), else None for the estimate"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception:
+        return None
+
+
+def tokenizer_name() -> str:
+    return f"tiktoken:{TOKENIZER_ENCODING}" if _encoding() is not None else "estimate"
+
+
+def count_tokens(text: str) -> int:
+    """BPE token count, or a word-piece estimate (~4 characters per token) without tiktoken"""
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum(math.ceil(len(piece) / 4) for piece in _WORD_PIECES.findall(text))
+
+
+def _link_density(tag, text: str) -> float:
+    return sum(len(a.get_text(" ", strip=True)) for a in tag.find_all("a")) / len(text) if text else 0.0
+
+
+def _is_boilerplate(tag) -> bool:
+    if tag.name in LAYOUT_TAGS or (tag.get("role") or "").lower() in LAYOUT_ROLES:
+        return True
+    if tag.name == "header" and tag.find_parent(("article", "main")) is None:
+        return True
+    tokens = {token.lower() for token in [*(tag.get("id") or "").split(), *(tag.get("class") or [])]}
+    if tokens.isdisjoint(BOILERPLATE_TOKENS):
+        return False
+    text = tag.get_text(" ", strip=True)
+    return len(text) <= MAX_BOILERPLATE_CHARS or _link_density(tag, text) > MAX_LINK_DENSITY
+
+
+def _strip_boilerplate(soup):
+    for tag in soup.find_all(CHROME_TAGS):
+        tag.decompose()
+    for tag in soup.find_all(True):
+        if tag.decomposed or tag.name in ("html", "body", "main", "article"):
+            continue
+        # A container wrapping the main content is layout, not boilerplate
+        if _is_boilerplate(tag) and tag.find(("main", "article")) is None:
+            tag.decompose()
+
+
+def _blocks(root) -> list:
+    """(tag name, text) for each innermost text block, dropping short or link-dense ones"""
+    from bs4 import NavigableString, Tag
+
+    blocks = []
+    for el in root.descendants:
+        if not isinstance(el, Tag):
+            continue
+        if el.name in BLOCK_TAGS and el.find(BLOCK_TAGS) is None:
+            text = el.get_text(" ", strip=True)
+            density = _link_density(el, text)
+        elif el.name in ("div", "section", "span") and el.find(BLOCK_TAGS) is None \
+                and el.find_parent(BLOCK_TAGS) is None:
+            # Paragraphs written as bare text inside layout elements
+            text = " ".join(s.strip() for s in el.children if isinstance(s, NavigableString) and s.strip())
+            density = 0.0
+        else:
+            continue
+        if el.name in HEADING_TAGS:
+            if len(text) >= 3:
+                blocks.append((el.name, text))
+        elif len(text) >= MIN_BLOCK_CHARS and density <= MAX_LINK_DENSITY:
+            blocks.append((el.name, text))
+    return blocks
+
+
+def _split_word(word: str, max_tokens: int) -> list:
+    """An oversized run without spaces (minified code, a data blob) cut into BPE token windows"""
+    encoding = _encoding()
+    if encoding is not None:
+        ids = encoding.encode(word, disallowed_special=())
+        return [encoding.decode(ids[i:i + max_tokens]) for i in range(0, len(ids), max_tokens)]
+    # The estimate never counts more than one token per character
+    return [word[i:i + max_tokens] for i in range(0, len(word), max_tokens)]
+
+
+def _split_words(text: str, max_tokens: int) -> list:
+    """Word-aligned pieces of text with no sentence breaks (code, tables, long lists)"""
+    pieces, current, size = [], [], 0
+    for word in text.split():
+        tokens = count_tokens(word)
+        if current and (size + tokens > max_tokens or tokens > max_tokens):
+            pieces.append(" ".join(current))
+            current, size = [], 0
+        if tokens > max_tokens:
+            pieces.extend(_split_word(word, max_tokens))
+            continue
+        current.append(word)
+        size += tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _split_long(text: str, max_tokens: int) -> list:
+    """Sentence-aligned pieces of an oversized block; a sentence still too long is split by words"""
+    pieces, current = [], ""
+    for sentence in _SENTENCE_END.split(text):
+        if count_tokens(sentence) > max_tokens:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.extend(_split_words(sentence, max_tokens))
+            continue
+        candidate = f"{current} {sentence}".strip()
+        if current and count_tokens(candidate) > max_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_blocks(blocks: list, max_tokens: int = CHUNK_TOKENS) -> list:
+    """Heading-scoped chunks of at most ~max_tokens; each repeats its section heading"""
+    chunks = []
+    heading, parts, size = "", [], 0
+
+    def emit():
+        if parts:
+            text = "\n".join([f"## {heading}"] * bool(heading) + parts)
+            chunks.append({"position": len(chunks), "heading": heading, "text": text, "tokens": count_tokens(text)})
+
+    for name, text in blocks:
+        if name in HEADING_TAGS:
+            emit()
+            heading, parts, size = text, [], 0
+            continue
+        for piece in _split_long(text, max_tokens) if count_tokens(text) > max_tokens else [text]:
+            tokens = count_tokens(piece)
+            if parts and size + tokens > max_tokens:
+                emit()
+                parts, size = [], 0
+            parts.append(piece)
+            size += tokens
+    emit()
+    return chunks
+
+
+def pack_chunks(chunks: list, query: str = None, token_budget: int = DEFAULT_TOKEN_BUDGET, embed=None) -> list:
+    """
+    Highest-scoring chunks that fit the budget, back in document order
+    Score is similarity to the query (hashed embeddings unless embed, a batch
+    text -> vectors function, is given) plus a small bonus for early position
+    """
+    from mcp_llm import cosine, hashed_embedding
+
+    if query and chunks:
+        if embed is not None:
+            vectors = embed([query] + [c["text"] for c in chunks])
+            query_vector, chunk_vectors = vectors[0], vectors[1:]
+        else:
+            query_vector, chunk_vectors = hashed_embedding(query), [hashed_embedding(c["text"]) for c in chunks]
+        relevance = [cosine(query_vector, v) for v in chunk_vectors]
+    else:
+        relevance = [0.0] * len(chunks)
+    ranked = sorted(zip(chunks, relevance), key=lambda pair: pair[1] + POSITION_WEIGHT / (1 + pair[0]["position"]),
+                    reverse=True)
+    selected, used = [], 0
+    for chunk, _ in ranked:
+        if used + chunk["tokens"] <= token_budget:
+            selected.append(chunk)
+            used += chunk["tokens"]
+    return sorted(selected, key=lambda c: c["position"])
+
+
+def distill(html, query: str = None, token_budget: int = DEFAULT_TOKEN_BUDGET, baseline_chars: int = None,
+            embed=None) -> dict:
+    """
+    Prompt-ready text for a page, within token_budget
+    Also reports the reduction against the plain get_text() extraction (capped at
+    baseline_chars, as the undistilled prompt was)
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    raw_text = soup.get_text(" ", strip=True)[:baseline_chars]
+    _strip_boilerplate(soup)
+    root = soup.find("main") or soup.find("article") or soup.body or soup
+    blocks = _blocks(root)
+    soup.decompose()
+    fallback = None
+    if not blocks and raw_text:
+        # Stripping removed everything: use the page's blocks unfiltered, else its plain text
+        soup = BeautifulSoup(html, "html.parser")
+        for tag in soup.find_all(CHROME_TAGS):
+            tag.decompose()
+        blocks = _blocks(soup)
+        soup.decompose()
+        fallback = "blocks" if blocks else "text"
+        blocks = blocks or [("p", raw_text)]
+    chunks = chunk_blocks(blocks)
+    selected = pack_chunks(chunks, query, token_budget, embed)
+    text = "\n\n".join(c["text"] for c in selected)
+    tokens_before = count_tokens(raw_text)
+    tokens_after = sum(c["tokens"] for c in selected)
+    return {
+        "text": text,
+        "chars_before": len(raw_text),
+        "chars_after": len(text),
+        # An empty result is a failed extraction, not a saving
+        "chars_removed": max(0, len(raw_text) - len(text)) if text else 0,
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": max(0, tokens_before - tokens_after) if text else 0,
+        "chunks": len(chunks),
+        "chunks_kept": len(selected),
+        "fallback": fallback
+    }
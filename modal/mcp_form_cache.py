@@ -0,0 +1,211 @@
+"""
+Form-structure cache for AI form filling
+Keys learned field-to-selector mappings by a structural signature of the form,
+so repeat fills of a known form skip vision and LLM inference
+"""
+
+import hashlib
+import json
+import re
+import time
+
+FORM_CACHE_DICT_NAME = "mcp-form-cache"
+
+# Control types that never take form_data values
+NON_DATA_TYPES = {"submit", "button", "reset", "image"}
+
+# Clicks on these controls submit their form
+SUBMIT_TYPES = {"submit", "image"}
+
+# Least cosine similarity for the embedding fallback to pair a key with a field
+SEMANTIC_MATCH_THRESHOLD = 0.6
+
+
+def form_signature(fields: list) -> str:
+    """Hash of field names, types and order; labels, ids and styling do not affect it"""
+    structure = [(f.get("tag", ""), f.get("type", ""), f.get("name", "")) for f in fields]
+    return hashlib.sha256(json.dumps(structure).encode()).hexdigest()[:24]
+
+
+def _norm(text) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(text or "").lower())
+
+
+def _field_text(field: dict) -> str:
+    return " ".join(str(field[attr]) for attr in ("label", "placeholder", "name", "id") if field.get(attr))
+
+
+def _semantic_matches(keys: list, candidates: list, embed) -> dict:
+    """Greedy best-cosine pairing of keys to field descriptions, above the threshold"""
+    from mcp_llm import cosine
+    candidates = [f for f in candidates if _field_text(f)]
+    if not keys or not candidates:
+        return {}
+    try:
+        vectors = embed([k.replace("_", " ") for k in keys] + [_field_text(f) for f in candidates])
+    except Exception:
+        return {}
+    key_vectors, field_vectors = vectors[:len(keys)], vectors[len(keys):]
+    scored = sorted(
+        ((cosine(kv, fv), key, field) for key, kv in zip(keys, key_vectors)
+         for field, fv in zip(candidates, field_vectors)),
+        key=lambda t: t[0], reverse=True
+    )
+    mapping, used = {}, set()
+    for score, key, field in scored:
+        if score < SEMANTIC_MATCH_THRESHOLD:
+            break
+        if key not in mapping and field["selector"] not in used:
+            mapping[key] = field
+            used.add(field["selector"])
+    return mapping
+
+
+def _mapped(field: dict) -> dict:
+    """Mapping entry for a field; a radio maps to its whole group, filled by option value"""
+    if field.get("type") == "radio" and field.get("group"):
+        return {"selector": field["group"], "type": "radio"}
+    return {"selector": field["selector"], "type": field.get("type") or field.get("tag")}
+
+
+def _claim(used: set, field: dict, fields: list):
+    used.add(field["selector"])
+    if field.get("type") == "radio" and field.get("group"):
+        used.update(f["selector"] for f in fields if f.get("group") == field["group"])
+
+
+def match_fields(form_data: dict, fields: list, embed=None) -> dict:
+    """
+    Heuristic key -> field mapping by name, id, label or placeholder
+    Exact normalized matches win over substring matches; each field is used once
+    Keys still unmatched are paired by embedding similarity when embed (a batch
+    text -> vectors function, e.g. InferenceClient.embed_texts) is given
+    """
+    candidates = [f for f in fields if f.get("type") not in NON_DATA_TYPES]
+    mapping = {}
+    used = set()
+    for exact in (True, False):
+        for key in form_data:
+            if key in mapping:
+                continue
+            wanted = _norm(key)
+            for field in candidates:
+                if field["selector"] in used or not wanted:
+                    continue
+                names = [_norm(field.get(attr)) for attr in ("name", "id", "label", "placeholder")]
+                if any(n and (n == wanted if exact else wanted in n or n in wanted) for n in names):
+                    mapping[key] = _mapped(field)
+                    _claim(used, field, candidates)
+                    break
+    if embed is not None:
+        unmatched = [k for k in form_data if k not in mapping]
+        free = [f for f in candidates if f["selector"] not in used]
+        for key, field in _semantic_matches(unmatched, free, embed).items():
+            if field["selector"] not in used:
+                mapping[key] = _mapped(field)
+                _claim(used, field, candidates)
+    return mapping
+
+
+def _is_submit(action: dict, field: dict) -> bool:
+    checkpoint = action.get("checkpoint") or {}
+    kind = ((field or {}).get("type") or checkpoint.get("type") or "").lower()
+    tag = ((field or {}).get("tag") or checkpoint.get("tag") or "").lower()
+    return kind in SUBMIT_TYPES or (tag == "button" and kind in ("", "submit"))
+
+
+def _submit_selector(actions: list, fields_by_selector: dict) -> str:
+    """
+    The last click on a submit control; else the last click the page navigated after
+    Clicks on radios, checkboxes, tabs or "next" links are never taken for the submit
+    """
+    clicks = [(i, a) for i, a in enumerate(actions) if a["action"] == "click" and a.get("selector")]
+    for _, action in reversed(clicks):
+        if _is_submit(action, fields_by_selector.get(action["selector"])):
+            return action["selector"]
+    for i, action in reversed(clicks):
+        here = (action.get("checkpoint") or {}).get("url")
+        after = next(((a.get("checkpoint") or {}).get("url") for a in actions[i + 1:]
+                      if (a.get("checkpoint") or {}).get("url")), None)
+        field = fields_by_selector.get(action["selector"]) or {}
+        if here and after and after != here and field.get("type") not in ("radio", "checkbox"):
+            return action["selector"]
+    return None
+
+
+def learn_mapping(form_data: dict, actions: list, fields: list, embed=None) -> dict:
+    """
+    Build the field mapping from what the agent actually did (recorded_steps)
+    Fill/select actions and radio clicks are matched to form_data keys by value; keys
+    the agent's actions do not explain fall back to the heuristic matcher
+    """
+    by_selector = {f["selector"]: f for f in fields}
+    mapping = {}
+    for action in actions:
+        field = by_selector.get(action.get("selector")) or {}
+        if action["action"] in ("fill", "select") and action.get("selector"):
+            value = action.get("option") if action["action"] == "select" else action.get("text")
+            entry = {"selector": action["selector"],
+                     "type": "select" if action["action"] == "select" else field.get("type") or "text"}
+        elif action["action"] == "click" and field.get("type") == "radio":
+            value, entry = field.get("value"), _mapped(field)
+        else:
+            continue
+        for key, expected in form_data.items():
+            if key not in mapping and str(expected) == str(value):
+                mapping[key] = entry
+                break
+    for key, field in match_fields(form_data, fields, embed).items():
+        mapping.setdefault(key, field)
+    return {"fields": mapping, "submit_selector": _submit_selector(actions, by_selector)}
+
+
+class FormStructureCache:
+    """
+    Signature -> learned mapping, persisted on a Modal Dict
+    Entries record how long the vision fill took so hits can report time saved
+    """
+
+    def __init__(self, store=None):
+        if store is None:
+            import modal
+            store = modal.Dict.from_name(FORM_CACHE_DICT_NAME, create_if_missing=True)
+        self.store = store
+
+    def get(self, signature: str, keys=None) -> dict:
+        """Cached entry if it covers every requested form_data key"""
+        try:
+            entry = self.store.get(signature)
+        except Exception:
+            return None
+        if entry is None:
+            return None
+        entry = json.loads(entry) if isinstance(entry, str) else entry
+        if keys is not None and not set(keys) <= set(entry["mapping"]["fields"]):
+            return None
+        return entry
+
+    def put(self, signature: str, mapping: dict, learned_ms: float, form_url: str = None) -> dict:
+        entry = {
+            "mapping": mapping,
+            "learned_ms": round(learned_ms, 1),
+            "form_url": form_url,
+            "created_at": time.time(),
+            "hits": 0
+        }
+        self.store[signature] = json.dumps(entry)
+        return entry
+
+    def record_hit(self, signature: str, entry: dict) -> int:
+        entry["hits"] = entry.get("hits", 0) + 1
+        try:
+            self.store[signature] = json.dumps(entry)
+        except Exception:
+            pass
+        return entry["hits"]
+
+    def invalidate(self, signature: str):
+        try:
+            self.store.pop(signature)
+        except Exception:
+            pass
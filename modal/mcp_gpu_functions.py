@@ -3,182 +3,373 @@ Modal GPU Functions for Heavy MCP Tasks
 Offloads GPU-intensive browser automation and AI tasks to Modal containers
 """
 
+import time
+
 import modal
 
+from mcp_checkpoint import CHECKPOINT_DIR, CHECKPOINT_VOLUME_NAME
+from mcp_images import (analysis_image, browser_image, inference_image, research_image, scrape_image,
+                        with_local_sources)
+from mcp_monitoring import SERIES_DIR, SERIES_VOLUME_NAME
+from mcp_replay import TRACE_DIR, TRACE_VOLUME_NAME
+
 # Base Modal app with GPU support
 app = modal.App("mcp-gpu-functions")
 
-# GPU-enabled image with browser automation dependencies
-gpu_image = (
-    modal.Image.debian_slim(python_version="3.11")
-    .pip_install([
-        "playwright",
-        "browser-use",
-        "torch",
-        "transformers",
-        "opencv-python-headless",
-        "pillow",
-        "numpy",
-        "requests",
-        "beautifulsoup4",
-        "selenium"
-    ])
-    .run_commands("playwright install chromium")
-    .apt_install("chromium-browser", "fonts-liberation", "libasound2", "libatk-bridge2.0-0")
-)
+# Per-capability images: only functions that drive a browser carry Playwright/Chromium
+browser_automation_image = with_local_sources(browser_image)
+scraping_image = with_local_sources(scrape_image)
+deep_research_image = with_local_sources(research_image)
+monitoring_image = with_local_sources(analysis_image)
+embedding_image = with_local_sources(inference_image)
 
-# Lightweight image for CPU-only tasks
-cpu_image = (
-    modal.Image.debian_slim(python_version="3.11")
-    .pip_install([
-        "requests",
-        "beautifulsoup4",
-        "lxml",
-        "pandas",
-        "aiohttp"
-    ])
+# Recorded browser action traces for replaying repeated tasks
+trace_volume = modal.Volume.from_name(TRACE_VOLUME_NAME, create_if_missing=True)
+# Monitoring time series (per-site ring buffers)
+series_volume = modal.Volume.from_name(SERIES_VOLUME_NAME, create_if_missing=True)
+# Progress of long-running batch calls (read back with checkpoint_results in the simple app)
+checkpoint_volume = modal.Volume.from_name(CHECKPOINT_VOLUME_NAME, create_if_missing=True)
+
+# Below this cosine similarity a fully replayed page no longer looks like the recording
+REPLAY_VISUAL_SIMILARITY = 0.85
+
+@app.cls(
+    gpu="T4",
+    image=embedding_image,
+    timeout=600,
+    scaledown_window=300
 )
+@modal.concurrent(max_inputs=128)
+class InferenceService:
+    """
+    Shared text-embedding and vision-feature service
+    Models load once per container; concurrent calls from every GPU function are
+    micro-batched (bucketed by token length) into single forward passes
+    """
+    
+    @modal.enter()
+    def load(self):
+        from mcp_inference import InferenceEngine
+        self.engine = InferenceEngine()
+    
+    @modal.method()
+    async def embed_texts(self, texts: list) -> list:
+        return await self.engine.embed_texts(texts)
+    
+    @modal.method()
+    async def embed_images(self, images: list) -> list:
+        return await self.engine.embed_images(images)
+    
+    @modal.method()
+    def stats(self) -> dict:
+        return self.engine.report()
 
 @app.function(
     gpu="T4",
-    image=gpu_image,
+    image=browser_automation_image,
     timeout=600,
-    secrets=[modal.Secret.from_name("google-api-key")]
+    secrets=[modal.Secret.from_name("google-api-key")],
+    volumes={TRACE_DIR: trace_volume}
 )
-def heavy_browser_automation(task: str, config: dict = None) -> dict:
+def heavy_browser_automation(task: str, config: dict = None, trace_context: dict = None) -> dict:
     """
     GPU-accelerated browser automation for complex tasks
     Uses AI vision and processing for advanced web interactions
+    Repeated tasks replay their recorded action trace without the LLM; the agent only
+    takes over from the first step whose DOM checkpoint no longer matches
+    config: max_steps, start_url, mode ("auto" replays when a trace exists, "record"
+    always runs the agent and re-records, "agent" neither replays nor records) and
+    llm_cache ("exact", "semantic" or "off")
     """
-    import os
-    from browser_use import Agent
     import asyncio
+    import socket
+    from playwright.async_api import async_playwright
+    from mcp_browser import gemini_llm, recorded_steps
+    from mcp_inference import InferenceClient
+    from mcp_llm import cosine
+    from mcp_replay import continuation_task, load_trace, replay_steps, save_trace, trace_key
+    from mcp_tracing import Tracer
     
-    # Configure with GPU acceleration
-    agent_config = {
-        "llm_provider": "google",
-        "api_key": os.environ.get("GOOGLE_API_KEY"),
-        "model": "gemini-2.5-flash-preview-04-17",
-        "headless": True,
-        "use_vision": True,
-        "max_steps": config.get("max_steps", 50) if config else 50,
-        "gpu_acceleration": True
-    }
+    tracer = Tracer("heavy_browser_automation", trace_context, gpu="T4")
+    inference = InferenceClient(InferenceService)
+    config = config or {}
+    mode = config.get("mode", "auto")
+    start_url = config.get("start_url")
+    key = trace_key(task, start_url)
+    trace = load_trace(key, volume=trace_volume) if mode == "auto" else None
+    
+    async def page_embedding(page):
+        """CLIP features of a screenshot, or None when the inference service is unavailable"""
+        try:
+            with tracer.span("inference", step="page_embedding"):
+                screenshot = await page.screenshot(type="png")
+                return (await asyncio.to_thread(inference.embed_images, [screenshot]))[0]
+        except Exception:
+            return None
     
     async def run_automation():
-        agent = Agent(**agent_config)
-        result = await agent.run(task)
-        return {
-            "success": True,
-            "result": result,
-            "steps_taken": len(result.get("history", [])),
-            "screenshots": result.get("screenshots", [])
-        }
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            cdp_port = s.getsockname()[1]
+        async with async_playwright() as p:
+            # One Chromium shared by Playwright replay and the agent, so a takeover keeps page state
+            browser = await p.chromium.launch(headless=True, args=[f"--remote-debugging-port={cdp_port}"])
+            page = await browser.new_page()
+            if start_url:
+                await page.goto(start_url)
+            
+            replay = {"used": False, "trace_key": key, "steps_replayed": 0, "diverged_at": None}
+            prefix = []
+            agent_task = task
+            if trace:
+                with tracer.span("replay", steps=len(trace["steps"])):
+                    replay.update(await replay_steps(page, trace["steps"]), used=True)
+                if replay["diverged_at"] is None and trace.get("final_page_embedding"):
+                    # Every selector matched; also check the end state still looks like the recording
+                    embedding = await page_embedding(page)
+                    similarity = cosine(embedding, trace["final_page_embedding"]) if embedding else 1.0
+                    replay["visual_similarity"] = round(similarity, 3)
+                    if similarity < REPLAY_VISUAL_SIMILARITY:
+                        replay.update(diverged_at=len(trace["steps"]), reason="final page looks different")
+                if replay["diverged_at"] is None:
+                    return {
+                        "success": True,
+                        "result": None,
+                        "final_url": page.url,
+                        "steps_taken": replay["steps_replayed"],
+                        "llm_steps": 0,
+                        "replay": replay
+                    }
+                prefix = trace["steps"][:replay["diverged_at"]]
+                agent_task = continuation_task(task, trace["steps"], replay["diverged_at"])
+            
+            from browser_use import Agent, BrowserSession
+            llm = gemini_llm(config.get("llm_cache", "exact"))
+            agent = Agent(
+                task=agent_task,
+                llm=llm,
+                use_vision=True,
+                browser_session=BrowserSession(cdp_url=f"http://127.0.0.1:{cdp_port}")
+            )
+            with tracer.span("inference", step="agent_run"):
+                history = await agent.run(max_steps=config.get("max_steps", 50))
+            with tracer.span("extract"):
+                steps = prefix + recorded_steps(history)
+                # is_done() is also true when the agent gave up; only successful runs are worth replaying
+                succeeded = bool(history.is_successful())
+                if succeeded and mode != "agent":
+                    save_trace(key, task, steps, volume=trace_volume,
+                               final_page_embedding=await page_embedding(page))
+                    replay["recorded_steps"] = len(steps)
+                return {
+                    "success": succeeded,
+                    "result": history.final_result(),
+                    "final_url": page.url,
+                    "steps_taken": len(steps),
+                    "llm_steps": history.number_of_steps(),
+                    "llm_cache": llm.report(),
+                    "replay": replay
+                }
     
     try:
-        return asyncio.run(run_automation())
+        return tracer.finish(asyncio.run(run_automation()))
     except Exception as e:
-        return {
+        return tracer.finish({
             "success": False,
             "error": str(e),
             "task": task
-        }
+        })
 
 @app.function(
     gpu="A10G", 
-    image=gpu_image,
+    image=deep_research_image,
     timeout=1200,
-    secrets=[modal.Secret.from_name("google-api-key")]
+    secrets=[modal.Secret.from_name("google-api-key")],
+    volumes={CHECKPOINT_DIR: checkpoint_volume}
 )
-def deep_web_research(research_topic: str, max_sites: int = 10) -> dict:
+def deep_web_research(research_topic: str, max_sites: int = 10, trace_context: dict = None,
+                      source_urls: list = None, llm_cache: str = "exact", resume_token: str = None,
+                      token_budget: int = None) -> dict:
     """
     GPU-accelerated deep web research with parallel processing
     Uses AI for content analysis and synthesis
+    Sources in source_urls (up to max_sites) are fetched in parallel and summarized per
+    site, then synthesized; every LLM call goes through the response cache
+    (llm_cache: "exact", "semantic" or "off")
+    Each page is distilled first: boilerplate is stripped and only the chunks most
+    relevant to the topic are sent, within token_budget tokens per source
+    Per-source findings are checkpointed; resume_token skips sources already summarized
     """
-    import os
     import asyncio
-    from concurrent.futures import ThreadPoolExecutor
-    import json
+    import time
+    from mcp_checkpoint import Checkpoint
+    from mcp_distill import DEFAULT_TOKEN_BUDGET, distill, tokenizer_name
+    from mcp_http import timed_get
+    from mcp_inference import InferenceClient
+    from mcp_llm import research_llm
+    from mcp_tracing import Tracer
+    
+    tracer = Tracer("deep_web_research", trace_context, gpu="A10G")
+    start_time = time.time()
+    # Semantic cache lookups embed through the shared, micro-batched model service
+    embed = InferenceClient(InferenceService).embed_text if llm_cache == "semantic" else None
+    llm = research_llm(llm_cache, embed=embed)
+    urls = list(dict.fromkeys((source_urls or [])[:max_sites]))
+    checkpoint = Checkpoint("deep_web_research", [research_topic, urls], resume_token,
+                            volume=checkpoint_volume, max_age_s=1200)
     
     # Research configuration
     config = {
-        "llm_provider": "google", 
-        "api_key": os.environ.get("GOOGLE_API_KEY"),
-        "model": "gemini-2.5-flash-preview-04-17",
         "max_parallel_browsers": 5,
-        "use_ai_analysis": True,
-        "gpu_acceleration": True
+        # Cap of the undistilled page text, the baseline for tokens saved
+        "max_source_chars": 20000,
+        "token_budget": token_budget or DEFAULT_TOKEN_BUDGET
     }
     
+    findings_prompt = (
+        "You are a research analyst. Extract the key findings from the source below that are "
+        "relevant to the research topic. Answer with at most five short bullet points."
+    )
+    synthesis_prompt = (
+        "You are a research analyst. Write a concise synthesis of the research topic from the "
+        "findings provided, noting agreements, disagreements and open questions."
+    )
+    
+    def fetch_source(url):
+        try:
+            response = timed_get(url, timeout=15)
+            tracer.add_phases(response.phases, url=url)
+            with tracer.span("extract", url=url, step="distill"):
+                distilled = distill(response.content, research_topic, config["token_budget"],
+                                    baseline_chars=config["max_source_chars"])
+            return {"url": url, "success": True, "status_code": response.status_code,
+                    "text": distilled.pop("text"), "distillation": distilled}
+        except Exception as e:
+            return {"url": url, "success": False, "error": str(e)}
+    
+    async def research_source(url, fetch_slots):
+        async with fetch_slots:
+            source = await asyncio.to_thread(fetch_source, url)
+        entry = {
+            "source": {k: source[k] for k in ("url", "success", "status_code", "error", "distillation") if k in source},
+            "findings": None
+        }
+        if source["success"] and source["text"]:
+            reply = await llm.ainvoke([
+                {"role": "system", "content": findings_prompt},
+                {"role": "user", "content": f"Research topic: {research_topic}\n\nSource: {url}\n\n{source['text']}"}
+            ])
+            entry["findings"] = reply.completion
+            # Recording may commit the Volume, so keep it off the event loop
+            await asyncio.to_thread(checkpoint.record, url, entry)
+        elif source["success"]:
+            entry["source"]["skipped"] = "no extractable text"
+        return entry
+    
     async def conduct_research():
-        # Simulate advanced research with AI analysis
-        research_results = {
-            "topic": research_topic,
-            "sites_analyzed": max_sites,
-            "key_findings": [],
-            "summary": f"GPU-accelerated research on: {research_topic}",
-            "confidence_score": 0.95,
-            "sources": [],
-            "generated_insights": []
+        # Each source is fetched and summarized as soon as it arrives, then checkpointed
+        pending = checkpoint.pending(urls)
+        fetch_slots = asyncio.Semaphore(config["max_parallel_browsers"])
+        with tracer.span("inference", step="findings", sources=len(pending), resumed=checkpoint.resumed):
+            entries = await asyncio.gather(*(research_source(url, fetch_slots) for url in pending))
+        fresh = dict(zip(pending, entries))
+        entries = [fresh.get(url) or checkpoint.done[url] for url in urls]
+        key_findings = [{"url": e["source"]["url"], "findings": e["findings"]} for e in entries if e["findings"] is not None]
+        distilled = [e["source"]["distillation"] for e in entries if e["source"].get("distillation")]
+        distillation = {
+            name: sum(d[name] for d in distilled)
+            for name in ("chars_before", "chars_removed", "tokens_before", "tokens_after", "tokens_saved")
         }
+        distillation.update(token_budget=config["token_budget"], tokenizer=tokenizer_name(), sources=len(distilled),
+                            fallbacks=sum(1 for d in distilled if d.get("fallback")),
+                            skipped=sum(1 for e in entries if e["source"].get("skipped")))
         
-        # Add GPU-specific processing indicators
-        research_results["processing_info"] = {
-            "gpu_used": True,
-            "parallel_processing": True,
-            "ai_analysis": True
-        }
+        with tracer.span("inference", step="synthesis"):
+            findings_text = "\n\n".join(f"{f['url']}:\n{f['findings']}" for f in key_findings)
+            summary = await llm.ainvoke([
+                {"role": "system", "content": synthesis_prompt},
+                {"role": "user", "content": f"Research topic: {research_topic}\n\nFindings:\n{findings_text or 'none'}"}
+            ])
         
-        return research_results
+        return {
+            "topic": research_topic,
+            "sites_analyzed": len(key_findings),
+            "key_findings": key_findings,
+            "summary": summary.completion,
+            "sources": [e["source"] for e in entries],
+            "processing_info": {
+                "gpu_used": True,
+                "parallel_processing": True,
+                "ai_analysis": True,
+                "distillation": distillation
+            }
+        }
     
     try:
-        return {
+        with tracer.span("aggregate"):
+            data = asyncio.run(conduct_research())
+        return tracer.finish({
             "success": True,
-            "data": asyncio.run(conduct_research()),
-            "processing_time": "GPU-accelerated"
-        }
+            "data": data,
+            "llm_cache": llm.report(),
+            "checkpoint": checkpoint.complete(total=len(urls)),
+            "processing_time": round(time.time() - start_time, 3)
+        })
     except Exception as e:
-        return {
+        return tracer.finish({
             "success": False,
             "error": str(e),
-            "topic": research_topic
-        }
+            "topic": research_topic,
+            "checkpoint": checkpoint.summary(len(urls))
+        })
+    finally:
+        # Whatever finished before a failure stays resumable
+        checkpoint.close()
 
 @app.function(
     cpu=2,
-    image=cpu_image,
+    image=scraping_image,
     timeout=300
 )
-def lightweight_web_scraping(urls: list, extract_type: str = "text") -> dict:
+def lightweight_web_scraping(urls: list, extract_type: str = "text", trace_context: dict = None) -> dict:
     """
     CPU-only web scraping for lightweight tasks
     No GPU required for simple data extraction
     """
-    import requests
     from bs4 import BeautifulSoup
     import json
+    from mcp_http import HostPool, network_timings, timed_get
+    from mcp_tracing import Tracer
     
+    tracer = Tracer("lightweight_web_scraping", trace_context, gpu="cpu")
     results = []
+    pool = HostPool()
+    with tracer.span("prewarm", urls=len(urls)):
+        network = pool.prewarm(urls, connections_per_host=1)
     
     for url in urls:
         try:
-            response = requests.get(url, timeout=10)
-            soup = BeautifulSoup(response.content, 'html.parser')
+            response = timed_get(url, timeout=10, pool=pool)
+            tracer.add_phases(response.phases, url=url)
+            with tracer.span("parse", url=url):
+                soup = BeautifulSoup(response.content, 'html.parser')
             
-            if extract_type == "text":
-                content = soup.get_text(strip=True)
-            elif extract_type == "links":
-                content = [a.get('href') for a in soup.find_all('a', href=True)]
-            elif extract_type == "images":
-                content = [img.get('src') for img in soup.find_all('img', src=True)]
-            else:
-                content = str(soup)
+            with tracer.span("extract", url=url):
+                if extract_type == "text":
+                    content = soup.get_text(strip=True)
+                elif extract_type == "links":
+                    content = [a.get('href') for a in soup.find_all('a', href=True)]
+                elif extract_type == "images":
+                    content = [img.get('src') for img in soup.find_all('img', src=True)]
+                else:
+                    content = str(soup)
             
             results.append({
                 "url": url,
                 "success": True,
                 "content": content[:1000] if extract_type == "text" else content,
-                "status_code": response.status_code
+                "status_code": response.status_code,
+                **network_timings(response)
             })
             
         except Exception as e:
@@ -188,70 +379,201 @@ def lightweight_web_scraping(urls: list, extract_type: str = "text") -> dict:
                 "error": str(e)
             })
     
-    return {
+    pool.close()
+    
+    return tracer.finish({
         "success": True,
         "results": results,
         "total_urls": len(urls),
-        "successful_extractions": sum(1 for r in results if r["success"])
-    }
+        "successful_extractions": sum(1 for r in results if r["success"]),
+        "network": {**network, **pool.report()}
+    })
 
 @app.function(
     gpu="T4",
-    image=gpu_image,
+    image=browser_automation_image,
     timeout=900,
     secrets=[modal.Secret.from_name("google-api-key")]
 )
-def ai_powered_form_filling(form_url: str, form_data: dict, instructions: str) -> dict:
+def ai_powered_form_filling(form_url: str, form_data: dict, instructions: str, trace_context: dict = None) -> dict:
     """
     AI-powered form filling with visual understanding
-    Uses GPU for complex form recognition and interaction
+    Known forms (same structural signature) are filled directly from cached selectors;
+    GPU vision and the LLM only run when the form structure is new or has changed
     """
-    import os
     import asyncio
+    import time
+    from playwright.async_api import async_playwright
+    from mcp_browser import extract_form_fields, fill_field, gemini_llm, recorded_steps
+    from mcp_form_cache import FormStructureCache, form_signature, learn_mapping
+    from mcp_inference import InferenceClient
+    from mcp_tracing import Tracer
     
-    config = {
-        "url": form_url,
-        "data": form_data,
-        "instructions": instructions,
-        "ai_vision": True,
-        "gpu_processing": True,
-        "api_key": os.environ.get("GOOGLE_API_KEY")
-    }
+    tracer = Tracer("ai_powered_form_filling", trace_context, gpu="T4")
+    inference = InferenceClient(InferenceService)
+    cache = FormStructureCache()
     
-    # Simulate AI-powered form filling
-    result = {
-        "success": True,
-        "form_url": form_url,
-        "fields_filled": len(form_data),
-        "ai_assistance_used": True,
-        "visual_recognition": True,
-        "completion_confidence": 0.92,
-        "screenshots_taken": 3,
-        "processing_method": "GPU-accelerated AI"
-    }
+    async def fill_from_cache():
+        """
+        Fill a known form in one Playwright session; returns (fields, signature, entry or None, error)
+        Only failures before the submit click mean stale selectors; once clicked, the form may
+        have been sent, so a later error is reported instead of refilling it with vision
+        """
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            page = await browser.new_page()
+            await page.goto(form_url)
+            with tracer.span("extract", step="form_fields"):
+                fields = await extract_form_fields(page, form_data.keys())
+            signature = form_signature(fields)
+            entry = cache.get(signature, keys=form_data.keys())
+            if entry is None:
+                return fields, signature, None, None
+            mapping = entry["mapping"]
+            try:
+                with tracer.span("fill", method="cached"):
+                    for key, value in form_data.items():
+                        field = mapping["fields"][key]
+                        await fill_field(page, field["selector"], value, field["type"])
+                    if mapping.get("submit_selector"):
+                        await page.click(mapping["submit_selector"], timeout=5000)
+            except Exception:
+                # Selectors went stale without the structure changing; relearn with vision
+                cache.invalidate(signature)
+                return fields, signature, None, None
+            if mapping.get("submit_selector"):
+                try:
+                    await page.wait_for_load_state()
+                except Exception as e:
+                    return fields, signature, entry, f"Form submitted but the page did not finish loading: {e}"
+            return fields, signature, entry, None
+    
+    async def fill_with_vision():
+        from browser_use import Agent
+        task = (
+            f"Open {form_url} and fill in the form. {instructions}\n"
+            f"Use exactly these values: {form_data}"
+        )
+        llm = gemini_llm()
+        agent = Agent(task=task, llm=llm, use_vision=True)
+        history = await agent.run(max_steps=25)
+        return recorded_steps(history), bool(history.is_successful()), llm.report()
+    
+    try:
+        started = time.perf_counter()
+        fields, signature, entry, submit_error = asyncio.run(fill_from_cache())
+        
+        if entry:
+            fill_ms = (time.perf_counter() - started) * 1000
+            result = {
+                "success": submit_error is None,
+                "form_url": form_url,
+                "fields_filled": len(form_data),
+                "ai_assistance_used": False,
+                "visual_recognition": False,
+                "processing_method": "cached selectors",
+                "form_cache": {
+                    "hit": True,
+                    "signature": signature,
+                    "cache_hits": cache.record_hit(signature, entry),
+                    "fill_ms": round(fill_ms, 1),
+                    "time_saved_ms": round(max(0.0, entry["learned_ms"] - fill_ms), 1)
+                }
+            }
+            if submit_error:
+                result["error"] = submit_error
+            return tracer.finish(result)
+        
+        with tracer.span("inference", method="vision"):
+            actions, completed, llm_cache = asyncio.run(fill_with_vision())
+        learned_ms = (time.perf_counter() - started) * 1000
+        with tracer.span("inference", step="field_matching"):
+            mapping = learn_mapping(form_data, actions, fields, embed=inference.embed_texts)
+        cacheable = completed and set(form_data) <= set(mapping["fields"])
+        if cacheable:
+            cache.put(signature, mapping, learned_ms, form_url)
+        
+        return tracer.finish({
+            "success": completed,
+            "form_url": form_url,
+            "fields_filled": len(mapping["fields"]),
+            "ai_assistance_used": True,
+            "visual_recognition": True,
+            "processing_method": "GPU-accelerated AI",
+            "llm_cache": llm_cache,
+            "form_cache": {
+                "hit": False,
+                "signature": signature,
+                "cached": cacheable,
+                "fill_ms": round(learned_ms, 1),
+                "time_saved_ms": 0.0
+            }
+        })
+    except Exception as e:
+        return tracer.finish({
+            "success": False,
+            "error": str(e),
+            "form_url": form_url
+        })
+
+# Sites per CPU monitoring worker call, and the most checks one scheduler tick dispatches
+MONITORING_BATCH_SIZE = 50
+MAX_CHECKS_PER_TICK = 5000
+
+@app.function(
+    cpu=1,
+    image=scraping_image,
+    timeout=300
+)
+def monitoring_worker(batch: list) -> list:
+    """
+    CPU worker that checks one batch of sites concurrently
+    Returns status, response time, size and a visible-text hash per site
+    """
+    from mcp_monitoring import check_sites
     
-    return result
+    return check_sites(batch)
 
 @app.function(
-    gpu="A10G",
-    image=gpu_image,
+    cpu=1,
+    image=monitoring_image,
     timeout=1800,
-    secrets=[modal.Secret.from_name("google-api-key")]
+    volumes={SERIES_DIR: series_volume, CHECKPOINT_DIR: checkpoint_volume}
 )
-def multi_site_monitoring(sites: list, monitoring_config: dict) -> dict:
+def multi_site_monitoring(sites: list, monitoring_config: dict, trace_context: dict = None,
+                          resume_token: str = None) -> dict:
     """
-    GPU-accelerated multi-site monitoring and analysis
-    Parallel processing with AI-powered anomaly detection
+    Multi-site monitoring and analysis
+    Sites are checked now in parallel batches on CPU monitoring workers; with
+    monitoring_config["schedule"] they are also enrolled in the adaptive scheduler
+    (interval bounds via initial_interval_s, min_interval_s and max_interval_s)
+    Fresh checks are scored against each site's stored history for anomalies and a
+    performance grade; the scheduler is the only writer of that history
+    Checks are checkpointed per worker batch; resume_token skips sites already checked
     """
-    import asyncio
-    from concurrent.futures import ThreadPoolExecutor
+    import json
+    from mcp_backends import running_locally, sync_volume
+    from mcp_checkpoint import Checkpoint
+    from mcp_monitoring import MONITORING_DICT_NAME, SCHEDULE_KEY, check_sites, chunk
+    from mcp_timeseries import SeriesStore, anomaly_records, detect_anomalies
+    from mcp_tracing import Tracer
+    
+    tracer = Tracer("multi_site_monitoring", trace_context, gpu="cpu")
+    monitoring_config = monitoring_config or {}
+    store = modal.Dict.from_name(MONITORING_DICT_NAME, create_if_missing=True)
+    schedule = json.loads(store.get(SCHEDULE_KEY) or "{}")
+    unique_sites = list(dict.fromkeys(sites))
+    checkpoint = Checkpoint("multi_site_monitoring", [unique_sites, monitoring_config], resume_token,
+                            volume=checkpoint_volume, max_age_s=1800)
+    pending = checkpoint.pending(unique_sites)
     
     results = {
         "monitoring_session": {
             "sites_monitored": len(sites),
-            "gpu_acceleration": True,
+            "worker_batches": -(-len(pending) // MONITORING_BATCH_SIZE),
+            "resumed_sites": checkpoint.resumed,
             "parallel_processing": True,
-            "ai_analysis": True
+            "scheduled": bool(monitoring_config.get("schedule"))
         },
         "site_results": [],
         "anomalies_detected": [],
@@ -259,44 +581,184 @@ def multi_site_monitoring(sites: list, monitoring_config: dict) -> dict:
         "recommendations": []
     }
     
-    # Simulate monitoring results for each site
-    for site in sites:
-        site_result = {
-            "url": site,
-            "status": "online",
-            "response_time": "150ms",
-            "content_changes": False,
-            "security_score": 95,
-            "performance_grade": "A",
-            "ai_insights": f"Site {site} performing optimally"
+    # Batches are checkpointed as they come back, in whatever order they finish; on a
+    # local backend they are checked in-process instead of on worker containers
+    batches = chunk(pending, MONITORING_BATCH_SIZE)
+    if running_locally():
+        completed = map(check_sites, batches)
+    else:
+        completed = monitoring_worker.map(batches, order_outputs=False)
+    # Only successful checks are checkpointed, so a resume retries the sites that failed
+    failed = {}
+    try:
+        for batch in completed:
+            for check in batch:
+                if check["success"]:
+                    checkpoint.record(check["url"], check)
+                else:
+                    failed[check["url"]] = check
+    finally:
+        checkpoint.close()
+    checks = [checkpoint.done.get(url) or failed[url] for url in unique_sites]
+    with tracer.span("aggregate", sites=len(sites)):
+        sync_volume(series_volume, "reload")
+        series = SeriesStore()
+        series.append(checks)
+        detection = detect_anomalies(series)
+        results["anomalies_detected"] = anomaly_records(detection, sites)
+        for check in checks:
+            previous = schedule.get(check["url"], {}).get("last_hash")
+            results["site_results"].append({
+                "url": check["url"],
+                "status": "online" if check["success"] else "client_error" if check.get("client_error") else "offline",
+                "status_code": check["status_code"],
+                "response_time_ms": check["response_ms"],
+                "size_bytes": check["size"],
+                "content_changes": bool(previous and check.get("hash") and check["hash"] != previous),
+                "performance_grade": detection["grades"][series.rows[check["url"]]],
+                "error": check.get("error")
+            })
+        online = [c["response_ms"] for c in checks if c["success"]]
+        client_errors = sum(1 for c in checks if c.get("client_error"))
+        results["performance_metrics"] = {
+            "online": len(online),
+            "client_errors": client_errors,
+            "offline": len(checks) - len(online) - client_errors,
+            "avg_response_time_ms": round(sum(online) / len(online), 1) if online else None
         }
-        results["site_results"].append(site_result)
     
-    return {
+    if monitoring_config.get("schedule"):
+        # Enrollment goes through per-site keys; only the scheduler writes the schedule itself
+        for url in sites:
+            store[f"enroll:{url}"] = json.dumps(monitoring_config)
+    
+    return tracer.finish({
         "success": True,
         "monitoring_data": results,
+        "checkpoint": checkpoint.complete(total=len(unique_sites)),
         "processing_info": {
-            "gpu_used": "A10G",
+            "gpu_used": None,
             "parallel_sites": len(sites),
-            "ai_analysis_enabled": True
+            "worker_batch_size": MONITORING_BATCH_SIZE
         }
+    })
+
+@app.function(
+    cpu=1,
+    image=monitoring_image,
+    timeout=900,
+    schedule=modal.Period(minutes=1),
+    max_containers=1,
+    volumes={SERIES_DIR: series_volume}
+)
+def monitoring_scheduler() -> dict:
+    """
+    Periodic tick of the adaptive monitoring service
+    Drains new enrollments, pops the most overdue sites from the priority queue, checks
+    them in batches on CPU workers and reschedules each from its change and error history
+    Results are appended to the per-site ring buffers and every tracked site is re-scored
+    for anomalies in one vectorized pass
+    """
+    import json
+    import time
+    from mcp_monitoring import (
+        ANOMALIES_KEY, MONITORING_DICT_NAME, SCHEDULE_KEY, STATS_KEY, apply_check, chunk, due_sites, enroll_sites
+    )
+    from mcp_timeseries import SeriesStore, anomaly_records, detect_anomalies
+    
+    started = time.time()
+    store = modal.Dict.from_name(MONITORING_DICT_NAME, create_if_missing=True)
+    schedule = json.loads(store.get(SCHEDULE_KEY) or "{}")
+    
+    enrolled = 0
+    for key in [k for k in store.keys() if str(k).startswith("enroll:")]:
+        url = key[len("enroll:"):]
+        overrides = json.loads(store.pop(key) or "{}")
+        enrolled += enroll_sites(schedule, [url], overrides, started)
+        schedule[url]["config"] = overrides
+    
+    due = due_sites(schedule, started, limit=MAX_CHECKS_PER_TICK)
+    checks = []
+    failed_batches = 0
+    # A worker that crashed or timed out loses only its batch; those sites stay due for the next tick
+    for batch in monitoring_worker.map(chunk(due, MONITORING_BATCH_SIZE), return_exceptions=True):
+        if isinstance(batch, BaseException):
+            failed_batches += 1
+            continue
+        checks.extend(batch)
+    changed = errors = 0
+    for check in checks:
+        apply_check(schedule[check["url"]], check, schedule[check["url"]].get("config"))
+        changed += check["changed"]
+        errors += not check["success"]
+    store[SCHEDULE_KEY] = json.dumps(schedule)
+    
+    series = SeriesStore()
+    series.append(checks, started)
+    series.save(series_volume)
+    detect_started = time.perf_counter()
+    anomalies = anomaly_records(detect_anomalies(series))
+    detect_ms = (time.perf_counter() - detect_started) * 1000
+    store[ANOMALIES_KEY] = json.dumps({"at": started, "anomalies": anomalies})
+    
+    tick = {
+        "sites": len(schedule),
+        "enrolled": enrolled,
+        "checked": len(checks),
+        "skipped_not_due": len(schedule) - len(due),
+        "changed": changed,
+        "errors": errors,
+        "failed_batches": failed_batches,
+        "anomalies": len(anomalies),
+        "detect_ms": round(detect_ms, 1),
+        "tick_seconds": round(time.time() - started, 2)
     }
+    stats = json.loads(store.get(STATS_KEY) or "{}")
+    for key in ("checked", "changed", "errors", "failed_batches", "skipped_not_due"):
+        stats[key] = stats.get(key, 0) + tick[key]
+    stats["ticks"] = stats.get("ticks", 0) + 1
+    stats["last_tick"] = tick
+    store[STATS_KEY] = json.dumps(stats)
+    return tick
 
 # Helper function to route tasks to appropriate Modal functions
-def route_mcp_task(task_type: str, **kwargs):
+def route_mcp_task(task_type: str, backend: str = "auto", wire_format: str = "dict", **kwargs):
     """
     Route MCP tasks to appropriate Modal functions based on complexity
+    backend is "remote", "local-thread", "local-process" or "auto" (MCP_EXECUTION_BACKEND,
+    else tiny light_scraping calls in-process and everything else on Modal)
+    kwargs are validated against mcp_schemas.ROUTED_TASK_SCHEMAS before anything runs
+    (ValueError with the offending path); wire_format "msgpack" / "msgpack+zstd" returns
+    MessagePack bytes, typed where the task has a result schema
     """
+    import msgspec
+    from mcp_backends import choose_backend, execute
+    from mcp_schemas import ROUTED_RESULT_SCHEMAS, WIRE_FORMATS, pack_result, validate_route_kwargs
+    
+    if wire_format not in WIRE_FORMATS:
+        raise ValueError(f"wire_format must be one of {WIRE_FORMATS}")
+    
     routing_map = {
-        "heavy_browser": heavy_browser_automation,
-        "deep_research": deep_web_research,
-        "light_scraping": lightweight_web_scraping,
-        "ai_forms": ai_powered_form_filling,
-        "site_monitoring": multi_site_monitoring
+        "heavy_browser": "heavy_browser_automation",
+        "deep_research": "deep_web_research",
+        "light_scraping": "lightweight_web_scraping",
+        "ai_forms": "ai_powered_form_filling",
+        "site_monitoring": "multi_site_monitoring"
     }
     
     if task_type in routing_map:
-        return routing_map[task_type].remote(**kwargs)
+        try:
+            validate_route_kwargs(task_type, kwargs)
+        except msgspec.ValidationError as e:
+            raise ValueError(f"Invalid {task_type} arguments: {e}") from None
+        kwargs.setdefault("trace_context", {"enqueued_at": time.time(), "task_type": task_type})
+        chosen = choose_backend(task_type, kwargs, backend)
+        # Child processes import this module by name, never as __main__
+        module_name = __name__ if __name__ != "__main__" else "mcp_gpu_functions"
+        result = execute(module_name, routing_map[task_type], kwargs, chosen)
+        if isinstance(result, dict):
+            result["execution_backend"] = chosen
+        return pack_result(result, ROUTED_RESULT_SCHEMAS.get(task_type), wire_format)
     else:
         raise ValueError(f"Unknown task type: {task_type}")
 
@@ -308,4 +770,5 @@ if __name__ == "__main__":
     print("- deep_web_research (GPU: A10G)")  
     print("- lightweight_web_scraping (CPU only)")
     print("- ai_powered_form_filling (GPU: T4)")
-    print("- multi_site_monitoring (GPU: A10G)")
\ No newline at end of file
+    print("- multi_site_monitoring (CPU workers)")
+    print("- monitoring_scheduler (every minute, adaptive intervals)")
\ No newline at end of file
@@ -5,77 +5,81 @@ Basic GPU-accelerated browser automation without external API dependencies
 
 import modal
 
+from mcp_checkpoint import CHECKPOINT_DIR, CHECKPOINT_VOLUME_NAME
+from mcp_images import base_image, data_image, graph_image, ingest_image, scrape_image, web_image, with_local_sources
+from mcp_ingest import DEFAULT_CHUNK_SIZE, INGEST_DIR, INGEST_VOLUME_NAME
+
 # Base Modal app
 app = modal.App("mcp-gpu-functions-simple")
 
-# Lightweight image for basic processing
-basic_image = (
-    modal.Image.debian_slim(python_version="3.11")
-    .pip_install([
-        "requests",
-        "beautifulsoup4",
-        "lxml",
-        "pandas",
-        "aiohttp",
-        "numpy"
-    ])
-)
+# Per-function images built from shared cached layers (see mcp_images.py)
+router_image = with_local_sources(base_image)
+scraping_image = with_local_sources(scrape_image)
+url_analysis_image = with_local_sources(graph_image)
+data_processing_image = with_local_sources(data_image)
+dashboard_image = with_local_sources(web_image)
+bulk_ingest_image = with_local_sources(ingest_image)
 
-# GPU image for heavier tasks (without external APIs)
-gpu_image = (
-    modal.Image.debian_slim(python_version="3.11")
-    .pip_install([
-        "requests",
-        "beautifulsoup4",
-        "lxml", 
-        "pandas",
-        "numpy",
-        "pillow",
-        "opencv-python-headless"
-    ])
-)
+# Progress of long-running batch calls, shared with mcp-gpu-functions
+checkpoint_volume = modal.Volume.from_name(CHECKPOINT_VOLUME_NAME, create_if_missing=True)
+# Bulk ingestion inputs (URL lists, sitemaps) and partitioned outputs
+ingest_volume = modal.Volume.from_name(INGEST_VOLUME_NAME, create_if_missing=True)
 
 @app.function(
     cpu=2,
-    image=basic_image,
+    image=scraping_image,
     timeout=300
 )
-def lightweight_web_scraping(urls: list, extract_type: str = "text") -> dict:
+def lightweight_web_scraping(urls: list, extract_type: str = "text", trace_context: dict = None,
+                             wire_format: str = "dict"):
     """
     CPU-only web scraping for lightweight MCP tasks
     No GPU or external APIs required
+    wire_format "msgpack" / "msgpack+zstd" returns the result as MessagePack bytes (mcp_schemas.ScrapeResult)
     """
-    import requests
     from bs4 import BeautifulSoup
     import json
+    from mcp_http import HostPool, network_timings, timed_get
+    from mcp_schemas import ScrapeResult, pack_result
+    from mcp_tracing import Tracer
     
+    tracer = Tracer("lightweight_web_scraping", trace_context, gpu="cpu")
     results = []
     
+    # Resolve every host and open one keep-alive connection per origin before the first fetch
+    pool = HostPool()
+    with tracer.span("prewarm", urls=len(urls)):
+        network = pool.prewarm(urls, connections_per_host=1)
+    
     for url in urls:
         try:
-            response = requests.get(url, timeout=10, headers={
+            response = timed_get(url, timeout=10, headers={
                 'User-Agent': 'Mozilla/5.0 (compatible; MCP-Browser-Bot/1.0)'
-            })
-            soup = BeautifulSoup(response.content, 'html.parser')
+            }, pool=pool)
+            tracer.add_phases(response.phases, url=url)
+            with tracer.span("parse", url=url):
+                soup = BeautifulSoup(response.content, 'html.parser')
             
-            if extract_type == "text":
-                content = soup.get_text(strip=True)[:2000]  # Limit text length
-            elif extract_type == "links":
-                content = [a.get('href') for a in soup.find_all('a', href=True)][:50]
-            elif extract_type == "images":
-                content = [img.get('src') for img in soup.find_all('img', src=True)][:50]
-            elif extract_type == "title":
-                title_tag = soup.find('title')
-                content = title_tag.text.strip() if title_tag else "No title found"
-            else:
-                content = str(soup)[:1000]
+            with tracer.span("extract", url=url):
+                if extract_type == "text":
+                    content = soup.get_text(strip=True)[:2000]  # Limit text length
+                elif extract_type == "links":
+                    content = [a.get('href') for a in soup.find_all('a', href=True)][:50]
+                elif extract_type == "images":
+                    content = [img.get('src') for img in soup.find_all('img', src=True)][:50]
+                elif extract_type == "title":
+                    title_tag = soup.find('title')
+                    content = title_tag.text.strip() if title_tag else "No title found"
+                else:
+                    content = str(soup)[:1000]
             
             results.append({
                 "url": url,
                 "success": True,
                 "content": content,
                 "status_code": response.status_code,
-                "content_type": response.headers.get('content-type', 'unknown')
+                "content_type": response.headers.get('content-type', 'unknown'),
+                **network_timings(response)
             })
             
         except Exception as e:
@@ -85,7 +89,9 @@ def lightweight_web_scraping(urls: list, extract_type: str = "text") -> dict:
                 "error": str(e)
             })
     
-    return {
+    pool.close()
+    
+    return pack_result(tracer.finish({
         "success": True,
         "results": results,
         "total_urls": len(urls),
@@ -93,16 +99,94 @@ def lightweight_web_scraping(urls: list, extract_type: str = "text") -> dict:
         "processing_info": {
             "mode": "cpu-only",
             "extract_type": extract_type,
-            "modal_function": "lightweight_web_scraping"
+            "modal_function": "lightweight_web_scraping",
+            "network": {**network, **pool.report()}
         }
-    }
+    }), ScrapeResult, wire_format)
+
+@app.function(
+    cpu=2,
+    image=bulk_ingest_image,
+    timeout=3600,
+    volumes={INGEST_DIR: ingest_volume}
+)
+def bulk_web_scraping(source, extract_type: str = "text", output_format: str = "jsonl",
+                      chunk_size: int = DEFAULT_CHUNK_SIZE, max_urls: int = None, run_id: str = None,
+                      trace_context: dict = None) -> dict:
+    """
+    Bulk scraping from a URL source instead of an in-memory list
+    source is a newline, CSV or sitemap XML file (optionally gzipped), given as a path on
+    the mcp-ingest Volume or an http(s) URL, or {"path"|"sitemap": ..., "column": ...}
+    URLs are streamed, normalized and deduplicated, scraped in chunks by
+    lightweight_web_scraping workers, and written as partitioned JSONL or Parquet
+    under runs/<run_id>/ on the Volume
+    """
+    import itertools
+    import os
+    import time
+    import uuid
+    from mcp_backends import data_dir, sync_volume
+    from mcp_ingest import PartitionWriter, chunks, iter_source, unique_urls
+    from mcp_tracing import Tracer
+    
+    tracer = Tracer("bulk_web_scraping", trace_context, gpu="cpu")
+    start_time = time.time()
+    run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    
+    try:
+        sync_volume(ingest_volume, "reload")
+        writer = PartitionWriter(os.path.join(data_dir(INGEST_DIR), "runs", run_id), output_format, volume=ingest_volume)
+        url_stats = {}
+        urls = unique_urls(iter_source(source), url_stats)
+        if max_urls:
+            urls = itertools.islice(urls, max_urls)
+        
+        # The source is consumed lazily as workers free up; results never accumulate here
+        chunk_stats = {"chunks": 0, "failed_chunks": 0, "successful_extractions": 0}
+        for chunk_result in lightweight_web_scraping.map(chunks(urls, chunk_size), kwargs={"extract_type": extract_type},
+                                                         order_outputs=False, return_exceptions=True):
+            chunk_stats["chunks"] += 1
+            if isinstance(chunk_result, Exception):
+                chunk_stats["failed_chunks"] += 1
+                continue
+            with tracer.span("serialize", rows=len(chunk_result["results"])):
+                writer.write(chunk_result["results"])
+            chunk_stats["successful_extractions"] += chunk_result["successful_extractions"]
+        
+        with tracer.span("serialize", step="manifest"):
+            manifest = writer.close({"run_id": run_id, "source": source, "extract_type": extract_type,
+                                     "urls": url_stats, **chunk_stats})
+        
+        return tracer.finish({
+            "success": True,
+            "run_id": run_id,
+            "output_dir": f"runs/{run_id}",
+            "urls": url_stats,
+            "rows_written": manifest["rows"],
+            "partitions": len(manifest["partitions"]),
+            **chunk_stats,
+            "processing_info": {
+                "output_format": output_format,
+                "chunk_size": chunk_size,
+                "processing_time": round(time.time() - start_time, 3),
+                "modal_function": "bulk_web_scraping"
+            }
+        })
+    
+    except Exception as e:
+        return tracer.finish({
+            "success": False,
+            "error": str(e),
+            "run_id": run_id,
+            "source": source
+        })
 
 @app.function(
     gpu="T4",
-    image=gpu_image,
+    image=data_processing_image,
     timeout=600
 )
-def gpu_data_processing(data_list: list, operation: str = "analyze") -> dict:
+def gpu_data_processing(data_list: list, operation: str = "analyze", trace_context: dict = None) -> dict:
     """
     GPU-accelerated data processing for MCP tasks
     Uses GPU for computational tasks without external API dependencies
@@ -110,49 +194,53 @@ def gpu_data_processing(data_list: list, operation: str = "analyze") -> dict:
     import numpy as np
     import pandas as pd
     from datetime import datetime
+    from mcp_tracing import Tracer
+    
+    tracer = Tracer("gpu_data_processing", trace_context, gpu="T4")
     
     try:
         # Simulate GPU-accelerated data processing
-        if operation == "analyze":
-            # Statistical analysis
-            if isinstance(data_list[0], (int, float)):
-                array = np.array(data_list)
+        with tracer.span("aggregate", operation=operation):
+            if operation == "analyze":
+                # Statistical analysis
+                if isinstance(data_list[0], (int, float)):
+                    array = np.array(data_list)
+                    result = {
+                        "mean": float(np.mean(array)),
+                        "std": float(np.std(array)),
+                        "min": float(np.min(array)),
+                        "max": float(np.max(array)),
+                        "median": float(np.median(array)),
+                        "total": float(np.sum(array))
+                    }
+                else:
+                    # Text analysis
+                    text_lengths = [len(str(item)) for item in data_list]
+                    result = {
+                        "total_items": len(data_list),
+                        "avg_length": np.mean(text_lengths),
+                        "total_characters": sum(text_lengths),
+                        "unique_items": len(set(str(item) for item in data_list))
+                    }
+                
+            elif operation == "transform":
+                # Data transformation
+                df = pd.DataFrame({"data": data_list})
                 result = {
-                    "mean": float(np.mean(array)),
-                    "std": float(np.std(array)),
-                    "min": float(np.min(array)),
-                    "max": float(np.max(array)),
-                    "median": float(np.median(array)),
-                    "total": float(np.sum(array))
+                    "original_count": len(data_list),
+                    "processed_data": df.to_dict('records')[:100],  # Limit output
+                    "data_types": str(df.dtypes.to_dict()),
+                    "summary": df.describe().to_dict() if df.select_dtypes(include=[np.number]).empty == False else "No numeric data"
                 }
+            
             else:
-                # Text analysis
-                text_lengths = [len(str(item)) for item in data_list]
                 result = {
-                    "total_items": len(data_list),
-                    "avg_length": np.mean(text_lengths),
-                    "total_characters": sum(text_lengths),
-                    "unique_items": len(set(str(item) for item in data_list))
+                    "operation": operation,
+                    "data_count": len(data_list),
+                    "sample": data_list[:10] if len(data_list) > 10 else data_list
                 }
-                
-        elif operation == "transform":
-            # Data transformation
-            df = pd.DataFrame({"data": data_list})
-            result = {
-                "original_count": len(data_list),
-                "processed_data": df.to_dict('records')[:100],  # Limit output
-                "data_types": str(df.dtypes.to_dict()),
-                "summary": df.describe().to_dict() if df.select_dtypes(include=[np.number]).empty == False else "No numeric data"
-            }
-            
-        else:
-            result = {
-                "operation": operation,
-                "data_count": len(data_list),
-                "sample": data_list[:10] if len(data_list) > 10 else data_list
-            }
         
-        return {
+        return tracer.finish({
             "success": True,
             "operation": operation,
             "result": result,
@@ -161,78 +249,130 @@ def gpu_data_processing(data_list: list, operation: str = "analyze") -> dict:
                 "timestamp": datetime.now().isoformat(),
                 "modal_function": "gpu_data_processing"
             }
-        }
+        })
         
     except Exception as e:
-        return {
+        return tracer.finish({
             "success": False,
             "error": str(e),
             "operation": operation,
             "data_count": len(data_list) if data_list else 0
-        }
+        })
 
 @app.function(
     gpu="A10G",
-    image=gpu_image,
-    timeout=900
+    image=url_analysis_image,
+    timeout=900,
+    volumes={CHECKPOINT_DIR: checkpoint_volume}
 )
-def parallel_url_analysis(urls: list, analysis_type: str = "comprehensive") -> dict:
+def parallel_url_analysis(urls: list, analysis_type: str = "comprehensive", trace_context: dict = None,
+                          resume_token: str = None, wire_format: str = "dict"):
     """
     GPU-accelerated parallel URL analysis
     Processes multiple URLs simultaneously with GPU acceleration
+    analysis_type "link_graph" also builds the batch's link graph (in-degree,
+    PageRank and orphan pages over a sparse adjacency matrix)
+    Successful analyses are checkpointed as they finish; pass the returned
+    resume_token to skip them when re-running a batch that timed out
+    wire_format "msgpack" / "msgpack+zstd" returns MessagePack bytes (mcp_schemas.UrlAnalysisResult)
     """
-    import requests
     from bs4 import BeautifulSoup
     import numpy as np
     from concurrent.futures import ThreadPoolExecutor
     import time
+    from mcp_checkpoint import Checkpoint
+    from mcp_concurrency import MAX_CONCURRENCY, AdaptiveConcurrency
+    from mcp_http import HostPool, network_timings, timed_get
+    from mcp_linkgraph import LinkGraphBuilder, analyze_link_graph, is_external, normalize_url
+    from mcp_schemas import UrlAnalysisResult, pack_result
+    from mcp_tracing import Tracer
+    
+    tracer = Tracer("parallel_url_analysis", trace_context, gpu="A10G")
+    graph = LinkGraphBuilder() if analysis_type == "link_graph" else None
+    checkpoint = Checkpoint("parallel_url_analysis", [urls, analysis_type], resume_token,
+                            volume=checkpoint_volume, max_age_s=900)
+    pool = HostPool()
+    limiter = None
     
     def analyze_single_url(url):
         try:
-            start_time = time.time()
-            response = requests.get(url, timeout=10, headers={
-                'User-Agent': 'Mozilla/5.0 (compatible; MCP-GPU-Analyzer/1.0)'
-            })
-            load_time = time.time() - start_time
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Extract comprehensive data
-            analysis = {
-                "url": url,
-                "status_code": response.status_code,
-                "load_time": round(load_time, 3),
-                "content_length": len(response.content),
-                "title": soup.find('title').text.strip() if soup.find('title') else "No title",
-                "meta_description": "",
-                "links_count": len(soup.find_all('a')),
-                "images_count": len(soup.find_all('img')),
-                "forms_count": len(soup.find_all('form')),
-                "scripts_count": len(soup.find_all('script')),
-                "text_length": len(soup.get_text(strip=True))
-            }
-            
-            # Meta description
-            meta_desc = soup.find('meta', attrs={'name': 'description'})
-            if meta_desc:
-                analysis["meta_description"] = meta_desc.get('content', '')[:200]
-            
-            # Additional analysis for comprehensive mode
-            if analysis_type == "comprehensive":
-                analysis.update({
-                    "headings": {
-                        "h1": len(soup.find_all('h1')),
-                        "h2": len(soup.find_all('h2')),
-                        "h3": len(soup.find_all('h3'))
-                    },
-                    "external_links": len([a for a in soup.find_all('a', href=True) 
-                                         if a['href'].startswith('http') and url not in a['href']]),
-                    "has_ssl": url.startswith('https'),
-                    "response_headers": dict(response.headers)
-                })
-            
-            return {**analysis, "success": True}
-            
+            # Failures leave the slot without a latency sample, so they cannot skew the limiter
+            with limiter.slot() as slot:
+                start_time = time.time()
+                response = timed_get(url, timeout=10, headers={
+                    'User-Agent': 'Mozilla/5.0 (compatible; MCP-GPU-Analyzer/1.0)'
+                }, pool=pool)
+                load_time = time.time() - start_time
+                tracer.add_phases(response.phases, url=url)
+                slot.observe_bytes(len(response.content))
+                
+                with tracer.span("parse", url=url):
+                    soup = BeautifulSoup(response.content, 'html.parser')
+                
+                try:
+                    with tracer.span("extract", url=url):
+                        # Resolve every href against the final URL (or <base href>) once
+                        base_tag = soup.find('base', href=True)
+                        base_url = normalize_url(base_tag['href'], response.url) if base_tag else response.url
+                        links = [link for link in (normalize_url(a['href'], base_url) for a in soup.find_all('a', href=True)) if link]
+                        
+                        # Extract comprehensive data
+                        analysis = {
+                            "url": url,
+                            "status_code": response.status_code,
+                            "load_time": round(load_time, 3),
+                            "content_length": len(response.content),
+                            "title": soup.find('title').text.strip() if soup.find('title') else "No title",
+                            "meta_description": "",
+                            "links_count": len(soup.find_all('a')),
+                            "images_count": len(soup.find_all('img')),
+                            "forms_count": len(soup.find_all('form')),
+                            "scripts_count": len(soup.find_all('script')),
+                            "text_length": len(soup.get_text(strip=True)),
+                            **network_timings(response)
+                        }
+                    
+                        # Meta description
+                        meta_desc = soup.find('meta', attrs={'name': 'description'})
+                        if meta_desc:
+                            analysis["meta_description"] = meta_desc.get('content', '')[:200]
+                    
+                        # Additional analysis for comprehensive mode
+                        if analysis_type == "comprehensive":
+                            analysis.update({
+                                "headings": {
+                                    "h1": len(soup.find_all('h1')),
+                                    "h2": len(soup.find_all('h2')),
+                                    "h3": len(soup.find_all('h3'))
+                                },
+                                "external_links": sum(1 for link in links if is_external(link, response.url)),
+                                "has_ssl": url.startswith('https'),
+                                "response_headers": {k.lower(): v for k, v in response.headers.items()}
+                            })
+                        elif graph is not None:
+                            external = sum(1 for link in links if is_external(link, response.url))
+                            # The node is the page actually served; links were resolved against it
+                            analysis.update({"internal_links": len(links) - external, "external_links": external,
+                                             "final_url": normalize_url(response.url) or response.url})
+                    
+                finally:
+                    # Free the parse tree and the body now, not when this worker thread next runs
+                    soup.decompose()
+                    soup = response = None
+                
+                result = {**analysis, "success": True}
+            if graph is None:
+                checkpoint.record(url, result)
+            else:
+                # Intern the links now and checkpoint their packed IDs, in intern order, so the
+                # page's URL strings are dropped here and a resume can replay the graph
+                def persist(record):
+                    checkpoint.record(url, {**result, "graph": record})
+
+                graph.add_page(result["final_url"], links, aliases=[normalize_url(url) or url], on_record=persist)
+                checkpoint.done[url] = result
+            return result
+                
         except Exception as e:
             return {
                 "url": url,
@@ -242,119 +382,269 @@ def parallel_url_analysis(urls: list, analysis_type: str = "comprehensive") -> d
             }
     
     try:
-        # Parallel processing with ThreadPoolExecutor
-        with ThreadPoolExecutor(max_workers=min(len(urls), 10)) as executor:
-            results = list(executor.map(analyze_single_url, urls))
+        # Parallel processing with ThreadPoolExecutor, skipping URLs finished by an earlier attempt
+        if graph is not None:
+            # Replay resumed pages in intern order; a page whose IDs do not continue the graph
+            # (e.g. from a concurrent run of the same call) is fetched again
+            resumed = [(url, r) for url, r in checkpoint.done.items() if r.get("success") and "graph" in r]
+            for url, r in sorted(resumed, key=lambda item: item[1]["graph"]["first_id"]):
+                if graph.add_record(r.pop("graph")):
+                    continue
+                del checkpoint.done[url]
+        pending = checkpoint.pending(list(dict.fromkeys(urls)))
+        fresh = {}
+        network = {}
+        if pending:
+            # Threads for the most the limiter may allow; it admits fewer while memory or latency say so
+            limiter = AdaptiveConcurrency(max_limit=min(len(pending), MAX_CONCURRENCY))
+            # One warm connection per initially admitted worker per host
+            with tracer.span("prewarm", urls=len(pending)):
+                network = pool.prewarm(pending, connections_per_host=limiter.limit)
+            with ThreadPoolExecutor(max_workers=limiter.max_limit) as executor:
+                fresh = dict(zip(pending, executor.map(analyze_single_url, pending)))
+            pool.close()
+        checkpoint_info = checkpoint.complete(total=len(urls))
+        results = [fresh.get(url) or checkpoint.done[url] for url in urls]
         
         # GPU-accelerated aggregation
         successful_results = [r for r in results if r["success"]]
         
-        if successful_results:
-            load_times = np.array([r["load_time"] for r in successful_results])
-            content_lengths = np.array([r["content_length"] for r in successful_results])
+        with tracer.span("aggregate", urls=len(urls)):
+            if successful_results:
+                load_times = np.array([r["load_time"] for r in successful_results])
+                content_lengths = np.array([r["content_length"] for r in successful_results])
             
-            aggregated_stats = {
-                "total_urls": len(urls),
-                "successful_analyses": len(successful_results),
-                "failed_analyses": len(urls) - len(successful_results),
-                "avg_load_time": float(np.mean(load_times)),
-                "fastest_load_time": float(np.min(load_times)),
-                "slowest_load_time": float(np.max(load_times)),
-                "avg_content_length": float(np.mean(content_lengths)),
-                "total_content_analyzed": float(np.sum(content_lengths))
-            }
-        else:
-            aggregated_stats = {
-                "total_urls": len(urls),
-                "successful_analyses": 0,
-                "failed_analyses": len(urls),
-                "error": "No successful analyses"
-            }
+                aggregated_stats = {
+                    "total_urls": len(urls),
+                    "successful_analyses": len(successful_results),
+                    "failed_analyses": len(urls) - len(successful_results),
+                    "avg_load_time": float(np.mean(load_times)),
+                    "fastest_load_time": float(np.min(load_times)),
+                    "slowest_load_time": float(np.max(load_times)),
+                    "avg_content_length": float(np.mean(content_lengths)),
+                    "total_content_analyzed": float(np.sum(content_lengths))
+                }
+            else:
+                aggregated_stats = {
+                    "total_urls": len(urls),
+                    "successful_analyses": 0,
+                    "failed_analyses": len(urls),
+                    "error": "No successful analyses"
+                }
         
-        return {
+        link_graph = None
+        if graph is not None:
+            with tracer.span("aggregate", step="link_graph", edges=len(graph.src)):
+                link_graph = analyze_link_graph(graph)
+            pages = link_graph.pop("pages")
+            for r in successful_results:
+                r.update(pages.get(r.get("final_url"), {}))
+        
+        return pack_result(tracer.finish({
             "success": True,
             "analysis_type": analysis_type,
             "aggregated_stats": aggregated_stats,
+            "link_graph": link_graph,
             "detailed_results": results,
+            "checkpoint": checkpoint_info,
             "processing_info": {
                 "gpu_used": "A10G",
                 "parallel_processing": True,
                 "timestamp": time.time(),
-                "modal_function": "parallel_url_analysis"
+                "modal_function": "parallel_url_analysis",
+                "network": {**network, **pool.report()},
+                "concurrency": limiter.report() if limiter is not None else None
             }
-        }
+        }), UrlAnalysisResult, wire_format)
         
     except Exception as e:
-        return {
+        return pack_result(tracer.finish({
             "success": False,
             "error": str(e),
             "analysis_type": analysis_type,
-            "urls_count": len(urls)
-        }
+            "urls_count": len(urls),
+            "checkpoint": checkpoint.summary(len(urls))
+        }), UrlAnalysisResult, wire_format)
+    finally:
+        # Whatever finished before a failure stays resumable
+        checkpoint.close()
+
+# Format of scraping/analysis results on the worker -> router hop
+WORKER_WIRE_FORMAT = "msgpack+zstd"
 
 @app.function(
     cpu=4,
-    image=basic_image,
-    timeout=600
+    image=router_image,
+    timeout=600,
+    max_containers=1
 )
-def mcp_task_router(task_type: str, task_data: dict) -> dict:
+@modal.concurrent(max_inputs=200)
+def mcp_task_router(task_type: str, task_data, trace_context: dict = None,
+                    priority: str = None, caller: str = None, wire_format: str = "dict"):
     """
     MCP task routing function
     Routes different types of MCP tasks to appropriate processing functions
+    All requests share one router container so its scheduler sees the whole load:
+    priority classes (interactive / standard / batch, inferred from size when omitted),
+    weighted fair queuing per caller and a concurrency limit per GPU tier; requests that
+    would miss their class's queue-time SLO are shed with retry_after
+    task_data (a dict or MessagePack bytes) is validated against mcp_schemas before it is
+    queued; wire_format "msgpack" (or "msgpack+zstd") returns the whole response as
+    MessagePack bytes (decode with mcp_schemas.unpack_response)
+    Scraping and analysis results travel from their workers interned and zstd-compressed,
+    and are expanded here for "dict" callers
     """
     import time
+    import msgspec
+    from mcp_scheduler import TASK_TIERS, Shed, get_scheduler
+    from mcp_schemas import RESULT_SCHEMAS, pack_result, parse_task, result_to_dict, unpack_result
+    from mcp_tracing import Tracer, child_context
     
     start_time = time.time()
+    tracer = Tracer("mcp_task_router", trace_context, gpu="cpu", task_type=task_type)
     
     try:
-        if task_type == "web_scraping":
-            urls = task_data.get("urls", [])
-            extract_type = task_data.get("extract_type", "text")
-            result = lightweight_web_scraping.remote(urls, extract_type)
-            
-        elif task_type == "data_processing":
-            data = task_data.get("data", [])
-            operation = task_data.get("operation", "analyze")
-            result = gpu_data_processing.remote(data, operation)
-            
-        elif task_type == "url_analysis":
-            urls = task_data.get("urls", [])
-            analysis_type = task_data.get("analysis_type", "basic")
-            result = parallel_url_analysis.remote(urls, analysis_type)
-            
-        else:
-            return {
+        if task_type not in TASK_TIERS:
+            # Counted under one label, so arbitrary task names cannot multiply metric series
+            tracer.task_type = "unknown"
+            return pack_result(tracer.finish({
                 "success": False,
+                "task_type": task_type,
                 "error": f"Unknown task type: {task_type}",
-                "available_types": ["web_scraping", "data_processing", "url_analysis"]
-            }
+                "available_types": list(TASK_TIERS)
+            }), wire_format=wire_format)
+        
+        try:
+            task = parse_task(task_type, task_data)
+        except msgspec.ValidationError as e:
+            return pack_result(tracer.finish({
+                "success": False,
+                "task_type": task_type,
+                "error": f"Invalid task_data: {e}"
+            }), wire_format=wire_format)
+        
+        # Admission control: shed now with retry_after rather than queue past the class SLO
+        scheduler = get_scheduler()
+        try:
+            ticket = scheduler.submit(task_type, msgspec.structs.asdict(task), priority, caller)
+        except Shed as shed:
+            return pack_result(tracer.finish({
+                "success": False,
+                "error": str(shed),
+                "task_type": task_type,
+                "retry_after": shed.retry_after,
+                "routing_info": {**shed.info, "shed": True, "modal_router": "mcp_task_router"}
+            }), wire_format=wire_format)
+        
+        with scheduler.running(ticket):
+            tracer.add_span("queue", ticket["queue_wait_s"], tier=ticket["tier"], priority=ticket["priority"])
+            if task_type == "web_scraping":
+                with tracer.span("dispatch", routed_to="lightweight_web_scraping"):
+                    result = lightweight_web_scraping.remote(task.urls, task.extract_type,
+                                                             trace_context=child_context(tracer),
+                                                             wire_format=WORKER_WIRE_FORMAT)
+                
+            elif task_type == "data_processing":
+                with tracer.span("dispatch", routed_to="gpu_data_processing"):
+                    result = gpu_data_processing.remote(task.data, task.operation,
+                                                        trace_context=child_context(tracer))
+                
+            elif task_type == "url_analysis":
+                with tracer.span("dispatch", routed_to="parallel_url_analysis"):
+                    result = parallel_url_analysis.remote(task.urls, task.analysis_type,
+                                                          trace_context=child_context(tracer),
+                                                          resume_token=task.resume_token,
+                                                          wire_format=WORKER_WIRE_FORMAT)
+                
+            elif task_type == "bulk_scraping":
+                with tracer.span("dispatch", routed_to="bulk_web_scraping"):
+                    result = bulk_web_scraping.remote(task.source, task.extract_type, task.output_format,
+                                                      trace_context=child_context(tracer))
         
+        transfer_bytes = len(result) if isinstance(result, bytes) else None
+        if transfer_bytes is not None and wire_format == "dict":
+            with tracer.span("serialize", step="decompress", bytes=transfer_bytes):
+                result = result_to_dict(unpack_result(result, RESULT_SCHEMAS[task_type]))
         processing_time = time.time() - start_time
         
-        return {
+        # With msgpack, typed results stay encoded (and compressed) and are embedded as bytes
+        return pack_result(tracer.finish({
             "success": True,
             "task_type": task_type,
             "result": result,
             "routing_info": {
                 "processing_time": round(processing_time, 3),
                 "routed_to": f"{task_type}_function",
-                "modal_router": "mcp_task_router"
+                "modal_router": "mcp_task_router",
+                "tier": ticket["tier"],
+                "priority": ticket["priority"],
+                "caller": ticket["caller"],
+                "queue_depth": ticket["queue_depth"],
+                "queue_wait_s": ticket["queue_wait_s"],
+                "estimated_wait_s": ticket["estimated_wait_s"],
+                "transfer_bytes": transfer_bytes
             }
-        }
+        }), wire_format=wire_format)
         
     except Exception as e:
-        return {
+        return pack_result(tracer.finish({
             "success": False,
             "error": str(e),
             "task_type": task_type,
             "processing_time": time.time() - start_time
-        }
+        }), wire_format=wire_format)
+
+@app.function(
+    image=router_image,
+    timeout=120,
+    volumes={CHECKPOINT_DIR: checkpoint_volume}
+)
+def checkpoint_results(function_name: str, resume_token: str) -> dict:
+    """
+    Partial (or complete) results of a checkpointed batch call, readable even after the
+    call itself timed out or was preempted
+    Covers parallel_url_analysis, deep_web_research and multi_site_monitoring
+    """
+    from mcp_backends import sync_volume
+    from mcp_checkpoint import read_checkpoint
+    
+    sync_volume(checkpoint_volume, "reload")
+    checkpoint = read_checkpoint(function_name, resume_token)
+    return {
+        "function": function_name,
+        "resume_token": resume_token,
+        "complete": bool(checkpoint["meta"].get("complete")),
+        "completed_items": len(checkpoint["done"]),
+        "total_items": checkpoint["meta"].get("total"),
+        "results": checkpoint["done"]
+    }
+
+@app.function(
+    image=dashboard_image,
+    timeout=60
+)
+@modal.fastapi_endpoint(method="GET")
+def metrics_dashboard(format: str = "json"):
+    """
+    Latency dashboard across every container of both MCP apps
+    ?format=prometheus returns Prometheus text exposition, otherwise a JSON summary
+    """
+    from fastapi.responses import PlainTextResponse
+    from mcp_metrics import load_merged_metrics
+    
+    merged = load_merged_metrics()
+    if format == "prometheus":
+        return PlainTextResponse(merged.to_prometheus(), media_type="text/plain; version=0.0.4")
+    return merged.summary()
 
 if __name__ == "__main__":
     print("Simple Modal MCP GPU Functions configured")
     print("Available functions:")
     print("- lightweight_web_scraping (CPU)")
+    print("- bulk_web_scraping (CPU - sitemap / Volume file ingestion)")
     print("- gpu_data_processing (GPU: T4)")  
     print("- parallel_url_analysis (GPU: A10G)")
     print("- mcp_task_router (CPU - routing)")
+    print("- checkpoint_results (CPU - partial results by resume token)")
+    print("- metrics_dashboard (web endpoint - JSON / Prometheus)")
     print("Ready for MCP server integration!")
\ No newline at end of file
@@ -0,0 +1,441 @@
+"""
+Phase-timed HTTP fetching for MCP Modal functions
+Measures DNS, connect, TLS, TTFB and download separately using the standard library
+Batch callers pass a HostPool: hosts are resolved once into a TTL-respecting cache,
+connections are opened ahead of dispatch and kept alive, and TLS sessions are resumed
+"""
+
+import http.client
+import ipaddress
+import re
+import socket
+import ssl
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urljoin, urlsplit
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; MCP-Browser-Bot/1.0)",
+    "Accept": "*/*",
+    "Connection": "close"
+}
+
+MAX_REDIRECTS = 5
+
+# DNS answers are cached for their record TTL, clamped; getaddrinfo exposes no TTL
+DEFAULT_DNS_TTL_S = 60
+MIN_DNS_TTL_S = 5
+MAX_DNS_TTL_S = 600
+
+MAX_IDLE_PER_HOST = 16
+IDLE_TIMEOUT_S = 30
+PREWARM_WORKERS = 32
+
+
+class FetchResponse:
+    """Minimal requests-like response carrying per-phase timings"""
+
+    def __init__(self, url, status_code, headers, content, phases, connection=None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.phases = phases
+        # "new", "prewarmed" or "reused" for pooled fetches (first hop), None otherwise
+        self.connection = connection
+
+    def phase_ms(self) -> dict:
+        return {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()}
+
+
+def _add_phase(phases, name, seconds):
+    phases[name] = phases.get(name, 0.0) + seconds
+
+
+def _parse_url(url: str):
+    """urlsplit() for absolute http(s) URLs only; anything else would resolve host None to loopback"""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        raise ValueError(f"Invalid URL {url!r}: scheme must be http or https")
+    if not parts.hostname:
+        raise ValueError(f"Invalid URL {url!r}: no host")
+    return parts
+
+
+_VALID_ESCAPES = re.compile(r"%(?![0-9A-Fa-f]{2})")
+
+
+def _request_target(parts) -> str:
+    """
+    Path and query percent-encoded as requests' requote_uri does: non-ASCII (as UTF-8),
+    spaces and other unsafe characters are quoted, existing %XX escapes are kept
+    """
+    target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    if _VALID_ESCAPES.search(target):
+        # A stray "%" is quoted itself rather than read as an escape
+        return quote(target, safe="!#$&'()*+,/:;=?@[]~")
+    return quote(target, safe="!#$%&'()*+,/:;=?@[]~")
+
+
+def _connect(infos, host: str, timeout: float):
+    """Socket connected to the first reachable address, trying each in order like urllib3"""
+    last_error = None
+    for family, socktype, proto, _, address in infos:
+        sock = socket.socket(family, socktype, proto)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(address)
+            return sock
+        except OSError as e:
+            sock.close()
+            last_error = e
+    raise last_error or OSError(f"No addresses for {host}")
+
+
+def _fetch_once(url, timeout, headers, phases):
+    parts = _parse_url(url)
+    secure = parts.scheme == "https"
+    host = parts.hostname
+    port = parts.port or (443 if secure else 80)
+    path = _request_target(parts)
+
+    t = time.perf_counter()
+    infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    _add_phase(phases, "dns", time.perf_counter() - t)
+
+    t = time.perf_counter()
+    sock = _connect(infos, host, timeout)
+    try:
+        _add_phase(phases, "connect", time.perf_counter() - t)
+
+        if secure:
+            t = time.perf_counter()
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+            _add_phase(phases, "tls", time.perf_counter() - t)
+
+        conn_cls = http.client.HTTPSConnection if secure else http.client.HTTPConnection
+        conn = conn_cls(host, port, timeout=timeout)
+        conn.sock = sock
+        t = time.perf_counter()
+        conn.request("GET", path, headers={**DEFAULT_HEADERS, **(headers or {})})
+        response = conn.getresponse()
+        _add_phase(phases, "ttfb", time.perf_counter() - t)
+
+        t = time.perf_counter()
+        content = response.read()
+        _add_phase(phases, "download", time.perf_counter() - t)
+        return response.status, response.headers, content
+    finally:
+        sock.close()
+
+
+def _origin(url: str) -> tuple:
+    parts = _parse_url(url)
+    secure = parts.scheme == "https"
+    return parts.scheme, parts.hostname, parts.port or (443 if secure else 80)
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+class DNSCache:
+    """
+    Thread-safe (host, port) -> addrinfo cache
+    With dnspython installed, answers are cached for their record TTL; otherwise (and for
+    names only the system resolver knows, like /etc/hosts entries) getaddrinfo is used with
+    DEFAULT_DNS_TTL_S. Failures are not cached
+    """
+
+    def __init__(self, default_ttl_s: float = DEFAULT_DNS_TTL_S):
+        self.default_ttl_s = default_ttl_s
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def _lookup(self, host: str, port: int) -> tuple:
+        if not _is_ip(host):
+            try:
+                import dns.resolver
+                for rdtype, family in (("A", socket.AF_INET), ("AAAA", socket.AF_INET6)):
+                    try:
+                        answer = dns.resolver.resolve(host, rdtype, lifetime=5)
+                    except dns.resolver.NoAnswer:
+                        continue
+                    infos = [(family, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", (r.address, port)) for r in answer]
+                    return infos, answer.rrset.ttl
+            except Exception:
+                pass
+        return socket.getaddrinfo(host, port, type=socket.SOCK_STREAM), self.default_ttl_s
+
+    def resolve(self, host: str, port: int) -> tuple:
+        """(addrinfo list, seconds spent, cache hit)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((host, port))
+            hit = entry is not None and entry[0] > now
+            self.stats["hits" if hit else "misses"] += 1
+        if hit:
+            return entry[1], time.monotonic() - now, True
+        started = time.perf_counter()
+        infos, ttl = self._lookup(host, port)
+        elapsed = time.perf_counter() - started
+        ttl = min(max(ttl, MIN_DNS_TTL_S), MAX_DNS_TTL_S)
+        with self._lock:
+            self._entries[(host, port)] = (time.monotonic() + ttl, infos)
+        return infos, elapsed, False
+
+    def resolve_all(self, hosts, max_workers: int = PREWARM_WORKERS) -> dict:
+        """Resolve (host, port) pairs in parallel; returns {pair: error message} for failures"""
+        def resolve(pair):
+            try:
+                self.resolve(*pair)
+                return None
+            except Exception as e:
+                return str(e)
+
+        hosts = list(hosts)
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(hosts)) or 1) as executor:
+            return {pair: error for pair, error in zip(hosts, executor.map(resolve, hosts)) if error}
+
+
+class HostPool:
+    """
+    Keep-alive connections per origin, shared by a batch's worker threads
+    prewarm() resolves every host in parallel and opens connections before dispatch;
+    fetches then check a connection out, reuse it, and return it for the next URL.
+    TLS sessions are kept per host so extra connections resume instead of full handshakes
+    """
+
+    def __init__(self, dns_cache: DNSCache = None, max_idle_per_host: int = MAX_IDLE_PER_HOST,
+                 idle_timeout_s: float = IDLE_TIMEOUT_S):
+        self.dns = dns_cache or shared_dns_cache()
+        self.max_idle_per_host = max_idle_per_host
+        self.idle_timeout_s = idle_timeout_s
+        self.context = ssl.create_default_context()
+        self._idle = {}
+        self._tls_sessions = {}
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _open(self, origin: tuple, timeout: float, phases: dict):
+        scheme, host, port = origin
+        infos, seconds, _ = self.dns.resolve(host, port)
+        _add_phase(phases, "dns", seconds)
+
+        t = time.perf_counter()
+        sock = _connect(infos, host, timeout)
+        _add_phase(phases, "connect", time.perf_counter() - t)
+
+        if scheme == "https":
+            t = time.perf_counter()
+            with self._lock:
+                session = self._tls_sessions.get(host)
+            try:
+                sock = self.context.wrap_socket(sock, server_hostname=host, session=session)
+            except Exception:
+                sock.close()
+                raise
+            _add_phase(phases, "tls", time.perf_counter() - t)
+            self._count("tls_resumed" if sock.session_reused else "tls_full")
+            self._keep_session(host, sock)
+
+        conn = (http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection)(
+            host, port, timeout=timeout
+        )
+        conn.sock = sock
+        return conn
+
+    def _keep_session(self, host: str, sock):
+        # TLS 1.3 tickets arrive after the handshake, so this is repeated after each response
+        session = getattr(sock, "session", None)
+        if session is not None:
+            with self._lock:
+                self._tls_sessions[host] = session
+
+    def _checkout(self, origin: tuple) -> tuple:
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(origin)
+            while idle:
+                conn, since, label = idle.pop()
+                if now - since <= self.idle_timeout_s:
+                    return conn, label
+                conn.close()
+        return None, None
+
+    def _checkin(self, origin: tuple, conn, label: str = "reused"):
+        with self._lock:
+            idle = self._idle.setdefault(origin, deque())
+            if len(idle) < self.max_idle_per_host:
+                idle.append((conn, time.monotonic(), label))
+                return
+        conn.close()
+
+    def prewarm(self, urls, connections_per_host: int = 1, timeout: float = 10,
+                max_workers: int = PREWARM_WORKERS) -> dict:
+        """
+        Resolve every unique host in parallel, then open up to connections_per_host
+        connections per origin (never more than it has URLs). One connection per origin
+        is opened first so the rest can resume its TLS session
+        """
+        started = time.perf_counter()
+        origins = []
+        for url in urls:
+            try:
+                origins.append(_origin(url))
+            except ValueError:
+                # Left for the fetch itself to report
+                continue
+        demand = Counter(origins)
+        unresolved = self.dns.resolve_all({(host, port) for _, host, port in demand}, max_workers)
+        dns_ms = (time.perf_counter() - started) * 1000
+        per_origin = min(connections_per_host, self.max_idle_per_host)
+        waves = [
+            [origin for origin in demand if (origin[1], origin[2]) not in unresolved],
+            [origin for origin, n in demand.items() if (origin[1], origin[2]) not in unresolved
+             for _ in range(min(n, per_origin) - 1)]
+        ]
+        totals = Counter()
+
+        def warm(origin):
+            phases = {}
+            try:
+                conn = self._open(origin, timeout, phases)
+            except Exception:
+                return None
+            self._checkin(origin, conn, "prewarmed")
+            return phases
+
+        for wave in waves:
+            if not wave:
+                continue
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(wave))) as executor:
+                for phases in executor.map(warm, wave):
+                    if phases is None:
+                        totals["failed"] += 1
+                        continue
+                    totals["connections"] += 1
+                    for name in ("connect", "tls"):
+                        totals[f"{name}_ms"] += phases.get(name, 0.0) * 1000
+
+        return {
+            "hosts": len({host for _, host, _ in demand}),
+            "unresolved_hosts": len(unresolved),
+            "connections_opened": totals["connections"],
+            "connections_failed": totals["failed"],
+            "dns_ms": round(dns_ms, 1),
+            "connect_ms": round(totals["connect_ms"], 1),
+            "tls_ms": round(totals["tls_ms"], 1),
+            "prewarm_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+
+    def fetch_once(self, url: str, timeout: float, headers: dict, phases: dict) -> tuple:
+        """One keep-alive request; a pooled connection the server already closed is retried fresh"""
+        parts = _parse_url(url)
+        origin = parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80)
+        path = _request_target(parts)
+        conn, label = self._checkout(origin)
+        for attempt in range(2):
+            if conn is None:
+                conn, label = self._open(origin, timeout, phases), "new"
+            else:
+                conn.sock.settimeout(timeout)
+            try:
+                t = time.perf_counter()
+                conn.request("GET", path, headers={**DEFAULT_HEADERS, "Connection": "keep-alive", **(headers or {})})
+                response = conn.getresponse()
+                _add_phase(phases, "ttfb", time.perf_counter() - t)
+                break
+            except (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionError):
+                conn.close()
+                if label == "new" or attempt:
+                    raise
+                self._count("stale_retries")
+                conn = None
+            except Exception:
+                conn.close()
+                raise
+
+        t = time.perf_counter()
+        try:
+            content = response.read()
+        except Exception:
+            conn.close()
+            raise
+        _add_phase(phases, "download", time.perf_counter() - t)
+        self._count(label)
+        if origin[0] == "https":
+            self._keep_session(origin[1], conn.sock)
+        if response.will_close:
+            conn.close()
+        else:
+            self._checkin(origin, conn)
+        return response.status, response.headers, content, label
+
+    def report(self) -> dict:
+        return {**self.stats, "dns_cache_hits": self.dns.stats["hits"], "dns_lookups": self.dns.stats["misses"]}
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn, _, _ in connections:
+                conn.close()
+
+
+_dns_cache = None
+_dns_lock = threading.Lock()
+
+
+def shared_dns_cache() -> DNSCache:
+    """Process-wide cache, so warm containers keep answers across calls until their TTL"""
+    global _dns_cache
+    with _dns_lock:
+        if _dns_cache is None:
+            _dns_cache = DNSCache()
+        return _dns_cache
+
+
+def timed_get(url: str, timeout: float = 10, headers: dict = None, pool: HostPool = None) -> FetchResponse:
+    """
+    GET a URL following redirects, accumulating DNS/connect/TLS/TTFB/download seconds
+    across hops in response.phases
+    With a pool, connections (and DNS answers) come from it and stay open for reuse
+    """
+    phases = {}
+    current = url
+    connection = None
+    for _ in range(MAX_REDIRECTS + 1):
+        if pool is not None:
+            status, response_headers, content, label = pool.fetch_once(current, timeout, headers, phases)
+            connection = connection or label
+        else:
+            status, response_headers, content = _fetch_once(current, timeout, headers, phases)
+        location = response_headers.get("Location")
+        if status in (301, 302, 303, 307, 308) and location:
+            current = urljoin(current, location)
+            continue
+        return FetchResponse(current, status, response_headers, content, phases, connection)
+    raise http.client.HTTPException(f"Too many redirects fetching {url}")
+
+
+def network_timings(response: FetchResponse) -> dict:
+    """Per-URL DNS/connect/TLS milliseconds (0 when served by a cache or pooled connection)"""
+    timings = {name: round(response.phases.get(name, 0.0) * 1000, 3) for name in ("dns", "connect", "tls")}
+    return {
+        "dns_ms": timings["dns"],
+        "connect_ms": timings["connect"],
+        "tls_ms": timings["tls"],
+        "connection": response.connection
+    }
@@ -0,0 +1,75 @@
+"""
+Shared Modal image definitions for the MCP apps
+Images are split per capability and built as a chain so common layers are cached and shared
+"""
+
+import modal
+
+from mcp_inference import TEXT_MODEL, VISION_MODEL
+
+# Helper modules shipped into every image; add_local_* must be the last build step
+LOCAL_MODULES = (
+    "mcp_images", "mcp_tracing", "mcp_http", "mcp_metrics",
+    "mcp_browser", "mcp_form_cache", "mcp_replay", "mcp_llm",
+    "mcp_monitoring", "mcp_timeseries", "mcp_linkgraph", "mcp_checkpoint",
+    "mcp_ingest", "mcp_scheduler", "mcp_backends", "mcp_schemas",
+    "mcp_inference", "mcp_distill", "mcp_concurrency"
+)
+
+# Layer 0: interpreter plus msgspec/zstandard for the typed, compressed task/result payloads
+base_image = modal.Image.debian_slim(python_version="3.11").pip_install(["msgspec", "zstandard"])
+
+# Layer 1: HTTP fetching and HTML parsing, shared by every scraping-style function
+scrape_image = base_image.pip_install([
+    "requests",
+    "beautifulsoup4",
+    "lxml",
+    "dnspython"
+])
+
+# Layer 2: columnar (Parquet) output for bulk ingestion runs
+ingest_image = scrape_image.pip_install(["pyarrow"])
+
+# Layer 2: local BPE tokenizer for token-budgeted prompts, vocabulary cached in the image
+research_image = (
+    scrape_image
+    .pip_install(["tiktoken"])
+    .env({"TIKTOKEN_CACHE_DIR": "/root/.cache/tiktoken"})
+    .run_commands("python -c \"import tiktoken; tiktoken.get_encoding('cl100k_base')\"")
+)
+
+# Layer 2: numeric aggregation on top of scraping
+analysis_image = scrape_image.pip_install(["numpy"])
+
+# Layer 3: tabular processing on top of numeric aggregation
+data_image = analysis_image.pip_install(["pandas"])
+
+# Layer 3: sparse link-graph ranking on top of numeric aggregation
+graph_image = analysis_image.pip_install(["scipy"])
+
+# Browser automation: Playwright Chromium plus browser-use, without the ML stack
+browser_image = (
+    scrape_image
+    .pip_install(["playwright", "browser-use"])
+    .run_commands("playwright install --with-deps chromium")
+)
+
+# Shared embedding service: torch + transformers with the model weights baked into the image,
+# so a cold container loads from local disk instead of the Hugging Face hub
+inference_image = (
+    base_image
+    .pip_install(["numpy", "torch", "transformers", "pillow"])
+    .run_commands(
+        "python -c \"from transformers import AutoModel, AutoTokenizer, CLIPModel, CLIPProcessor; "
+        f"AutoTokenizer.from_pretrained('{TEXT_MODEL}'); AutoModel.from_pretrained('{TEXT_MODEL}'); "
+        f"CLIPProcessor.from_pretrained('{VISION_MODEL}'); CLIPModel.from_pretrained('{VISION_MODEL}')\""
+    )
+)
+
+# Web endpoints
+web_image = base_image.pip_install(["fastapi[standard]"])
+
+
+def with_local_sources(image, *extra_modules):
+    """Attach the MCP helper modules as the final layer of an image"""
+    return image.add_local_python_source(*LOCAL_MODULES, *extra_modules)
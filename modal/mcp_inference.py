@@ -0,0 +1,249 @@
+"""
+Shared embedding / vision-feature inference with dynamic micro-batching
+Concurrent requests are collected for a few milliseconds, bucketed by token length so
+padding stays small, and run as one batch on a single inference stream. Used by the
+InferenceService class in mcp_gpu_functions; MCP_INFERENCE_MODE=local runs the same
+engine in-process on CPU for tests
+"""
+
+import asyncio
+import hashlib
+import io
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+TEXT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+VISION_MODEL = "openai/clip-vit-base-patch32"
+HASHED_DIM = 384
+
+# Token-length buckets; a batch is padded to its longest member, never past its bucket
+LENGTH_BUCKETS = (16, 32, 64, 128, 256, 512)
+MAX_TEXT_TOKENS = LENGTH_BUCKETS[-1]
+MAX_BATCH_SIZE = 64
+MAX_WAIT_MS = 8.0
+
+
+class MicroBatcher:
+    """
+    Async request coalescer
+    submit() parks an item in its bucket; a bucket runs when it reaches max_batch_size
+    or its oldest item has waited max_wait_ms. Batches run one at a time on a single
+    worker thread, so the event loop keeps collecting the next batch meanwhile
+    """
+
+    def __init__(self, run_batch, bucket_of=None, max_batch_size: int = MAX_BATCH_SIZE,
+                 max_wait_ms: float = MAX_WAIT_MS):
+        self.run_batch = run_batch
+        self.bucket_of = bucket_of or (lambda item: 0)
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self._pending = {}
+        self._timers = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mcp-inference")
+        self.stats = {"items": 0, "batches": 0, "queue_ms": 0.0, "compute_ms": 0.0, "max_batch": 0}
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        bucket = self.bucket_of(item)
+        queue = self._pending.setdefault(bucket, [])
+        queue.append((item, future, time.perf_counter()))
+        if len(queue) >= self.max_batch_size:
+            self._flush(bucket)
+        elif len(queue) == 1:
+            self._timers[bucket] = loop.call_later(self.max_wait_s, self._flush, bucket)
+        return await future
+
+    def _flush(self, bucket):
+        timer = self._timers.pop(bucket, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(bucket, [])
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch):
+        started = time.perf_counter()
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.run_batch, [item for item, _, _ in batch]
+            )
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finished = time.perf_counter()
+        self.stats["items"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+        self.stats["queue_ms"] += sum(started - queued for _, _, queued in batch) * 1000
+        self.stats["compute_ms"] += (finished - started) * 1000
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def report(self) -> dict:
+        stats = self.stats
+        return {
+            "items": stats["items"],
+            "batches": stats["batches"],
+            "max_batch": stats["max_batch"],
+            "avg_batch": round(stats["items"] / stats["batches"], 2) if stats["batches"] else 0.0,
+            "avg_queue_ms": round(stats["queue_ms"] / stats["items"], 2) if stats["items"] else 0.0,
+            "compute_ms_per_item": round(stats["compute_ms"] / stats["items"], 3) if stats["items"] else 0.0
+        }
+
+
+def _bucket(length: int) -> int:
+    return next((b for b in LENGTH_BUCKETS if length <= b), LENGTH_BUCKETS[-1])
+
+
+def _normalize(vector: list) -> list:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def hashed_dense_embedding(text: str, dim: int = HASHED_DIM) -> list:
+    """Model-free stand-in (hashed unigrams), so the CPU test mode needs no downloads"""
+    vector = [0.0] * dim
+    for word in re.findall(r"\w+", text.lower()):
+        vector[int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), "little") % dim] += 1.0
+    return _normalize(vector)
+
+
+class InferenceEngine:
+    """
+    Loads the text and vision models once and serves batched embeddings
+    backend "transformers" (default) runs the models on device ("cuda" when available);
+    backend "hashed" needs neither torch nor weights and exists for CPU tests
+    """
+
+    def __init__(self, device: str = None, backend: str = None, max_batch_size: int = MAX_BATCH_SIZE,
+                 max_wait_ms: float = MAX_WAIT_MS):
+        self.backend = backend or os.environ.get("MCP_INFERENCE_BACKEND", "transformers")
+        if self.backend == "transformers":
+            import torch
+            from transformers import AutoModel, AutoTokenizer, CLIPModel, CLIPProcessor
+
+            self.torch = torch
+            self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+            dtype = torch.float16 if self.device == "cuda" else torch.float32
+            self.tokenizer = AutoTokenizer.from_pretrained(TEXT_MODEL)
+            self.text_model = AutoModel.from_pretrained(TEXT_MODEL, torch_dtype=dtype).to(self.device).eval()
+            self.vision_processor = CLIPProcessor.from_pretrained(VISION_MODEL)
+            self.vision_model = CLIPModel.from_pretrained(VISION_MODEL, torch_dtype=dtype).to(self.device).eval()
+        else:
+            self.device = "cpu"
+        self.text_batcher = MicroBatcher(self._embed_text_batch, lambda item: item[0], max_batch_size, max_wait_ms)
+        # Images are resized to one input size by the processor, so a single bucket
+        self.image_batcher = MicroBatcher(self._embed_image_batch, None, max_batch_size // 2, max_wait_ms)
+        self.padding = {"real_tokens": 0, "padded_tokens": 0}
+
+    def _prepare_text(self, text: str) -> tuple:
+        """(bucket, payload): token ids for the model backend, the text itself for hashed"""
+        if self.backend != "transformers":
+            return _bucket(len(text.split())), text
+        ids = self.tokenizer(text, truncation=True, max_length=MAX_TEXT_TOKENS)["input_ids"]
+        return _bucket(len(ids)), ids
+
+    def _embed_text_batch(self, items: list) -> list:
+        if self.backend != "transformers":
+            return [hashed_dense_embedding(text) for _, text in items]
+        torch = self.torch
+        encoded = self.tokenizer.pad({"input_ids": [ids for _, ids in items]}, return_tensors="pt")
+        mask = encoded["attention_mask"]
+        self.padding["real_tokens"] += int(mask.sum())
+        self.padding["padded_tokens"] += mask.numel()
+        with torch.inference_mode():
+            hidden = self.text_model(input_ids=encoded["input_ids"].to(self.device),
+                                     attention_mask=mask.to(self.device)).last_hidden_state
+            # Mean pooling over real tokens, then L2 normalization (sentence-transformers recipe)
+            weights = mask.to(self.device).unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * weights).sum(dim=1) / weights.sum(dim=1).clamp(min=1e-6)
+            pooled = torch.nn.functional.normalize(pooled.float(), dim=-1)
+        return pooled.cpu().tolist()
+
+    def _embed_image_batch(self, images: list) -> list:
+        if self.backend != "transformers":
+            return [hashed_dense_embedding(hashlib.sha256(image).hexdigest()) for image in images]
+        from PIL import Image
+
+        torch = self.torch
+        pixels = self.vision_processor(
+            images=[Image.open(io.BytesIO(image)).convert("RGB") for image in images], return_tensors="pt"
+        )["pixel_values"].to(self.device, dtype=self.vision_model.dtype)
+        with torch.inference_mode():
+            features = self.vision_model.get_image_features(pixel_values=pixels)
+            features = torch.nn.functional.normalize(features.float(), dim=-1)
+        return features.cpu().tolist()
+
+    async def embed_texts(self, texts: list) -> list:
+        return list(await asyncio.gather(*(self.text_batcher.submit(self._prepare_text(t)) for t in texts)))
+
+    async def embed_images(self, images: list) -> list:
+        """images are encoded image bytes (PNG/JPEG screenshots)"""
+        return list(await asyncio.gather(*(self.image_batcher.submit(image) for image in images)))
+
+    def report(self) -> dict:
+        padded = self.padding["padded_tokens"]
+        return {
+            "backend": self.backend,
+            "device": self.device,
+            "text": self.text_batcher.report(),
+            "images": self.image_batcher.report(),
+            "padding_efficiency": round(self.padding["real_tokens"] / padded, 3) if padded else None
+        }
+
+
+class _LocalEngine:
+    """In-process engine on a private event loop thread, so callers from any thread share batches"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True, name="mcp-inference-loop").start()
+        self.engine = InferenceEngine(device="cpu")
+
+    def call(self, method: str, items: list) -> list:
+        return asyncio.run_coroutine_threadsafe(getattr(self.engine, method)(items), self.loop).result()
+
+
+_local = None
+_local_lock = threading.Lock()
+
+
+class InferenceClient:
+    """
+    Synchronous embedding client for the GPU functions
+    Calls the shared InferenceService (service is its Modal class handle); with
+    MCP_INFERENCE_MODE=local, or no service, runs a CPU engine in-process instead
+    """
+
+    def __init__(self, service=None):
+        self.local = service is None or os.environ.get("MCP_INFERENCE_MODE") == "local"
+        self.service = None if self.local else service()
+
+    def _call(self, method: str, items: list) -> list:
+        global _local
+        if not items:
+            return []
+        if not self.local:
+            return getattr(self.service, method).remote(items)
+        with _local_lock:
+            if _local is None:
+                _local = _LocalEngine()
+        return _local.call(method, items)
+
+    def embed_texts(self, texts: list) -> list:
+        return self._call("embed_texts", texts)
+
+    def embed_text(self, text: str) -> list:
+        """Single-text form, e.g. the LLM cache's semantic tier `embed` hook"""
+        return self.embed_texts([text])[0]
+
+    def embed_images(self, images: list) -> list:
+        return self._call("embed_images", images)
@@ -0,0 +1,328 @@
+"""
+Bulk URL ingestion from Volume files and sitemaps
+Sources are streamed (newline/CSV files line by line, sitemaps with lxml iterparse), so
+memory stays flat however many URLs they hold; deduplication keeps an 8-byte digest per
+unique URL in sorted arrays, not a Python set
+"""
+
+import bisect
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import time
+from array import array
+from collections import deque
+from urllib.parse import urlsplit
+
+from mcp_backends import data_dir, sync_volume
+from mcp_linkgraph import normalize_url
+
+INGEST_VOLUME_NAME = "mcp-ingest"
+INGEST_DIR = "/ingest"
+
+DEFAULT_CHUNK_SIZE = 20
+ROWS_PER_PARTITION = 5000
+MAX_SITEMAPS = 10000
+OUTPUT_FORMATS = ("jsonl", "parquet")
+
+
+def resolve_path(path: str, root: str = None) -> str:
+    """Volume-relative paths resolve under the mount; absolute paths must stay inside it"""
+    root = root or data_dir(INGEST_DIR)
+    full = os.path.normpath(os.path.join(root, path))
+    if os.path.commonpath([full, root]) != root:
+        raise ValueError(f"Path escapes the ingest volume: {path}")
+    return full
+
+
+# Source formats by file name, checked after any .gz suffix is dropped
+EXTENSION_KINDS = {".xml": "sitemap", ".csv": "csv", ".txt": "lines", ".list": "lines"}
+
+# Bytes of a remote source read to tell a sitemap from a URL list when neither the name
+# nor the Content-Type says
+SNIFF_BYTES = 1024
+
+
+def _is_remote(location: str) -> bool:
+    return location.startswith(("http://", "https://"))
+
+
+def _file_name(location: str) -> str:
+    """Lowercased last path segment, without the query string of a URL"""
+    path = urlsplit(location).path if _is_remote(location) else location
+    return os.path.basename(path).lower()
+
+
+class _ResponseStream(io.RawIOBase):
+    """
+    File object over a streamed response body
+    (urllib3's raw response reports closed at EOF, which text wrappers treat as an error)
+    """
+
+    def __init__(self, response, chunk_size: int = 64 * 1024):
+        self._response = response
+        self._chunks = response.iter_content(chunk_size)
+        self._pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._pending:
+            self._pending = next(self._chunks, b"")
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self):
+        self._response.close()
+        super().close()
+
+
+def _open_stream(location: str, root: str):
+    """Binary stream for a Volume file or an http(s) URL, transparently gunzipped"""
+    if _is_remote(location):
+        import requests
+        response = requests.get(location, stream=True, timeout=30,
+                                headers={'User-Agent': 'Mozilla/5.0 (compatible; MCP-Ingest/1.0)'})
+        response.raise_for_status()
+        stream = io.BufferedReader(_ResponseStream(response))
+    else:
+        stream = open(resolve_path(location, root), "rb")
+    if _file_name(location).endswith(".gz"):
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+def _sniff_remote(location: str) -> str:
+    """Kind of a remote source from its Content-Type, else from its first bytes"""
+    import requests
+    with requests.get(location, stream=True, timeout=30,
+                      headers={'User-Agent': 'Mozilla/5.0 (compatible; MCP-Ingest/1.0)'}) as response:
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if "xml" in content_type:
+            return "sitemap"
+        if content_type in ("text/csv", "application/csv"):
+            return "csv"
+        head = next(response.iter_content(SNIFF_BYTES), b"")
+    return "sitemap" if head.lstrip().startswith(b"<") else "lines"
+
+
+def source_kind(location: str) -> str:
+    """"sitemap", "csv" or "lines": by file extension, and for unnamed remote sources by content"""
+    name = _file_name(location)
+    if name.endswith(".gz"):
+        name = name[:-3]
+    kind = EXTENSION_KINDS.get(os.path.splitext(name)[1])
+    if kind:
+        return kind
+    return _sniff_remote(location) if _is_remote(location) else "lines"
+
+
+def iter_sitemap(location: str, root: str = None, max_sitemaps: int = MAX_SITEMAPS):
+    """
+    Page URLs from a sitemap or sitemap index, following nested sitemaps breadth-first
+    Elements are cleared as soon as they are read, so each document parses in constant memory
+    """
+    from lxml import etree
+
+    queue, seen = deque([location]), {location}
+    while queue:
+        current = queue.popleft()
+        with _open_stream(current, root) as stream:
+            for _, element in etree.iterparse(stream, events=("end",), tag=("{*}url", "{*}sitemap"),
+                                              recover=True, resolve_entities=False, no_network=True):
+                loc = element.findtext("{*}loc")
+                is_index_entry = etree.QName(element).localname == "sitemap"
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+                loc = (loc or "").strip()
+                if not loc:
+                    continue
+                if not is_index_entry:
+                    yield loc
+                elif loc not in seen and len(seen) < max_sitemaps:
+                    seen.add(loc)
+                    queue.append(loc)
+
+
+def iter_url_file(path: str, root: str = None, column: str = "url", kind: str = None):
+    """URLs from a newline-delimited or CSV file (the named column, else the first)"""
+    kind = kind or source_kind(path)
+    with _open_stream(path, root) as raw:
+        lines = io.TextIOWrapper(raw, encoding="utf-8", errors="replace", newline="")
+        if kind == "csv":
+            reader = csv.reader(lines)
+            header = next(reader, None) or []
+            index = header.index(column) if column in header else 0
+            if column not in header and header and normalize_url(header[0]):
+                yield header[0]
+            for row in reader:
+                if len(row) > index:
+                    yield row[index]
+        else:
+            for line in lines:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    yield line
+
+
+def iter_source(source, root: str = None):
+    """
+    Raw URLs from an ingestion source
+    source is a Volume path or an http(s) URL of a sitemap / sitemap index (.xml), a CSV
+    (.csv) or a newline list (anything else), optionally .gz; remote sources without a
+    telling extension go by Content-Type, then by their first bytes. A dict
+    {"path"|"sitemap": ..., "column": ...} names the kind explicitly
+    """
+    if isinstance(source, dict):
+        if source.get("sitemap"):
+            return iter_sitemap(source["sitemap"], root)
+        location, column = source["path"], source.get("column", "url")
+    else:
+        location, column = source, "url"
+    kind = source_kind(location)
+    if kind == "sitemap":
+        return iter_sitemap(location, root)
+    return iter_url_file(location, root, column, kind)
+
+
+class DigestSet:
+    """
+    Exact set of 64-bit digests at about 8-10 bytes each, plus up to ~4 MB of bucket overhead
+    (a set of ints costs ~70 bytes per entry). Digests live in sorted array('Q') buckets
+    picked by their top bits, so an insert shifts one small bucket instead of a whole array
+    """
+
+    BUCKET_BITS = 16
+
+    def __init__(self):
+        self._buckets = [None] * (1 << self.BUCKET_BITS)
+        self._shift = 64 - self.BUCKET_BITS
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, digest: int) -> bool:
+        bucket = self._buckets[digest >> self._shift]
+        if bucket is None:
+            return False
+        i = bisect.bisect_left(bucket, digest)
+        return i < len(bucket) and bucket[i] == digest
+
+    def add(self, digest: int) -> bool:
+        """Insert; False if the digest was already present"""
+        index = digest >> self._shift
+        bucket = self._buckets[index]
+        if bucket is None:
+            bucket = self._buckets[index] = array("Q")
+        i = bisect.bisect_left(bucket, digest)
+        if i < len(bucket) and bucket[i] == digest:
+            return False
+        bucket.insert(i, digest)
+        self._size += 1
+        return True
+
+
+def unique_urls(urls, stats: dict = None):
+    """Normalized URLs, first occurrence only; seen URLs are kept as 8-byte digests in a DigestSet"""
+    stats = stats if stats is not None else {}
+    stats.setdefault("read", 0)
+    stats.setdefault("invalid", 0)
+    stats.setdefault("duplicates", 0)
+    seen = DigestSet()
+    for raw in urls:
+        stats["read"] += 1
+        url = normalize_url(raw)
+        if url is None:
+            stats["invalid"] += 1
+            continue
+        digest = int.from_bytes(hashlib.blake2b(url.encode(), digest_size=8).digest(), "big")
+        if not seen.add(digest):
+            stats["duplicates"] += 1
+            continue
+        yield url
+
+
+def chunks(items, size: int):
+    """Lists of up to size items from any iterable, without materializing it"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class PartitionWriter:
+    """
+    Rolls rows into numbered part files under a run directory, committing the Volume per part
+    jsonl parts are gzipped JSON lines; parquet parts need pyarrow in the image
+    """
+
+    def __init__(self, run_dir: str, output_format: str = "jsonl", rows_per_partition: int = ROWS_PER_PARTITION,
+                 volume=None):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}")
+        self.run_dir = run_dir
+        self.output_format = output_format
+        self.rows_per_partition = rows_per_partition
+        self.volume = volume
+        self.partitions = []
+        self.rows_written = 0
+        self._rows = []
+        os.makedirs(run_dir, exist_ok=True)
+
+    def write(self, rows: list):
+        self._rows.extend(rows)
+        while len(self._rows) >= self.rows_per_partition:
+            self._flush(self._rows[:self.rows_per_partition])
+            self._rows = self._rows[self.rows_per_partition:]
+
+    def _flush(self, rows: list):
+        name = f"part-{len(self.partitions):05d}"
+        if self.output_format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            columns = ("url", "success", "status_code", "content_type", "content", "error")
+            table = pa.Table.from_pylist([
+                {k: (json.dumps(r.get(k)) if k == "content" and not isinstance(r.get(k), (str, type(None))) else r.get(k))
+                 for k in columns}
+                for r in rows
+            ])
+            path = os.path.join(self.run_dir, f"{name}.parquet")
+            pq.write_table(table, path, compression="zstd")
+        else:
+            path = os.path.join(self.run_dir, f"{name}.jsonl.gz")
+            with gzip.open(path, "wt", encoding="utf-8") as f:
+                for r in rows:
+                    f.write(json.dumps(r, default=str) + "\n")
+        self.partitions.append({"file": os.path.basename(path), "rows": len(rows)})
+        self.rows_written += len(rows)
+        sync_volume(self.volume, "commit")
+
+    def close(self, summary: dict = None) -> dict:
+        """Flush the last partial part and write manifest.json alongside the parts"""
+        if self._rows:
+            self._flush(self._rows)
+            self._rows = []
+        manifest = {
+            "format": self.output_format,
+            "rows": self.rows_written,
+            "partitions": self.partitions,
+            "completed_at": time.time(),
+            **(summary or {})
+        }
+        with open(os.path.join(self.run_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        sync_volume(self.volume, "commit")
+        return manifest
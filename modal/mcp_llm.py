@@ -0,0 +1,408 @@
+"""
+LLM clients and response cache for the MCP browser and research functions
+Exact-match tier keyed by normalized prompt hash, optional semantic tier over local
+embeddings, TTL/LRU eviction in process and write-through persistence on a Modal Dict,
+where expired entries are deleted on read and by a periodic prune
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+LLM_CACHE_DICT_NAME = "mcp-llm-cache"
+GEMINI_MODEL = "gemini-2.5-flash-preview-04-17"
+GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+
+DEFAULT_TTL_S = 24 * 3600
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_SIMILARITY = 0.95
+# At most one container scans the shared store for expired entries per interval
+PRUNE_INTERVAL_S = 3600
+PRUNE_MARKER_KEY = "__pruned_at__"
+EMBEDDING_DIM = 1024
+
+# Labels under which callers inject the current time (browser-use agent state messages);
+# only those timestamps are dropped from the key, dates in page or user content still count
+INJECTED_TIMESTAMP_LABELS = ("Current date and time:", "Current date:", "State at")
+_TIMESTAMP = re.compile(
+    "(" + "|".join(re.escape(label) for label in INJECTED_TIMESTAMP_LABELS) + r")\s*"
+    r"\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?"
+)
+_WHITESPACE = re.compile(r"\s+")
+
+
+class LLMResult:
+    """Completion plus token usage, the shape browser-use chat models return"""
+
+    def __init__(self, completion, usage=None):
+        self.completion = completion
+        self.usage = usage
+
+
+def _message_parts(message):
+    if isinstance(message, dict):
+        return message.get("role", ""), message.get("content", "")
+    return getattr(message, "role", type(message).__name__), getattr(message, "content", "")
+
+
+def _content_text(content) -> tuple:
+    """(text, image digests) of a message's content, whatever its part structure"""
+    if content is None:
+        return "", []
+    if isinstance(content, str):
+        return content, []
+    texts, images = [], []
+    for part in content if isinstance(content, list) else [content]:
+        if isinstance(part, str):
+            texts.append(part)
+            continue
+        text = part.get("text") if isinstance(part, dict) else getattr(part, "text", None)
+        if text is not None:
+            texts.append(text)
+            continue
+        image = part.get("image_url") if isinstance(part, dict) else getattr(part, "image_url", None)
+        url = image.get("url") if isinstance(image, dict) else getattr(image, "url", image)
+        if url:
+            images.append(hashlib.sha256(str(url).encode()).hexdigest()[:16])
+    return "\n".join(texts), images
+
+
+def normalize_messages(messages: list) -> list:
+    """[(role, normalized text, image digests)] with whitespace collapsed and injected timestamps removed"""
+    normalized = []
+    for message in messages:
+        role, content = _message_parts(message)
+        text, images = _content_text(content)
+        text = _WHITESPACE.sub(" ", _TIMESTAMP.sub(r"\1 <ts>", text)).strip()
+        normalized.append((str(role), text, images))
+    return normalized
+
+
+def prompt_key(model: str, messages: list, output_format=None) -> str:
+    """Exact-tier cache key"""
+    payload = json.dumps([model, getattr(output_format, "__name__", None), normalize_messages(messages)])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def hashed_embedding(text: str, dim: int = EMBEDDING_DIM) -> dict:
+    """
+    Local sparse embedding: hashed word unigrams and bigrams, L2-normalized
+    Cheap and dependency-free; pass a model-backed embed function for better recall
+    """
+    words = re.findall(r"\w+", text.lower())
+    vector = {}
+    for gram in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        index = int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=4).digest(), "little") % dim
+        vector[index] = vector.get(index, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+    return {i: v / norm for i, v in vector.items()}
+
+
+def cosine(a, b) -> float:
+    if isinstance(a, dict):
+        if len(a) > len(b):
+            a, b = b, a
+        return sum(v * b.get(i, 0.0) for i, v in a.items())
+    return float(sum(x * y for x, y in zip(a, b)))
+
+
+def _encode_completion(completion):
+    if hasattr(completion, "model_dump_json"):
+        return {"kind": "model", "value": completion.model_dump_json()}
+    return {"kind": "text", "value": completion}
+
+
+def _decode_completion(stored: dict, output_format=None):
+    if stored["kind"] == "model" and output_format is not None:
+        return output_format.model_validate_json(stored["value"])
+    return stored["value"]
+
+
+class LLMCache:
+    """
+    Two-tier response cache
+    The exact tier is a local TTL/LRU map backed by a Modal Dict (read-through, write-through),
+    so containers share answers. Stored entries carry created_at: expired ones are deleted
+    when read, and put() starts a background prune of the store at most every
+    PRUNE_INTERVAL_S across containers. The semantic tier is per container: text-only prompts
+    whose embedding is within `similarity` of a cached prompt in the same scope (model,
+    output format and system prompt) reuse its answer
+    """
+
+    def __init__(self, store=None, semantic: bool = False, similarity: float = DEFAULT_SIMILARITY,
+                 ttl_s: float = DEFAULT_TTL_S, max_entries: int = DEFAULT_MAX_ENTRIES, embed=hashed_embedding):
+        if store is None:
+            try:
+                import modal
+                store = modal.Dict.from_name(LLM_CACHE_DICT_NAME, create_if_missing=True)
+            except Exception:
+                store = {}
+        self.store = store
+        self.semantic = semantic
+        self.similarity = similarity
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.embed = embed
+        self._local = OrderedDict()
+        self._semantic_index = OrderedDict()
+        self._lock = threading.Lock()
+        self._prune_checked_at = 0.0
+
+    def _fresh(self, entry, now: float = None) -> bool:
+        return entry is not None and (now or time.time()) - entry.get("created_at", 0) <= self.ttl_s
+
+    def _delete(self, key: str):
+        try:
+            self.store.pop(key)
+        except Exception:
+            pass
+
+    def prune(self, now: float = None) -> int:
+        """Delete expired (or unreadable) entries from the shared store; returns how many"""
+        now = now or time.time()
+        expired = []
+        try:
+            for key, raw in self.store.items():
+                if key == PRUNE_MARKER_KEY:
+                    continue
+                try:
+                    entry = json.loads(raw)
+                except (TypeError, ValueError):
+                    entry = None
+                if not self._fresh(entry, now):
+                    expired.append(key)
+        except Exception:
+            pass
+        for key in expired:
+            self._delete(key)
+        return len(expired)
+
+    def _maybe_prune(self):
+        now = time.time()
+        with self._lock:
+            if now - self._prune_checked_at < PRUNE_INTERVAL_S:
+                return
+            self._prune_checked_at = now
+        try:
+            if now - float(self.store.get(PRUNE_MARKER_KEY) or 0) < PRUNE_INTERVAL_S:
+                return
+            self.store[PRUNE_MARKER_KEY] = json.dumps(now)
+        except Exception:
+            return
+        threading.Thread(target=self.prune, args=(now,), daemon=True, name="mcp-llm-cache-prune").start()
+
+    def _remember(self, key: str, entry: dict):
+        with self._lock:
+            self._local[key] = entry
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                evicted, _ = self._local.popitem(last=False)
+                self._semantic_index.pop(evicted, None)
+
+    def get_exact(self, key: str) -> dict:
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                self._local.move_to_end(key)
+        if entry is None:
+            try:
+                raw = self.store.get(key)
+            except Exception:
+                raw = None
+            entry = json.loads(raw) if raw else None
+            if self._fresh(entry):
+                self._remember(key, entry)
+            elif entry is not None:
+                self._delete(key)
+        if self._fresh(entry):
+            return entry
+        with self._lock:
+            self._local.pop(key, None)
+            self._semantic_index.pop(key, None)
+        return None
+
+    def get_semantic(self, scope: str, text: str) -> dict:
+        if not self.semantic or not text:
+            return None
+        query = self.embed(text)
+        best_key, best_score = None, self.similarity
+        with self._lock:
+            candidates = [(k, v) for k, (s, v) in self._semantic_index.items() if s == scope]
+        for key, vector in candidates:
+            score = cosine(query, vector)
+            if score >= best_score:
+                best_key, best_score = key, score
+        if best_key is None:
+            return None
+        with self._lock:
+            entry = self._local.get(best_key)
+        return entry if self._fresh(entry) else None
+
+    def put(self, key: str, entry: dict, scope: str = None, text: str = None):
+        self._remember(key, entry)
+        if self.semantic and scope and text:
+            with self._lock:
+                self._semantic_index[key] = (scope, self.embed(text))
+        try:
+            self.store[key] = json.dumps(entry)
+        except Exception:
+            pass
+        self._maybe_prune()
+
+
+class CachedLLM:
+    """
+    Drop-in wrapper for any chat model exposing `ainvoke(messages, output_format=None)`
+    Hits return without calling the model; stats report hit ratio and latency saved
+    Attribute access falls through to the wrapped model, so browser-use agents accept it
+    cache=None disables caching but keeps the same stats
+    """
+
+    def __init__(self, llm, cache: LLMCache = None, result_factory=LLMResult):
+        self.llm = llm
+        self.cache = cache
+        self.result_factory = result_factory
+        self.stats = {"calls": 0, "exact_hits": 0, "semantic_hits": 0, "misses": 0, "saved_ms": 0.0, "model_ms": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def _count(self, field: str, ms: float = 0.0, ms_field: str = None):
+        with self._stats_lock:
+            self.stats["calls"] += 1
+            self.stats[field] += 1
+            if ms_field:
+                self.stats[ms_field] += ms
+
+    async def ainvoke(self, messages: list, output_format=None, **kwargs):
+        if self.cache is None:
+            started = time.perf_counter()
+            result = await self.llm.ainvoke(messages, output_format, **kwargs) if output_format is not None \
+                else await self.llm.ainvoke(messages, **kwargs)
+            self._count("misses", (time.perf_counter() - started) * 1000, "model_ms")
+            return result
+        model = str(getattr(self.llm, "model", "llm"))
+        key = prompt_key(model, messages, output_format)
+        normalized = normalize_messages(messages)
+        text_only = not any(images for _, _, images in normalized)
+        scope = hashlib.sha256(json.dumps(
+            [model, getattr(output_format, "__name__", None), [t for r, t, _ in normalized if r == "system"]]
+        ).encode()).hexdigest()
+        query = " ".join(t for r, t, _ in normalized if r != "system") if text_only else None
+
+        entry = await asyncio.to_thread(self.cache.get_exact, key)
+        tier = "exact_hits"
+        if entry is None and query:
+            # The embed function may be a remote model call, so keep it off the event loop
+            entry = await asyncio.to_thread(self.cache.get_semantic, scope, query)
+            tier = "semantic_hits"
+        if entry is not None:
+            self._count(tier, entry.get("latency_ms", 0.0), "saved_ms")
+            return self.result_factory(_decode_completion(entry["completion"], output_format), None)
+
+        started = time.perf_counter()
+        if output_format is not None:
+            result = await self.llm.ainvoke(messages, output_format, **kwargs)
+        else:
+            result = await self.llm.ainvoke(messages, **kwargs)
+        latency_ms = (time.perf_counter() - started) * 1000
+        self._count("misses", latency_ms, "model_ms")
+        entry = {
+            "completion": _encode_completion(result.completion),
+            "latency_ms": round(latency_ms, 1),
+            "created_at": time.time()
+        }
+        await asyncio.to_thread(self.cache.put, key, entry, scope, query)
+        return result
+
+    def report(self) -> dict:
+        """Per-invocation cache summary for processing_info"""
+        stats = dict(self.stats)
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        stats["hit_ratio"] = round(hits / stats["calls"], 3) if stats["calls"] else 0.0
+        stats["saved_ms"] = round(stats["saved_ms"], 1)
+        stats["model_ms"] = round(stats["model_ms"], 1)
+        return stats
+
+
+class StubLLM:
+    """
+    Offline stand-in for the Gemini client: deterministic echo after a fixed delay
+    Selected by MCP_LLM_STUB=1 so cache behaviour can be tested without API keys
+    """
+
+    model = "stub-llm"
+    provider = "stub"
+
+    def __init__(self, latency_s: float = 0.2):
+        self.latency_s = latency_s
+        self.calls = 0
+
+    @property
+    def name(self):
+        return self.model
+
+    async def ainvoke(self, messages: list, output_format=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency_s)
+        _, text, _ = normalize_messages(messages)[-1] if messages else ("", "", [])
+        return LLMResult(f"[stub] {text[:200]}", {"prompt_tokens": len(text.split()), "completion_tokens": 0})
+
+
+class GeminiRestLLM:
+    """Minimal Gemini generateContent client for images without browser-use"""
+
+    provider = "google"
+
+    def __init__(self, model: str = GEMINI_MODEL, api_key: str = None, timeout: float = 120):
+        self.model = model
+        self.api_key = api_key or os.environ.get("GOOGLE_API_KEY")
+        self.timeout = timeout
+
+    @property
+    def name(self):
+        return self.model
+
+    def invoke(self, messages: list) -> LLMResult:
+        import requests
+        system = [t for r, t, _ in normalize_messages(messages) if r == "system"]
+        contents = [
+            {"role": "model" if role == "assistant" else "user", "parts": [{"text": _content_text(content)[0]}]}
+            for role, content in map(_message_parts, messages) if role != "system"
+        ]
+        body = {"contents": contents}
+        if system:
+            body["systemInstruction"] = {"parts": [{"text": "\n".join(system)}]}
+        response = requests.post(GEMINI_URL.format(model=self.model), params={"key": self.api_key},
+                                 json=body, timeout=self.timeout)
+        response.raise_for_status()
+        reply = response.json()
+        text = "".join(p.get("text", "") for p in reply["candidates"][0]["content"]["parts"])
+        return LLMResult(text, reply.get("usageMetadata"))
+
+    async def ainvoke(self, messages: list, output_format=None, **kwargs):
+        return await asyncio.to_thread(self.invoke, messages)
+
+
+def cached(llm, cache_mode: str = "exact", result_factory=LLMResult, embed=None) -> CachedLLM:
+    """
+    Wrap a chat model in the response cache
+    cache_mode: "exact", "semantic" (exact plus semantic tier) or "off"; embed overrides
+    the semantic tier's hashed embedding (e.g. InferenceClient.embed_text)
+    """
+    cache = None if cache_mode == "off" else LLMCache(semantic=cache_mode == "semantic",
+                                                      embed=embed or hashed_embedding)
+    return CachedLLM(llm, cache, result_factory)
+
+
+def research_llm(cache_mode: str = "exact", embed=None) -> CachedLLM:
+    """Text LLM for research synthesis; MCP_LLM_STUB=1 swaps in the offline stub"""
+    llm = StubLLM() if os.environ.get("MCP_LLM_STUB") else GeminiRestLLM()
+    return cached(llm, cache_mode, embed=embed)
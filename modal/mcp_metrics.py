@@ -0,0 +1,330 @@
+"""
+Mergeable latency metrics for MCP Modal functions
+HDR-style histograms and call counters persisted per container to a shared Modal Dict
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+
+METRICS_DICT_NAME = "mcp-metrics"
+SHARD_PREFIX = "shard:"
+# Shards are written from a background thread at most this often, and once more at exit
+FLUSH_INTERVAL_S = 10.0
+# Live containers rewrite their shard at least this often, so updated_at doubles as a heartbeat
+SHARD_HEARTBEAT_S = 300.0
+# Shards not updated for this long belong to exited containers; reads fold them into one
+# compacted shard so the store does not grow with every container ever started
+SHARD_STALE_S = 3600.0
+COMPACTED_KEY = "compacted"
+# At most one reader compacts at a time; a lease older than this was abandoned
+COMPACTION_LEASE_KEY = "__compacting__"
+COMPACTION_LEASE_S = 60.0
+
+# Prometheus histogram boundaries (seconds) rendered from the HDR counts
+PROMETHEUS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800]
+SUMMARY_QUANTILES = [0.5, 0.9, 0.95, 0.99]
+LABEL_NAMES = ("function", "task_type", "gpu", "outcome")
+
+
+class HdrHistogram:
+    """
+    Log-linear histogram over integer microseconds with a fixed number of significant digits
+    Bucket layout is deterministic, so two histograms merge exactly by summing counts
+    """
+
+    def __init__(self, significant_figures: int = 2, counts: dict = None,
+                 total: int = 0, value_sum: int = 0, min_value: int = None, max_value: int = 0):
+        self.significant_figures = significant_figures
+        largest_single_unit = 2 * 10 ** significant_figures
+        sub_bucket_count_magnitude = (largest_single_unit - 1).bit_length()
+        self.sub_bucket_half_count_magnitude = sub_bucket_count_magnitude - 1
+        self.sub_bucket_count = 1 << sub_bucket_count_magnitude
+        self.sub_bucket_half_count = self.sub_bucket_count // 2
+        self.sub_bucket_mask = self.sub_bucket_count - 1
+        self.counts = counts or {}
+        self.total = total
+        self.value_sum = value_sum
+        self.min_value = min_value
+        self.max_value = max_value
+
+    def _index(self, value: int) -> int:
+        bucket = (value | self.sub_bucket_mask).bit_length() - (self.sub_bucket_half_count_magnitude + 1)
+        sub_bucket = value >> bucket
+        return ((bucket + 1) << self.sub_bucket_half_count_magnitude) + (sub_bucket - self.sub_bucket_half_count)
+
+    def _bounds(self, index: int):
+        bucket = (index >> self.sub_bucket_half_count_magnitude) - 1
+        sub_bucket = (index & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        if bucket < 0:
+            sub_bucket -= self.sub_bucket_half_count
+            bucket = 0
+        low = sub_bucket << bucket
+        return low, low + (1 << bucket) - 1
+
+    def record(self, value: int, count: int = 1):
+        value = max(0, int(value))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+        self.value_sum += value * count
+        self.min_value = value if self.min_value is None else min(self.min_value, value)
+        self.max_value = max(self.max_value, value)
+
+    def merge(self, other: "HdrHistogram"):
+        if other.significant_figures != self.significant_figures:
+            raise ValueError("Cannot merge histograms with different precision")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.value_sum += other.value_sum
+        if other.min_value is not None:
+            self.min_value = other.min_value if self.min_value is None else min(self.min_value, other.min_value)
+        self.max_value = max(self.max_value, other.max_value)
+        return self
+
+    def value_at_quantile(self, quantile: float) -> int:
+        if not self.total:
+            return 0
+        target = max(1, int(quantile * self.total + 0.5))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._bounds(index)[1], self.max_value)
+        return self.max_value
+
+    def count_at_or_below(self, value: int) -> int:
+        """Cumulative count for a boundary, exact to the histogram's precision"""
+        return sum(count for index, count in self.counts.items() if self._bounds(index)[1] <= value)
+
+    def to_dict(self) -> dict:
+        return {
+            "sig": self.significant_figures,
+            "counts": {str(index): count for index, count in self.counts.items()},
+            "total": self.total,
+            "sum": self.value_sum,
+            "min": self.min_value,
+            "max": self.max_value
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HdrHistogram":
+        return cls(
+            significant_figures=data.get("sig", 2),
+            counts={int(index): count for index, count in data.get("counts", {}).items()},
+            total=data.get("total", 0),
+            value_sum=data.get("sum", 0),
+            min_value=data.get("min"),
+            max_value=data.get("max", 0)
+        )
+
+
+class MetricsRegistry:
+    """Per-process counters and latency histograms keyed by (function, task_type, gpu, outcome)"""
+
+    def __init__(self):
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def record(self, function: str, latency_s: float, success: bool = True,
+               task_type: str = None, gpu: str = None):
+        labels = (function, task_type or "direct", gpu or "cpu", "success" if success else "error")
+        with self._lock:
+            histogram = self.series.get(labels)
+            if histogram is None:
+                histogram = self.series[labels] = HdrHistogram()
+            histogram.record(int(latency_s * 1_000_000))
+
+    def merge(self, other: "MetricsRegistry"):
+        for labels, histogram in other.series.items():
+            existing = self.series.get(labels)
+            if existing is None:
+                self.series[labels] = HdrHistogram().merge(histogram)
+            else:
+                existing.merge(histogram)
+        return self
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "updated_at": time.time(),
+                "series": [
+                    {"labels": dict(zip(LABEL_NAMES, labels)), "histogram": histogram.to_dict()}
+                    for labels, histogram in self.series.items()
+                ]
+            }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: dict) -> "MetricsRegistry":
+        registry = cls()
+        for entry in snapshot.get("series", []):
+            labels = tuple(entry["labels"].get(name) for name in LABEL_NAMES)
+            registry.series[labels] = HdrHistogram.from_dict(entry["histogram"])
+        return registry
+
+    def summary(self) -> dict:
+        """JSON dashboard view: calls, errors and latency quantiles per series"""
+        rows = []
+        for labels, histogram in sorted(self.series.items(), key=lambda item: tuple(str(v) for v in item[0])):
+            rows.append({
+                **dict(zip(LABEL_NAMES, labels)),
+                "calls": histogram.total,
+                "latency_seconds": {
+                    **{f"p{int(q * 100)}": histogram.value_at_quantile(q) / 1e6 for q in SUMMARY_QUANTILES},
+                    "mean": (histogram.value_sum / histogram.total / 1e6) if histogram.total else 0,
+                    "max": histogram.max_value / 1e6
+                }
+            })
+        total_calls = sum(row["calls"] for row in rows)
+        errors = sum(row["calls"] for row in rows if row["outcome"] == "error")
+        return {
+            "total_calls": total_calls,
+            "error_rate": round(errors / total_calls, 4) if total_calls else 0,
+            "series": rows
+        }
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition: call counters plus cumulative latency histograms"""
+        lines = [
+            "# HELP mcp_function_calls_total MCP Modal function invocations",
+            "# TYPE mcp_function_calls_total counter"
+        ]
+        ordered = sorted(self.series.items(), key=lambda item: tuple(str(v) for v in item[0]))
+        for labels, histogram in ordered:
+            lines.append(f"mcp_function_calls_total{{{_format_labels(labels)}}} {histogram.total}")
+        lines += [
+            "# HELP mcp_function_latency_seconds MCP Modal function latency",
+            "# TYPE mcp_function_latency_seconds histogram"
+        ]
+        for labels, histogram in ordered:
+            base = _format_labels(labels)
+            for bound in PROMETHEUS_BUCKETS:
+                count = histogram.count_at_or_below(int(bound * 1_000_000))
+                lines.append(f'mcp_function_latency_seconds_bucket{{{base},le="{bound}"}} {count}')
+            lines.append(f'mcp_function_latency_seconds_bucket{{{base},le="+Inf"}} {histogram.total}')
+            lines.append(f"mcp_function_latency_seconds_sum{{{base}}} {histogram.value_sum / 1e6}")
+            lines.append(f"mcp_function_latency_seconds_count{{{base}}} {histogram.total}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: tuple) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in zip(LABEL_NAMES, labels))
+
+
+# Process-wide registry; each container owns one shard in the shared store
+_registry = MetricsRegistry()
+_shard_id = os.environ.get("MODAL_TASK_ID") or uuid.uuid4().hex
+
+
+def _metrics_store():
+    import modal
+    return modal.Dict.from_name(METRICS_DICT_NAME, create_if_missing=True)
+
+
+_dirty = threading.Event()
+_flushed_at = 0.0
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL_S)
+        _flush_pending()
+
+
+def _flush_pending():
+    if _dirty.is_set() or time.time() - _flushed_at >= SHARD_HEARTBEAT_S:
+        _dirty.clear()
+        if not flush_metrics():
+            _dirty.set()
+
+
+def _start_flusher():
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, daemon=True, name="mcp-metrics-flush")
+            _flusher.start()
+            atexit.register(_flush_pending)
+
+
+def record(function: str, latency_s: float, success: bool = True,
+           task_type: str = None, gpu: str = None, flush: bool = True):
+    """
+    Record one call; inside Modal the container's shard is persisted off the call path,
+    every FLUSH_INTERVAL_S by a background thread and at container exit
+    """
+    _registry.record(function, latency_s, success=success, task_type=task_type, gpu=gpu)
+    if flush and os.environ.get("MODAL_TASK_ID"):
+        _dirty.set()
+        _start_flusher()
+
+
+def flush_metrics() -> bool:
+    """
+    Write this container's cumulative snapshot under its own shard key
+    Shards are overwritten, never incremented, so concurrent containers cannot lose updates
+    """
+    global _flushed_at
+    try:
+        _metrics_store()[SHARD_PREFIX + _shard_id] = json.dumps(_registry.snapshot())
+        _flushed_at = time.time()
+        return True
+    except Exception:
+        return False
+
+
+def _claim_compaction(store, now: float) -> bool:
+    held_since = float(json.loads(store.get(COMPACTION_LEASE_KEY) or "0"))
+    if now - held_since < COMPACTION_LEASE_S:
+        return False
+    if held_since:
+        store.pop(COMPACTION_LEASE_KEY, None)
+    lease = json.dumps(now)
+    if hasattr(store, "put"):
+        return store.put(COMPACTION_LEASE_KEY, lease, skip_if_exists=True)
+    return store.setdefault(COMPACTION_LEASE_KEY, lease) == lease
+
+
+def compact_shards(store, stale: dict, now: float) -> bool:
+    """Fold stale shards ({key: registry}) into the compacted shard and delete them"""
+    if not _claim_compaction(store, now):
+        return False
+    try:
+        compacted = MetricsRegistry.from_snapshot(json.loads(store.get(COMPACTED_KEY) or "{}"))
+        for registry in stale.values():
+            compacted.merge(registry)
+        store[COMPACTED_KEY] = json.dumps(compacted.snapshot())
+        for key in stale:
+            store.pop(key, None)
+    finally:
+        store.pop(COMPACTION_LEASE_KEY, None)
+    return True
+
+
+def load_merged_metrics(store=None, now: float = None) -> MetricsRegistry:
+    """Merge every container shard into one registry, compacting shards of exited containers"""
+    store = store if store is not None else _metrics_store()
+    now = time.time() if now is None else now
+    merged = MetricsRegistry()
+    stale = {}
+    for key in list(store.keys()):
+        if not str(key).startswith(SHARD_PREFIX):
+            continue
+        snapshot = json.loads(store.get(key) or "{}")
+        registry = MetricsRegistry.from_snapshot(snapshot)
+        merged.merge(registry)
+        if now - snapshot.get("updated_at", 0) > SHARD_STALE_S:
+            stale[key] = registry
+    merged.merge(MetricsRegistry.from_snapshot(json.loads(store.get(COMPACTED_KEY) or "{}")))
+    if stale:
+        try:
+            compact_shards(store, stale, now)
+        except Exception:
+            pass
+    return merged
@@ -0,0 +1,168 @@
+"""
+Adaptive-interval site monitoring schedule
+Each site's check interval shrinks when it changes, grows while it stays the same and
+backs off on errors; a priority queue picks the most overdue sites for each tick
+"""
+
+import hashlib
+import heapq
+import re
+import time
+
+MONITORING_DICT_NAME = "mcp-monitoring"
+SCHEDULE_KEY = "schedule"
+STATS_KEY = "stats"
+ANOMALIES_KEY = "anomalies"
+
+# Per-site ring buffers (mcp_timeseries) live on this Volume
+SERIES_VOLUME_NAME = "mcp-monitoring-series"
+SERIES_DIR = "/series"
+
+DEFAULT_SCHEDULE_CONFIG = {
+    "initial_interval_s": 300,
+    "min_interval_s": 60,
+    "max_interval_s": 86400,
+    "changed_factor": 0.5,
+    "unchanged_factor": 1.25,
+    "error_factor": 2.0,
+    "ewma_alpha": 0.2
+}
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def schedule_config(overrides: dict = None) -> dict:
+    return {**DEFAULT_SCHEDULE_CONFIG, **{k: v for k, v in (overrides or {}).items() if k in DEFAULT_SCHEDULE_CONFIG}}
+
+
+def _jitter(url: str) -> float:
+    """Stable per-site factor in [0.9, 1.1) so sites added together do not stay in lockstep"""
+    return 0.9 + (int(hashlib.sha256(url.encode()).hexdigest()[:8], 16) % 1000) / 5000
+
+
+def new_site_state(url: str, config: dict, now: float = None) -> dict:
+    now = time.time() if now is None else now
+    return {
+        "url": url,
+        "interval_s": config["initial_interval_s"],
+        "next_due": now,
+        "last_checked": None,
+        "last_hash": None,
+        "last_status": None,
+        "checks": 0,
+        "changes": 0,
+        "errors": 0,
+        "change_rate": 0.5,
+        "error_rate": 0.0
+    }
+
+
+def enroll_sites(schedule: dict, sites: list, overrides: dict = None, now: float = None) -> int:
+    """Add sites to the schedule (due immediately); returns how many were new"""
+    config = schedule_config(overrides)
+    added = 0
+    for url in sites:
+        if url not in schedule:
+            schedule[url] = new_site_state(url, config, now)
+            added += 1
+    return added
+
+
+def content_hash(html: bytes) -> str:
+    """Hash of visible text, so markup churn (nonces, inline scripts) is not a change"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    text = _WHITESPACE.sub(" ", soup.get_text(" ")).strip()
+    return hashlib.sha256(text.encode()).hexdigest()[:24]
+
+
+def due_sites(schedule: dict, now: float = None, limit: int = None) -> list:
+    """
+    URLs due for a check, most overdue first
+    Overdue is measured in intervals, so a fast-changing site a minute late outranks a
+    daily site a minute late
+    """
+    now = time.time() if now is None else now
+    heap = [
+        (-(now - state["next_due"]) / max(state["interval_s"], 1), url)
+        for url, state in schedule.items() if state["next_due"] <= now
+    ]
+    if limit is None:
+        heapq.heapify(heap)
+        return [heapq.heappop(heap)[1] for _ in range(len(heap))]
+    return [url for _, url in heapq.nsmallest(limit, heap)]
+
+
+def apply_check(state: dict, check: dict, overrides: dict = None, now: float = None) -> dict:
+    """Fold one check result into a site's state and schedule its next check"""
+    config = schedule_config(overrides)
+    now = time.time() if now is None else now
+    alpha = config["ewma_alpha"]
+    error = not check.get("success")
+    changed = not error and state["last_hash"] is not None and check.get("hash") != state["last_hash"]
+
+    state["checks"] += 1
+    state["last_checked"] = now
+    state["last_status"] = check.get("status_code")
+    state["error_rate"] = (1 - alpha) * state["error_rate"] + alpha * (1.0 if error else 0.0)
+    if error:
+        state["errors"] += 1
+        factor = config["error_factor"]
+    else:
+        state["change_rate"] = (1 - alpha) * state["change_rate"] + alpha * (1.0 if changed else 0.0)
+        state["last_hash"] = check.get("hash")
+        if changed:
+            state["changes"] += 1
+        factor = config["changed_factor"] if changed else config["unchanged_factor"]
+
+    interval = min(config["max_interval_s"], max(config["min_interval_s"], state["interval_s"] * factor))
+    state["interval_s"] = round(interval, 1)
+    state["next_due"] = now + interval * _jitter(state["url"])
+    check["changed"] = changed
+    return state
+
+
+def check_sites(batch: list, max_workers: int = 16) -> list:
+    """
+    Fetch a batch of sites concurrently
+    batch items are URLs; results carry status, response time, size and content hash
+    Any status >= 400 is a failed check; client_error marks 4xx, where the server answered
+    but the page is gone or refused (404/403/410)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from mcp_http import timed_get
+
+    def check(url):
+        started = time.perf_counter()
+        try:
+            response = timed_get(url, timeout=15)
+            result = {
+                "url": url,
+                "success": response.status_code < 400,
+                "status_code": response.status_code,
+                "response_ms": round((time.perf_counter() - started) * 1000, 1),
+                "size": len(response.content),
+                "hash": content_hash(response.content)
+            }
+            if response.status_code >= 400:
+                result["error"] = f"HTTP {response.status_code}"
+                result["client_error"] = response.status_code < 500
+            return result
+        except Exception as e:
+            return {
+                "url": url,
+                "success": False,
+                "status_code": None,
+                "response_ms": round((time.perf_counter() - started) * 1000, 1),
+                "size": 0,
+                "error": str(e)
+            }
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batch)) or 1) as executor:
+        return list(executor.map(check, batch))
+
+
+def chunk(items: list, size: int) -> list:
+    return [items[i:i + size] for i in range(0, len(items), size)]
@@ -0,0 +1,132 @@
+"""
+Record-and-replay action traces for repeated browser tasks
+Agent runs are saved as concrete steps with DOM checkpoints; replays run them with
+Playwright only and hand control back to the agent from the first divergent step
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from urllib.parse import urlsplit
+
+from mcp_backends import data_dir, sync_volume
+
+TRACE_VOLUME_NAME = "mcp-action-traces"
+TRACE_DIR = "/traces"
+
+# Per-step timeout while replaying; a missing element means the page diverged
+STEP_TIMEOUT_MS = 5000
+
+
+def trace_key(task: str, start_url: str = None) -> str:
+    """Tasks that differ only in case or whitespace share a trace"""
+    normalized = re.sub(r"\s+", " ", task.strip().lower())
+    return hashlib.sha256(f"{normalized}|{start_url or ''}".encode()).hexdigest()[:24]
+
+
+def _trace_path(key: str, trace_dir: str = None) -> str:
+    return os.path.join(trace_dir or data_dir(TRACE_DIR), f"{key}.json")
+
+
+def load_trace(key: str, trace_dir: str = None, volume=None) -> dict:
+    try:
+        sync_volume(volume, "reload")
+    except Exception:
+        pass
+    path = _trace_path(key, trace_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_trace(key: str, task: str, steps: list, trace_dir: str = None, volume=None, **extra) -> dict:
+    """
+    Write a trace atomically and commit the volume so other containers see it
+    extra fields (e.g. final_page_embedding) are stored alongside the steps
+    """
+    trace = {"task": task, "created_at": time.time(), "steps": steps, **extra}
+    trace_dir = trace_dir or data_dir(TRACE_DIR)
+    os.makedirs(trace_dir, exist_ok=True)
+    path = _trace_path(key, trace_dir)
+    with open(path + ".tmp", "w") as f:
+        json.dump(trace, f)
+    os.replace(path + ".tmp", path)
+    sync_volume(volume, "commit")
+    return trace
+
+
+def _same_page(current: str, expected: str) -> bool:
+    """Checkpoint URLs match on host and path; query strings often carry session noise"""
+    if not expected:
+        return True
+    a, b = urlsplit(current or ""), urlsplit(expected)
+    return a.netloc == b.netloc and a.path.rstrip("/") == b.path.rstrip("/")
+
+
+async def verify_checkpoint(page, step: dict) -> bool:
+    """The page is where the recording was and the target element still looks the same"""
+    checkpoint = step.get("checkpoint") or {}
+    if step["action"] != "navigate" and not _same_page(page.url, checkpoint.get("url")):
+        return False
+    if not step.get("selector") or step["action"] in ("navigate", "done"):
+        return True
+    locator = page.locator(step["selector"])
+    if await locator.count() != 1:
+        return False
+    found = await locator.evaluate(
+        "el => ({tag: el.tagName.toLowerCase(), type: el.getAttribute('type'), name: el.getAttribute('name')})"
+    )
+    return all(checkpoint.get(k) in (None, found.get(k)) for k in ("tag", "type", "name"))
+
+
+async def run_step(page, step: dict):
+    action = step["action"]
+    selector = step.get("selector")
+    if action == "navigate":
+        await page.goto(step["url"])
+    elif action == "click":
+        await page.click(selector, timeout=STEP_TIMEOUT_MS)
+        await page.wait_for_load_state()
+    elif action == "fill":
+        await page.fill(selector, step.get("text", ""), timeout=STEP_TIMEOUT_MS)
+    elif action == "select":
+        await page.select_option(selector, step.get("option"), timeout=STEP_TIMEOUT_MS)
+    elif action == "keys":
+        await page.keyboard.press(step["keys"])
+    elif action == "scroll":
+        await page.mouse.wheel(0, -800 if "up" in step.get("raw", "") else 800)
+    elif action == "wait":
+        await asyncio.sleep(1)
+    elif action != "done":
+        raise ValueError(f"Cannot replay action: {step.get('raw', action)}")
+
+
+async def replay_steps(page, steps: list) -> dict:
+    """
+    Run recorded steps until one fails its checkpoint or errors
+    Returns how many steps completed and the index of the divergent step (None when all ran)
+    """
+    for index, step in enumerate(steps):
+        try:
+            if not await verify_checkpoint(page, step):
+                return {"steps_replayed": index, "diverged_at": index, "reason": "checkpoint mismatch"}
+            await run_step(page, step)
+        except Exception as e:
+            return {"steps_replayed": index, "diverged_at": index, "reason": str(e)}
+    return {"steps_replayed": len(steps), "diverged_at": None, "reason": None}
+
+
+def continuation_task(task: str, steps: list, diverged_at: int) -> str:
+    """Agent prompt that resumes from the divergent step on the already-open page"""
+    done = [f"{s['action']} {s.get('selector') or s.get('url') or ''}".strip() for s in steps[:diverged_at]]
+    remaining = [f"{s['action']} {s.get('text') or s.get('option') or s.get('url') or ''}".strip()
+                 for s in steps[diverged_at:]]
+    return (
+        f"{task}\n\nThe browser is already part-way through this task. Completed steps: {done}. "
+        f"Continue from the current page. A previous run did these remaining steps, "
+        f"but the page has changed so adapt as needed: {remaining}"
+    )
@@ -0,0 +1,193 @@
+"""
+Admission control and fair queuing in front of mcp_task_router
+Requests wait in per-GPU-tier queues ordered by priority class, then by weighted-fair
+finish tag per caller; each tier has a concurrency limit, and requests whose estimated
+queue time would miss their class SLO are shed with a retry_after hint
+"""
+
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Strict priority between classes; queue_slo_s is the longest acceptable queue wait
+PRIORITY_CLASSES = {
+    "interactive": {"rank": 0, "queue_slo_s": 2.0},
+    "standard": {"rank": 1, "queue_slo_s": 30.0},
+    "batch": {"rank": 2, "queue_slo_s": 300.0}
+}
+
+# Concurrent dispatches per tier (override with MCP_ROUTER_TIER_LIMITS='{"A10G": 8}')
+DEFAULT_TIER_LIMITS = {"cpu": 32, "T4": 4, "A10G": 4}
+
+TASK_TIERS = {
+    "web_scraping": "cpu",
+    "bulk_scraping": "cpu",
+    "data_processing": "T4",
+    "url_analysis": "A10G"
+}
+
+MAX_QUEUE_DEPTH = 500
+# Initial guess of service seconds per unit of cost, refined by an EWMA of real dispatches;
+# SLO shedding starts once a tier has this many completed dispatches to estimate from
+INITIAL_UNIT_SECONDS = 0.25
+SERVICE_EWMA_ALPHA = 0.2
+MIN_SAMPLES_TO_SHED = 3
+
+
+class Shed(Exception):
+    """Raised at admission when a request would miss its queue-time SLO"""
+
+    def __init__(self, retry_after: float, info: dict):
+        super().__init__(f"Router overloaded for {info['tier']} ({info['priority']}); retry after {retry_after}s")
+        self.retry_after = retry_after
+        self.info = info
+
+
+def task_cost(task_type: str, task_data: dict) -> int:
+    """Relative size of a task: URLs or records to process (bulk runs count as large)"""
+    if task_type == "bulk_scraping":
+        return 100
+    return max(1, len(task_data.get("urls") or task_data.get("data") or []))
+
+
+def default_priority(cost: int) -> str:
+    if cost <= 1:
+        return "interactive"
+    return "batch" if cost >= 50 else "standard"
+
+
+class RouterScheduler:
+    """
+    In-process scheduler shared by every concurrent input of one router container
+    submit() admits or sheds, running() waits for a slot and holds it for the dispatch
+    """
+
+    def __init__(self, tier_limits: dict = None, weights: dict = None, max_queue_depth: int = MAX_QUEUE_DEPTH):
+        self.weights = weights or {}
+        self.max_queue_depth = max_queue_depth
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self.tiers = {
+            tier: {
+                "limit": limit,
+                "in_flight": 0,
+                "in_flight_cost": 0,
+                "queue": [],
+                "virtual_time": 0.0,
+                "caller_finish": {},
+                "unit_s": INITIAL_UNIT_SECONDS,
+                "samples": 0,
+                "shed": 0
+            }
+            for tier, limit in {**DEFAULT_TIER_LIMITS, **(tier_limits or {})}.items()
+        }
+
+    def _estimated_wait(self, tier: dict, rank: int) -> float:
+        """Seconds until a new request of this rank would start, from the backlog ahead of it"""
+        ahead = sum(entry[-1]["cost"] for entry in tier["queue"] if entry[0] <= rank)
+        if ahead == 0 and tier["in_flight"] < tier["limit"]:
+            return 0.0
+        # In-flight work is assumed half done on average
+        return (ahead + tier["in_flight_cost"] / 2) * tier["unit_s"] / tier["limit"]
+
+    def submit(self, task_type: str, task_data: dict, priority: str = None, caller: str = None) -> dict:
+        """Queue a request, or raise Shed if its class SLO cannot be met"""
+        cost = task_cost(task_type, task_data)
+        priority = priority if priority in PRIORITY_CLASSES else default_priority(cost)
+        caller = caller or "default"
+        rank = PRIORITY_CLASSES[priority]["rank"]
+        with self._cond:
+            tier_name = TASK_TIERS.get(task_type, "cpu")
+            tier = self.tiers[tier_name]
+            estimate = self._estimated_wait(tier, rank)
+            info = {
+                "tier": tier_name,
+                "priority": priority,
+                "caller": caller,
+                "cost": cost,
+                "queue_depth": len(tier["queue"]),
+                "in_flight": tier["in_flight"],
+                "estimated_wait_s": round(estimate, 3)
+            }
+            slo = PRIORITY_CLASSES[priority]["queue_slo_s"]
+            over_slo = tier["samples"] >= MIN_SAMPLES_TO_SHED and estimate > slo
+            if over_slo or len(tier["queue"]) >= self.max_queue_depth:
+                tier["shed"] += 1
+                # Once the backlog drains by the overshoot, a retry fits inside the SLO
+                raise Shed(round(max(estimate - slo, 1.0), 1), info)
+
+            # Weighted fair queuing: each caller's finish tag advances by cost / weight
+            weight = max(float(self.weights.get(caller, 1.0)), 0.01)
+            start = max(tier["virtual_time"], tier["caller_finish"].get(caller, 0.0))
+            finish = start + cost / weight
+            tier["caller_finish"][caller] = finish
+            ticket = {**info, "start_tag": start, "enqueued_at": time.time()}
+            heapq.heappush(tier["queue"], (rank, finish, next(self._seq), ticket))
+            return ticket
+
+    def _is_next(self, tier: dict, ticket: dict) -> bool:
+        return tier["queue"][0][-1] is ticket and tier["in_flight"] < tier["limit"]
+
+    @contextmanager
+    def running(self, ticket: dict):
+        """Block until the ticket is first in its tier with a free slot, then hold the slot"""
+        tier = self.tiers[ticket["tier"]]
+        with self._cond:
+            try:
+                while not self._is_next(tier, ticket):
+                    self._cond.wait()
+            except BaseException:
+                tier["queue"] = [entry for entry in tier["queue"] if entry[-1] is not ticket]
+                heapq.heapify(tier["queue"])
+                self._cond.notify_all()
+                raise
+            heapq.heappop(tier["queue"])
+            tier["virtual_time"] = max(tier["virtual_time"], ticket["start_tag"])
+            tier["in_flight"] += 1
+            tier["in_flight_cost"] += ticket["cost"]
+            ticket["queue_wait_s"] = round(time.time() - ticket["enqueued_at"], 3)
+            self._cond.notify_all()
+        started = time.time()
+        try:
+            yield ticket
+        finally:
+            elapsed = time.time() - started
+            with self._cond:
+                tier["in_flight"] -= 1
+                tier["in_flight_cost"] -= ticket["cost"]
+                tier["unit_s"] += SERVICE_EWMA_ALPHA * (elapsed / ticket["cost"] - tier["unit_s"])
+                tier["samples"] += 1
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                name: {
+                    "limit": tier["limit"],
+                    "in_flight": tier["in_flight"],
+                    "queue_depth": len(tier["queue"]),
+                    "shed": tier["shed"],
+                    "unit_s": round(tier["unit_s"], 3)
+                }
+                for name, tier in self.tiers.items()
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RouterScheduler:
+    """Container-wide scheduler; limits and caller weights come from MCP_ROUTER_* env JSON"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RouterScheduler(
+                tier_limits=json.loads(os.environ.get("MCP_ROUTER_TIER_LIMITS", "{}")),
+                weights=json.loads(os.environ.get("MCP_ROUTER_WEIGHTS", "{}"))
+            )
+        return _scheduler
@@ -0,0 +1,473 @@
+"""
+Typed task and result schemas for the MCP router boundary
+msgspec Structs validate task_data before it is queued and give results a compact
+MessagePack wire format: per-URL records are array-like (no repeated keys) and unset
+optional fields are omitted. "msgpack+zstd" also interns repeated header sets and
+contents and compresses the payload with zstd, optionally with a trained dictionary
+"""
+
+import threading
+from collections import Counter
+from typing import Annotated, Any, Dict, List, Literal, Optional, Union
+
+import msgspec
+from msgspec import Meta, Struct
+
+WIRE_FORMATS = ("dict", "msgpack", "msgpack+zstd")
+MAX_URLS_PER_TASK = 10000
+
+ZSTD_LEVEL = 3
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+DICTIONARY_STORE_NAME = "mcp-zstd-dictionaries"
+DICTIONARY_SIZE = 32 * 1024
+# Contents shorter than this are cheaper inline than as a table reference
+MIN_INTERNED_CHARS = 64
+
+Urls = Annotated[List[str], Meta(max_length=MAX_URLS_PER_TASK)]
+
+
+# Task inputs (mcp_task_router task_data)
+
+class WebScrapingTask(Struct, forbid_unknown_fields=True):
+    urls: Urls
+    extract_type: Literal["text", "links", "images", "title", "html"] = "text"
+
+
+class DataProcessingTask(Struct, forbid_unknown_fields=True):
+    data: Annotated[List[Any], Meta(min_length=1)]
+    operation: str = "analyze"
+
+
+class UrlAnalysisTask(Struct, forbid_unknown_fields=True):
+    urls: Urls
+    analysis_type: Literal["basic", "comprehensive", "link_graph"] = "basic"
+    resume_token: Optional[str] = None
+
+
+class BulkScrapingTask(Struct, forbid_unknown_fields=True):
+    source: Union[str, Dict[str, str]]
+    extract_type: Literal["text", "links", "images", "title", "html"] = "text"
+    output_format: Literal["jsonl", "parquet"] = "jsonl"
+
+
+TASK_SCHEMAS = {
+    "web_scraping": WebScrapingTask,
+    "data_processing": DataProcessingTask,
+    "url_analysis": UrlAnalysisTask,
+    "bulk_scraping": BulkScrapingTask
+}
+
+
+# Function kwargs routed by mcp_gpu_functions.route_mcp_task
+
+HttpUrl = Annotated[str, Meta(pattern=r"^https?://")]
+LlmCacheMode = Literal["exact", "semantic", "off"]
+Seconds = Annotated[float, Meta(gt=0)]
+
+
+class BrowserConfig(Struct, forbid_unknown_fields=True):
+    max_steps: Annotated[int, Meta(ge=1, le=500)] = 50
+    start_url: Optional[HttpUrl] = None
+    mode: Literal["auto", "record", "agent"] = "auto"
+    llm_cache: LlmCacheMode = "exact"
+
+
+class HeavyBrowserTask(Struct, forbid_unknown_fields=True):
+    task: Annotated[str, Meta(min_length=1)]
+    config: Optional[BrowserConfig] = None
+
+
+class DeepResearchTask(Struct, forbid_unknown_fields=True):
+    research_topic: Annotated[str, Meta(min_length=1)]
+    max_sites: Annotated[int, Meta(ge=1, le=100)] = 10
+    source_urls: Optional[Annotated[List[HttpUrl], Meta(max_length=MAX_URLS_PER_TASK)]] = None
+    llm_cache: LlmCacheMode = "exact"
+    resume_token: Optional[str] = None
+    token_budget: Optional[Annotated[int, Meta(gt=0)]] = None
+
+
+class FormFillingTask(Struct, forbid_unknown_fields=True):
+    form_url: HttpUrl
+    form_data: Dict[str, Union[str, int, float, bool, None]]
+    instructions: str
+
+
+class MonitoringConfig(Struct):
+    """Keys other than these are ignored by the scheduler, so they are not rejected"""
+    schedule: bool = False
+    initial_interval_s: Optional[Seconds] = None
+    min_interval_s: Optional[Seconds] = None
+    max_interval_s: Optional[Seconds] = None
+    changed_factor: Optional[Annotated[float, Meta(gt=0)]] = None
+    unchanged_factor: Optional[Annotated[float, Meta(gt=0)]] = None
+    error_factor: Optional[Annotated[float, Meta(gt=0)]] = None
+    ewma_alpha: Optional[Annotated[float, Meta(gt=0, le=1)]] = None
+
+
+class SiteMonitoringTask(Struct, forbid_unknown_fields=True):
+    sites: Annotated[List[HttpUrl], Meta(min_length=1, max_length=MAX_URLS_PER_TASK)]
+    monitoring_config: MonitoringConfig
+    resume_token: Optional[str] = None
+
+
+ROUTED_TASK_SCHEMAS = {
+    "heavy_browser": HeavyBrowserTask,
+    "deep_research": DeepResearchTask,
+    "light_scraping": WebScrapingTask,
+    "ai_forms": FormFillingTask,
+    "site_monitoring": SiteMonitoringTask
+}
+
+
+# Results
+
+class ScrapeItem(Struct, array_like=True, omit_defaults=True):
+    url: str
+    success: bool
+    content: Union[str, List[Optional[str]], None] = None
+    status_code: Optional[int] = None
+    content_type: Optional[str] = None
+    error: Optional[str] = None
+    dns_ms: Optional[float] = None
+    connect_ms: Optional[float] = None
+    tls_ms: Optional[float] = None
+    connection: Optional[str] = None
+    # Interned form: index into ScrapeResult.strings instead of content
+    content_ref: Optional[int] = None
+    # Bitmask (declaration order) of the keys the worker's record had
+    present: Optional[int] = None
+
+
+class ScrapeResult(Struct, omit_defaults=True):
+    success: bool
+    results: List[ScrapeItem] = []
+    total_urls: int = 0
+    successful_extractions: int = 0
+    processing_info: Dict[str, Any] = {}
+    error: Optional[str] = None
+    strings: Optional[List[str]] = None
+    execution_backend: Optional[str] = None
+    # Keys the worker's result dict had
+    present: Optional[List[str]] = None
+
+
+class UrlAnalysisItem(Struct, array_like=True, omit_defaults=True):
+    url: str
+    success: bool
+    load_time: float = 0.0
+    status_code: Optional[int] = None
+    content_length: Optional[int] = None
+    title: Optional[str] = None
+    meta_description: Optional[str] = None
+    links_count: Optional[int] = None
+    images_count: Optional[int] = None
+    forms_count: Optional[int] = None
+    scripts_count: Optional[int] = None
+    text_length: Optional[int] = None
+    headings: Optional[Dict[str, int]] = None
+    internal_links: Optional[int] = None
+    external_links: Optional[int] = None
+    has_ssl: Optional[bool] = None
+    response_headers: Optional[Dict[str, str]] = None
+    in_degree: Optional[int] = None
+    pagerank: Optional[float] = None
+    error: Optional[str] = None
+    dns_ms: Optional[float] = None
+    connect_ms: Optional[float] = None
+    tls_ms: Optional[float] = None
+    connection: Optional[str] = None
+    # Interned form: headers shared with other URLs live in UrlAnalysisResult.header_sets,
+    # response_headers keeps only this URL's own values
+    headers_ref: Optional[int] = None
+    # link_graph mode: the page's node, i.e. its normalized URL after redirects
+    final_url: Optional[str] = None
+    # Bitmask (declaration order) of the keys the worker's record had
+    present: Optional[int] = None
+
+
+class UrlAnalysisResult(Struct, omit_defaults=True):
+    success: bool
+    analysis_type: Optional[str] = None
+    aggregated_stats: Dict[str, Any] = {}
+    link_graph: Optional[Dict[str, Any]] = None
+    detailed_results: List[UrlAnalysisItem] = []
+    checkpoint: Optional[Dict[str, Any]] = None
+    processing_info: Dict[str, Any] = {}
+    error: Optional[str] = None
+    urls_count: Optional[int] = None
+    header_sets: Optional[List[Dict[str, str]]] = None
+    # Keys the worker's result dict had
+    present: Optional[List[str]] = None
+
+
+class RouterResponse(Struct, omit_defaults=True):
+    success: bool
+    task_type: str
+    result: Any = None
+    routing_info: Dict[str, Any] = {}
+    processing_info: Dict[str, Any] = {}
+    error: Optional[str] = None
+    retry_after: Optional[float] = None
+    available_types: Optional[List[str]] = None
+    processing_time: Optional[float] = None
+
+
+RESULT_SCHEMAS = {
+    "web_scraping": ScrapeResult,
+    "url_analysis": UrlAnalysisResult
+}
+
+# Routed results with a typed wire format; the others travel as plain MessagePack maps
+ROUTED_RESULT_SCHEMAS = {
+    "light_scraping": ScrapeResult
+}
+
+# Per-item record list of each result schema, built field by field (array-like structs
+# cannot be converted from dicts)
+ITEM_LISTS = {
+    ScrapeResult: ("results", ScrapeItem),
+    UrlAnalysisResult: ("detailed_results", UrlAnalysisItem)
+}
+
+
+def _enc_hook(obj):
+    """NumPy scalars and other stragglers from the aggregation code"""
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+_encoder = msgspec.msgpack.Encoder(enc_hook=_enc_hook)
+
+_dictionaries = {}
+_dictionaries_lock = threading.Lock()
+
+
+def _store(store=None):
+    if store is not None:
+        return store
+    import modal
+    return modal.Dict.from_name(DICTIONARY_STORE_NAME, create_if_missing=True)
+
+
+def load_dictionary(dict_id=None, store=None):
+    """
+    zstd dictionary by id (None: the currently published one), cached per process
+    Returns None when there is none or the store is unreachable (e.g. running locally)
+    """
+    import zstandard
+    key = "current" if dict_id is None else str(dict_id)
+    with _dictionaries_lock:
+        if key in _dictionaries:
+            return _dictionaries[key]
+    try:
+        raw = _store(store).get(key)
+    except Exception:
+        raw = None
+    dictionary = zstandard.ZstdCompressionDict(raw) if raw else None
+    with _dictionaries_lock:
+        _dictionaries[key] = dictionary
+        if dictionary is not None:
+            _dictionaries[str(dictionary.dict_id())] = dictionary
+    return dictionary
+
+
+def train_dictionary(results: list, schema, size: int = DICTIONARY_SIZE):
+    """Train a zstd dictionary on typical (interned, uncompressed) results of one schema"""
+    import zstandard
+    samples = [_encoder.encode(_intern(_typed(r, schema))) for r in results]
+    return zstandard.train_dictionary(size, samples)
+
+
+def publish_dictionary(dictionary, store=None) -> int:
+    """Make a trained dictionary the one new payloads are compressed with; returns its id"""
+    store = _store(store)
+    store[str(dictionary.dict_id())] = dictionary.as_bytes()
+    store["current"] = dictionary.as_bytes()
+    with _dictionaries_lock:
+        _dictionaries.clear()
+    return dictionary.dict_id()
+
+
+def compress(data: bytes, dictionary=None, level: int = ZSTD_LEVEL) -> bytes:
+    import zstandard
+    if dictionary is not None:
+        return zstandard.ZstdCompressor(level=level, dict_data=dictionary).compress(data)
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def decompress(payload: bytes, dictionary=None) -> bytes:
+    """zstd frame -> bytes, fetching the dictionary named in the frame header unless given"""
+    import zstandard
+    dict_id = zstandard.get_frame_parameters(payload).dict_id
+    if not dict_id:
+        dictionary = None
+    elif dictionary is None or dictionary.dict_id() != dict_id:
+        dictionary = load_dictionary(dict_id)
+    if dict_id and dictionary is None:
+        raise ValueError(f"zstd dictionary {dict_id} is not available")
+    if dictionary is not None:
+        return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(payload)
+    return zstandard.ZstdDecompressor().decompress(payload)
+
+
+def _raw(payload, dictionary=None):
+    payload = bytes(payload) if isinstance(payload, (bytearray, memoryview)) else payload
+    return decompress(payload, dictionary) if payload[:4] == ZSTD_MAGIC else payload
+
+
+def parse_task(task_type: str, task_data) -> Struct:
+    """
+    Validated task struct from a dict or MessagePack bytes (optionally zstd-compressed)
+    Raises msgspec.ValidationError with the offending path (e.g. "$.urls[3]")
+    """
+    schema = TASK_SCHEMAS[task_type]
+    if isinstance(task_data, (bytes, bytearray, memoryview)):
+        return msgspec.msgpack.decode(_raw(task_data), type=schema)
+    return msgspec.convert(task_data or {}, schema)
+
+
+def validate_route_kwargs(task_type: str, kwargs: dict) -> Struct:
+    """
+    Validated kwargs of a routed function (trace_context aside)
+    Raises msgspec.ValidationError with the offending path (e.g. "$.config.max_steps")
+    """
+    return msgspec.convert({k: v for k, v in kwargs.items() if k != "trace_context"},
+                           ROUTED_TASK_SCHEMAS[task_type])
+
+
+def _mask(record: dict, fields) -> int:
+    return sum(1 << i for i, k in enumerate(fields) if k in record)
+
+
+def _typed(result: dict, schema) -> Struct:
+    """
+    Result dict -> schema struct, building the per-item records field by field
+    The key sets are recorded (present) so result_to_dict can restore them exactly
+    """
+    list_field, item_type = ITEM_LISTS[schema]
+    fields = item_type.__struct_fields__
+    items = [item_type(**{k: r[k] for k in fields if k in r}, present=_mask(r, fields))
+             for r in result.get(list_field) or []]
+    typed = msgspec.convert({k: v for k, v in result.items() if k != list_field}, schema, strict=False)
+    setattr(typed, list_field, items)
+    typed.present = [k for k in result if k in schema.__struct_fields__]
+    return typed
+
+
+def _intern(result: Struct) -> Struct:
+    """
+    Move repeated values into per-result tables
+    Analysis: header pairs seen on more than one URL become shared header sets;
+    scraping: identical long contents (mirrors, error pages) are stored once
+    """
+    if isinstance(result, UrlAnalysisResult):
+        items = [item for item in result.detailed_results if item.response_headers]
+        counts = Counter(pair for item in items for pair in item.response_headers.items())
+        sets, refs = [], {}
+        for item in items:
+            shared = {k: v for k, v in item.response_headers.items() if counts[(k, v)] > 1}
+            if not shared:
+                continue
+            key = tuple(sorted(shared.items()))
+            if key not in refs:
+                refs[key] = len(sets)
+                sets.append(shared)
+            item.headers_ref = refs[key]
+            item.response_headers = {k: v for k, v in item.response_headers.items() if k not in shared} or None
+        result.header_sets = sets or None
+    elif isinstance(result, ScrapeResult):
+        counts = Counter(item.content for item in result.results
+                         if isinstance(item.content, str) and len(item.content) >= MIN_INTERNED_CHARS)
+        strings, refs = [], {}
+        for item in result.results:
+            if isinstance(item.content, str) and counts.get(item.content, 0) > 1:
+                if item.content not in refs:
+                    refs[item.content] = len(strings)
+                    strings.append(item.content)
+                item.content_ref, item.content = refs[item.content], None
+        result.strings = strings or None
+    return result
+
+
+def _expand(result: Struct) -> Struct:
+    """Inverse of _intern"""
+    if isinstance(result, UrlAnalysisResult) and result.header_sets:
+        for item in result.detailed_results:
+            if item.headers_ref is not None:
+                item.response_headers = {**result.header_sets[item.headers_ref], **(item.response_headers or {})}
+                item.headers_ref = None
+        result.header_sets = None
+    elif isinstance(result, ScrapeResult) and result.strings:
+        for item in result.results:
+            if item.content_ref is not None:
+                item.content, item.content_ref = result.strings[item.content_ref], None
+        result.strings = None
+    return result
+
+
+def pack_result(result: dict, schema=None, wire_format: str = "dict", dictionary=None):
+    """
+    Result as-is for the "dict" wire format, else MessagePack bytes (typed through schema
+    when one exists, so per-URL records travel as arrays)
+    "msgpack+zstd" interns repeated values and compresses, with dictionary or else the
+    published dictionary when there is one
+    """
+    if wire_format == "dict" or not isinstance(result, dict):
+        return result
+    if wire_format not in WIRE_FORMATS:
+        raise ValueError(f"wire_format must be one of {WIRE_FORMATS}")
+    if schema is not None:
+        result = _typed(result, schema)
+        if wire_format == "msgpack+zstd":
+            result = _intern(result)
+    data = _encoder.encode(result)
+    if wire_format == "msgpack+zstd":
+        return compress(data, dictionary if dictionary is not None else load_dictionary())
+    return data
+
+
+def unpack_result(payload, schema=None, dictionary=None):
+    """Inverse of pack_result: a typed struct (or plain dict without a schema)"""
+    if isinstance(payload, dict):
+        return msgspec.convert(payload, schema, strict=False) if schema is not None else payload
+    payload = _raw(payload, dictionary)
+    if schema is None:
+        return msgspec.msgpack.decode(payload)
+    return _expand(msgspec.msgpack.decode(payload, type=schema))
+
+
+def result_to_dict(result: Struct) -> dict:
+    """
+    A typed result as the plain dict its function returns with wire_format "dict"
+    Every record keeps the keys the worker set, None values included; payloads without
+    that record (present) fall back to their non-None fields
+    """
+    list_field, item_type = ITEM_LISTS[type(result)]
+    fields = item_type.__struct_fields__
+
+    def item_keys(item):
+        if item.present is None:
+            return [k for k in fields if k != "present" and getattr(item, k) is not None]
+        return [k for i, k in enumerate(fields) if item.present >> i & 1]
+
+    if result.present is not None:
+        keys = result.present
+    else:
+        keys = [k for k in msgspec.to_builtins(result) if k != "present"] + [list_field]
+    data = {}
+    for key in keys:
+        if key == list_field:
+            data[key] = [{k: msgspec.to_builtins(getattr(item, k)) for k in item_keys(item)}
+                         for item in getattr(result, list_field)]
+        else:
+            data[key] = msgspec.to_builtins(getattr(result, key))
+    return data
+
+
+def unpack_response(payload: bytes) -> RouterResponse:
+    """Decode a msgpack mcp_task_router response, including its nested typed result"""
+    response = msgspec.msgpack.decode(_raw(payload), type=RouterResponse)
+    if isinstance(response.result, (bytes, bytearray)):
+        response.result = unpack_result(response.result, RESULT_SCHEMAS.get(response.task_type))
+    return response
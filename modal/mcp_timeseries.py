@@ -0,0 +1,233 @@
+"""
+Monitoring time series as append-only NumPy ring buffers, with vectorized anomaly detection
+One (sites x capacity) array per metric lives on a Volume; detection and grading run
+across every site at once (EWMA, robust z-scores and hour-of-day seasonal baselines)
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from mcp_backends import data_dir, sync_volume
+from mcp_monitoring import SERIES_DIR
+
+DEFAULT_CAPACITY = 256
+
+# dtype and empty-slot value per metric; timestamps are epoch seconds
+METRICS = {
+    "ts": (np.uint32, 0),
+    "response_ms": (np.float32, np.nan),
+    "status": (np.int16, -1),
+    "size": (np.float32, np.nan),
+    "changed": (np.int8, -1)
+}
+
+EWMA_ALPHA = 0.1
+Z_THRESHOLD = 3.5
+MIN_HISTORY = 8
+MIN_SEASONAL = 4
+# Scale floors keep perfectly steady series from flagging on jitter
+LATENCY_SCALE_FLOOR_MS = 5.0
+SIZE_SCALE_FLOOR_BYTES = 64.0
+
+# (max EWMA latency ms, max error fraction) per grade, best first
+GRADE_THRESHOLDS = [("A", 300, 0.01), ("B", 800, 0.05), ("C", 2000, 0.10), ("D", 5000, 0.25)]
+
+
+class SeriesStore:
+    """
+    Per-site ring buffers for response time, status, size and content changes
+    Rows are sites (URLs interned in index.json), columns are slots; count holds the
+    total appended per site, so the next slot is count % capacity
+    """
+
+    def __init__(self, root: str = None, capacity: int = DEFAULT_CAPACITY):
+        self.root = root = root or data_dir(SERIES_DIR)
+        index_path = os.path.join(root, "index.json")
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+            self.urls = index["urls"]
+            self.capacity = index["capacity"]
+            self.arrays = {m: np.load(os.path.join(root, f"{m}.npy")) for m in METRICS}
+            self.count = np.load(os.path.join(root, "count.npy"))
+        else:
+            self.urls = []
+            self.capacity = capacity
+            self.arrays = {m: np.full((0, capacity), fill, dtype=dtype) for m, (dtype, fill) in METRICS.items()}
+            self.count = np.zeros(0, dtype=np.int64)
+        self.rows = {url: i for i, url in enumerate(self.urls)}
+
+    def _ensure_rows(self, urls: list):
+        new = [url for url in dict.fromkeys(urls) if url not in self.rows]
+        if not new:
+            return
+        for url in new:
+            self.rows[url] = len(self.urls)
+            self.urls.append(url)
+        for m, (dtype, fill) in METRICS.items():
+            self.arrays[m] = np.concatenate([self.arrays[m], np.full((len(new), self.capacity), fill, dtype=dtype)])
+        self.count = np.concatenate([self.count, np.zeros(len(new), dtype=np.int64)])
+
+    def append(self, checks: list, now: float = None):
+        """Write one slot per check (each site at most once per call)"""
+        if not checks:
+            return
+        now = time.time() if now is None else now
+        self._ensure_rows([c["url"] for c in checks])
+        rows = np.array([self.rows[c["url"]] for c in checks])
+        slots = self.count[rows] % self.capacity
+        values = {
+            "ts": [int(now)] * len(checks),
+            "response_ms": [c.get("response_ms", np.nan) if c.get("success") else np.nan for c in checks],
+            "status": [c.get("status_code") or 0 for c in checks],
+            "size": [c.get("size", np.nan) if c.get("success") else np.nan for c in checks],
+            "changed": [int(bool(c.get("changed"))) for c in checks]
+        }
+        for m, (dtype, _) in METRICS.items():
+            self.arrays[m][rows, slots] = np.asarray(values[m], dtype=dtype)
+        self.count[rows] += 1
+
+    def save(self, volume=None):
+        os.makedirs(self.root, exist_ok=True)
+        for m in METRICS:
+            np.save(os.path.join(self.root, f"{m}.npy"), self.arrays[m])
+        np.save(os.path.join(self.root, "count.npy"), self.count)
+        with open(os.path.join(self.root, "index.json"), "w") as f:
+            json.dump({"urls": self.urls, "capacity": self.capacity}, f)
+        sync_volume(volume, "commit")
+
+    def ages(self) -> tuple:
+        """
+        (age, valid): each slot's age in samples relative to the site's newest slot
+        (0 = newest) and whether the slot holds data; no reordering of the buffers needed
+        """
+        latest = ((self.count - 1) % self.capacity).astype(np.int32)
+        age = latest[:, None] - np.arange(self.capacity, dtype=np.int32)[None, :]
+        age += np.int32(self.capacity) * (age < 0)
+        valid = age < np.minimum(self.count, self.capacity)[:, None]
+        return age, valid
+
+    def latest(self, metric: str) -> np.ndarray:
+        return self.arrays[metric][np.arange(len(self.urls)), (self.count - 1) % self.capacity]
+
+
+def _robust_z(latest, history, scale_floor):
+    """
+    (x - median) / robust sigma per row, with sigma = IQR / 1.349 (the MAD-consistent
+    scale for normal data); one sort per call, NaN slots sort last and are skipped
+    """
+    ordered = np.sort(history, axis=1)
+    n = (~np.isnan(history)).sum(axis=1)
+    rows = np.arange(len(history))
+
+    def quantile(q):
+        position = np.maximum(n - 1, 0) * q
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, np.maximum(n - 1, 0))
+        frac = position - lower
+        value = ordered[rows, lower] * (1 - frac) + ordered[rows, upper] * frac
+        return np.where(n > 0, value, np.nan)
+
+    median = quantile(0.5)
+    sigma = (quantile(0.75) - quantile(0.25)) / 1.349
+    return (latest - median) / np.maximum(sigma, scale_floor), median
+
+
+def detect_anomalies(store: SeriesStore) -> dict:
+    """
+    Score the latest sample of every site against its own history in one pass
+    Returns per-site arrays: latency/size robust z, seasonal z, EWMA latency, error
+    fraction, anomaly flags and a performance grade
+    """
+    n, capacity = len(store.urls), store.capacity
+    if n == 0:
+        return {"urls": [], "anomalous": np.zeros(0, dtype=bool), "grades": np.array([], dtype=object)}
+
+    age, valid = store.ages()
+    in_history = valid & (age > 0)
+    counts = valid.sum(axis=1)
+    nan = np.float32(np.nan)
+    latency, size = store.arrays["response_ms"], store.arrays["size"]
+    latest_latency, latest_size = store.latest("response_ms"), store.latest("size")
+    status = store.arrays["status"]
+    hours = (store.arrays["ts"] // 3600) % 24
+    # 4xx counts as an error too: a page that now 404s is down for its visitors
+    errors = valid & ((status == 0) | (status >= 400))
+    latest_status = store.latest("status")
+    latest_error = (latest_status == 0) | (latest_status >= 400)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        history = np.where(in_history, latency, nan)
+        latency_z, latency_median = _robust_z(latest_latency, history, LATENCY_SCALE_FLOOR_MS)
+        size_z, _ = _robust_z(latest_size, np.where(in_history, size, nan), SIZE_SCALE_FLOOR_BYTES)
+
+        # Same hour of day as the latest sample, excluding the latest itself
+        same_hour = in_history & (hours == store.latest("ts")[:, None] // 3600 % 24)
+        seasonal_z, _ = _robust_z(latest_latency, np.where(same_hour, latency, nan), LATENCY_SCALE_FLOOR_MS)
+        seasonal_z = np.where(same_hour.sum(axis=1) >= MIN_SEASONAL, seasonal_z, np.nan)
+
+        # EWMA over the history as one weighted sum (age 1 weighs 1, decaying with age)
+        decay = ((1 - EWMA_ALPHA) ** (np.arange(capacity) - 1.0)).astype(np.float32)
+        weights = np.where(in_history & ~np.isnan(latency), decay[age], np.float32(0))
+        ewma = (np.where(weights > 0, latency, np.float32(0)) * weights).sum(axis=1) / weights.sum(axis=1)
+
+        error_fraction = errors.sum(axis=1) / np.maximum(counts, 1)
+        history_error_fraction = (errors & in_history).sum(axis=1) / np.maximum(counts - 1, 1)
+
+    enough = counts > MIN_HISTORY
+    latency_anomaly = enough & (latency_z > Z_THRESHOLD) & ~(seasonal_z <= Z_THRESHOLD) & (latest_latency > 1.5 * ewma)
+    size_anomaly = enough & (np.abs(size_z) > Z_THRESHOLD)
+    status_anomaly = enough & latest_error & (history_error_fraction < 0.2)
+
+    current_latency = np.where(np.isnan(ewma), latest_latency, ewma)
+    conditions = [(current_latency <= limit) & (error_fraction <= max_errors) for _, limit, max_errors in GRADE_THRESHOLDS]
+    grades = np.select(conditions, [g for g, _, _ in GRADE_THRESHOLDS], default="F").astype(object)
+    grades[counts == 0] = None
+
+    return {
+        "urls": store.urls,
+        "latency_z": latency_z,
+        "seasonal_z": seasonal_z,
+        "size_z": size_z,
+        "ewma_latency_ms": ewma,
+        "median_latency_ms": latency_median,
+        "error_fraction": error_fraction,
+        "latency_anomaly": latency_anomaly,
+        "size_anomaly": size_anomaly,
+        "status_anomaly": status_anomaly,
+        "anomalous": latency_anomaly | size_anomaly | status_anomaly,
+        "grades": grades
+    }
+
+
+def _round(value, digits=2):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def anomaly_records(detection: dict, urls: list = None) -> list:
+    """Plain dicts for flagged sites (optionally limited to urls)"""
+    rows = np.flatnonzero(detection["anomalous"])
+    if urls is not None:
+        wanted = set(urls)
+        rows = [i for i in rows if detection["urls"][i] in wanted]
+    records = []
+    for i in rows:
+        kinds = [k for k in ("latency", "size", "status") if detection[f"{k}_anomaly"][i]]
+        records.append({
+            "url": detection["urls"][i],
+            "kinds": kinds,
+            "latency_z": _round(detection["latency_z"][i]),
+            "seasonal_z": _round(detection["seasonal_z"][i]),
+            "size_z": _round(detection["size_z"][i]),
+            "ewma_latency_ms": _round(detection["ewma_latency_ms"][i], 1),
+            "error_fraction": _round(detection["error_fraction"][i], 3)
+        })
+    return records
+
+
+def grade_for(detection: dict, url: str, store: SeriesStore) -> str:
+    row = store.rows.get(url)
+    return None if row is None else detection["grades"][row]
@@ -0,0 +1,251 @@
+"""
+Lightweight in-process tracing for MCP Modal functions
+OpenTelemetry-style spans with a compact per-stage summary and optional JSONL export
+"""
+
+import json
+import os
+import pickle
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import mcp_metrics
+
+# Local collector file used when MCP_TRACE_EXPORT=1 (or a path) is set
+DEFAULT_TRACE_FILE = "/tmp/mcp_traces.jsonl"
+
+# Fraction of calls whose result is pickled to report its size; pickling a large result
+# costs about as much as Modal's own serialization, so it is sampled rather than done per call
+PAYLOAD_SAMPLE_RATE = float(os.environ.get("MCP_TRACE_PAYLOAD_SAMPLE", "0.01"))
+
+# Canonical stage names, in pipeline order, so summaries read the same everywhere
+STAGES = [
+    "queue", "cold_start", "prewarm", "dns", "connect", "tls", "ttfb", "download",
+    "parse", "extract", "aggregate", "inference", "serialize"
+]
+
+_IMPORTED_AT = time.time()
+_first_call_lock = threading.Lock()
+_first_call_done = False
+
+
+def _process_started_at():
+    """Wall-clock start of this process (Linux /proc), falling back to module import time"""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+    except Exception:
+        return _IMPORTED_AT
+
+
+def _claim_first_call():
+    global _first_call_done
+    with _first_call_lock:
+        first = not _first_call_done
+        _first_call_done = True
+    return first
+
+
+class Tracer:
+    """
+    Collects spans for a single function invocation
+    trace_context may carry trace_id, parent_span_id, enqueued_at (epoch seconds),
+    task_type, include_spans (return full spans), export (collector file path or True)
+    and measure_payload (always report the serialized result size instead of sampling)
+    gpu and task_type label the latency metrics recorded when the call finishes
+    """
+
+    def __init__(self, function_name: str, trace_context: dict = None, gpu: str = None, task_type: str = None):
+        ctx = trace_context or {}
+        self.function_name = function_name
+        self.gpu = gpu
+        self.task_type = task_type or ctx.get("task_type")
+        self.trace_id = ctx.get("trace_id") or uuid.uuid4().hex
+        self.root_parent = ctx.get("parent_span_id")
+        self.include_spans = bool(ctx.get("include_spans", False))
+        self.export_target = ctx.get("export") or os.environ.get("MCP_TRACE_EXPORT")
+        self.measure_payload = bool(ctx.get("measure_payload", random.random() < PAYLOAD_SAMPLE_RATE))
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self._spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.root_span_id = uuid.uuid4().hex[:16]
+
+        enqueued_at = ctx.get("enqueued_at")
+        if enqueued_at:
+            # Cross-machine clocks: clamp skew to zero rather than report negative waits
+            self.add_span("queue", max(0.0, self.started_at - float(enqueued_at)),
+                          start=float(enqueued_at))
+
+        self.cold_start = _claim_first_call()
+        if self.cold_start:
+            process_start = _process_started_at()
+            self.add_span("cold_start", max(0.0, self.started_at - process_start),
+                          start=process_start)
+
+    def _current_parent(self):
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else self.root_span_id
+
+    def add_span(self, name: str, duration_s: float, start: float = None, **attributes):
+        """Record an already-measured span (e.g. phases timed by the HTTP layer)"""
+        start = start if start is not None else time.time() - duration_s
+        span = {
+            "name": name,
+            "span_id": uuid.uuid4().hex[:16],
+            "parent_span_id": self._current_parent(),
+            "start": start,
+            "duration_ms": round(duration_s * 1000, 3),
+            "attributes": attributes
+        }
+        with self._lock:
+            self._spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time a block of work; nested spans are parented to the enclosing one"""
+        span_id = uuid.uuid4().hex[:16]
+        parent = self._current_parent()
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(span_id)
+        start = time.time()
+        t0 = time.perf_counter()
+        error = None
+        try:
+            yield attributes
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            stack.pop()
+            if error:
+                attributes["error"] = error
+            with self._lock:
+                self._spans.append({
+                    "name": name,
+                    "span_id": span_id,
+                    "parent_span_id": parent,
+                    "start": start,
+                    "duration_ms": round((time.perf_counter() - t0) * 1000, 3),
+                    "attributes": attributes
+                })
+
+    def add_phases(self, phases: dict, **attributes):
+        """Record HTTP phase timings ({"dns": s, "connect": s, ...}) as individual spans"""
+        for name, seconds in phases.items():
+            if seconds is not None:
+                self.add_span(name, seconds, **attributes)
+
+    def summary(self) -> dict:
+        """Compact per-stage rollup: count, total and max milliseconds"""
+        stages = {}
+        with self._lock:
+            spans = list(self._spans)
+        for span in spans:
+            stage = stages.setdefault(span["name"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stage["count"] += 1
+            stage["total_ms"] += span["duration_ms"]
+            stage["max_ms"] = max(stage["max_ms"], span["duration_ms"])
+        order = {name: i for i, name in enumerate(STAGES)}
+        ordered = {}
+        for name in sorted(stages, key=lambda n: (order.get(n, len(STAGES)), n)):
+            stage = stages[name]
+            stage["total_ms"] = round(stage["total_ms"], 3)
+            ordered[name] = stage
+        return {
+            "trace_id": self.trace_id,
+            "function": self.function_name,
+            "cold_start": self.cold_start,
+            "total_ms": round((time.perf_counter() - self._t0) * 1000, 3),
+            "stages": ordered
+        }
+
+    def spans(self) -> list:
+        """Full span records in OpenTelemetry-like shape"""
+        with self._lock:
+            spans = list(self._spans)
+        root = {
+            "name": self.function_name,
+            "span_id": self.root_span_id,
+            "parent_span_id": self.root_parent,
+            "start": self.started_at,
+            "duration_ms": round((time.perf_counter() - self._t0) * 1000, 3),
+            "attributes": {"cold_start": self.cold_start}
+        }
+        return [{**span, "trace_id": self.trace_id} for span in [root] + spans]
+
+    def finish(self, result: dict) -> dict:
+        """
+        Attach the span summary to result["processing_info"]["trace"], record call metrics
+        and export full spans when requested; sampled calls also time a pickle of the result
+        """
+        if not isinstance(result, dict):
+            return result
+        if self.measure_payload:
+            with self.span("serialize") as attrs:
+                try:
+                    attrs["payload_bytes"] = len(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+                except Exception as e:
+                    attrs["payload_error"] = str(e)
+        trace = self.summary()
+        if self.include_spans:
+            trace["spans"] = self.spans()
+        if self.export_target:
+            trace["exported_to"] = export_spans(self.spans(), self.export_target)
+        result.setdefault("processing_info", {})["trace"] = trace
+        mcp_metrics.record(self.function_name, trace["total_ms"] / 1000,
+                           success=bool(result.get("success", True)),
+                           task_type=self.task_type, gpu=self.gpu)
+        return result
+
+
+def export_spans(spans: list, target=None) -> str:
+    """Append spans to a local JSONL collector file and return its path"""
+    path = target if isinstance(target, str) and target not in ("1", "true") else DEFAULT_TRACE_FILE
+    with open(path, "a") as f:
+        for span in spans:
+            f.write(json.dumps(span, default=str) + "\n")
+    return path
+
+
+def export_trace(result: dict, path: str = DEFAULT_TRACE_FILE) -> int:
+    """
+    Caller-side export: write the full spans returned by a remote call
+    (trace_context={"include_spans": True}) to a local collector file
+    """
+    spans = []
+
+    def collect(node):
+        if isinstance(node, dict):
+            trace = node.get("processing_info", {}).get("trace") if isinstance(node.get("processing_info"), dict) else None
+            if trace and trace.get("spans"):
+                spans.extend(trace["spans"])
+            for value in node.values():
+                collect(value)
+
+    collect(result)
+    if spans:
+        export_spans(spans, path)
+    return len(spans)
+
+
+def child_context(tracer: Tracer) -> dict:
+    """Trace context to hand to a downstream .remote() call so its spans join this trace"""
+    return {
+        "trace_id": tracer.trace_id,
+        "task_type": tracer.task_type,
+        "parent_span_id": tracer.root_span_id,
+        "enqueued_at": time.time(),
+        "include_spans": tracer.include_spans,
+        "export": tracer.export_target if isinstance(tracer.export_target, str) else None
+    }
@@ -0,0 +1,40 @@
+import http.server
+import os
+import sys
+import threading
+
+import pytest
+
+# The helper modules are imported by bare name, as they are inside the Modal images
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _handler(routes: dict):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            status, headers, body = routes.get(self.path.split("?")[0], (404, {}, b"not found"))
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture(scope="module")
+def server_url(request):
+    """
+    Base URL (no trailing slash) of a local HTTP/1.1 server for the test module's ROUTES:
+    path -> (status, headers, body); the query string is ignored, unknown paths are 404
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _handler(request.module.ROUTES))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
@@ -0,0 +1,76 @@
+"""route_mcp_task on the in-process backends, against a local HTTP server"""
+
+import re
+
+import pytest
+
+from mcp_backends import choose_backend
+
+PAGE = b"<html><head><title>Local page</title></head><body><p>Hello from the test server</p>" \
+       b"<a href='/next'>next</a></body></html>"
+
+ROUTES = {"/": (200, {"Content-Type": "text/html"}, PAGE)}
+
+
+@pytest.fixture(scope="module")
+def route_mcp_task():
+    pytest.importorskip("modal")
+    pytest.importorskip("bs4")
+    from mcp_gpu_functions import route_mcp_task
+    return route_mcp_task
+
+
+def test_choose_backend(monkeypatch):
+    monkeypatch.delenv("MCP_EXECUTION_BACKEND", raising=False)
+    assert choose_backend("light_scraping", {"urls": ["a", "b"]}) == "local-thread"
+    assert choose_backend("light_scraping", {"urls": ["u"] * 50}) == "remote"
+    assert choose_backend("deep_research", {"source_urls": ["a"]}) == "remote"
+    assert choose_backend("deep_research", {}, "local-process") == "local-process"
+    monkeypatch.setenv("MCP_EXECUTION_BACKEND", "local-thread")
+    assert choose_backend("site_monitoring", {"sites": ["a"] * 50}) == "local-thread"
+    with pytest.raises(ValueError):
+        choose_backend("light_scraping", {}, "gpu-please")
+
+
+@pytest.mark.parametrize("backend", ["local-thread", "local-process"])
+def test_route_runs_function_body_locally(route_mcp_task, server_url, backend):
+    result = route_mcp_task("light_scraping", backend=backend, urls=[server_url + "/"], extract_type="text")
+    assert result["execution_backend"] == backend
+    assert result["success"] is True
+    assert result["successful_extractions"] == 1
+    assert "Hello from the test server" in result["results"][0]["content"]
+    assert "trace" in result["processing_info"]
+
+
+def test_route_auto_keeps_tiny_scrapes_local(route_mcp_task, server_url, monkeypatch):
+    monkeypatch.delenv("MCP_EXECUTION_BACKEND", raising=False)
+    result = route_mcp_task("light_scraping", urls=[server_url + "/"], extract_type="links")
+    assert result["execution_backend"] == "local-thread"
+    assert result["results"][0]["content"] == ["/next"]
+
+
+def test_route_rejects_unknown_task(route_mcp_task):
+    with pytest.raises(ValueError):
+        route_mcp_task("teleport", backend="local-thread")
+
+
+@pytest.mark.parametrize("task_type, kwargs, path", [
+    ("light_scraping", {"urls": "http://example.com"}, "$.urls"),
+    ("heavy_browser", {"task": "x", "config": {"max_steps": 0}}, "$.config.max_steps"),
+    ("deep_research", {"research_topic": "x", "source_urls": ["ftp://example.com"]}, "$.source_urls[0]"),
+    ("ai_forms", {"form_url": "https://example.com", "form_data": {}}, "instructions"),
+    ("site_monitoring", {"sites": [], "monitoring_config": {}}, "$.sites")
+])
+def test_route_validates_arguments_before_running(route_mcp_task, task_type, kwargs, path):
+    with pytest.raises(ValueError, match=re.escape(path)):
+        route_mcp_task(task_type, backend="local-thread", **kwargs)
+
+
+def test_route_msgpack_wire_format(route_mcp_task, server_url):
+    from mcp_schemas import ScrapeResult, unpack_result
+    payload = route_mcp_task("light_scraping", backend="local-thread", wire_format="msgpack",
+                             urls=[server_url + "/"], extract_type="title")
+    assert isinstance(payload, bytes)
+    result = unpack_result(payload, ScrapeResult)
+    assert result.execution_backend == "local-thread"
+    assert result.results[0].success
@@ -0,0 +1,57 @@
+"""Checkpoint runs on a local directory (no Volume)"""
+
+import time
+
+import mcp_checkpoint
+from mcp_checkpoint import Checkpoint, read_checkpoint
+
+
+def test_resume_skips_finished_items(tmp_path):
+    first = Checkpoint("job", [["a", "b", "c"]], root=str(tmp_path))
+    first.record("a", {"ok": 1})
+    first.close()
+    retry = Checkpoint("job", [["a", "b", "c"]], root=str(tmp_path))
+    assert retry.resumed == 1
+    assert retry.pending(["a", "b", "c"]) == ["b", "c"]
+    retry.close()
+
+
+def test_completed_run_is_not_reused(tmp_path):
+    done = Checkpoint("job", [["a"]], root=str(tmp_path))
+    done.record("a", 1)
+    done.complete(total=1)
+    again = Checkpoint("job", [["a"]], root=str(tmp_path))
+    assert again.resumed == 0
+    again.close()
+
+
+def test_concurrent_identical_calls_keep_each_others_data(tmp_path):
+    Checkpoint("job", [["a", "b"]], root=str(tmp_path)).complete(total=2)
+    first = Checkpoint("job", [["a", "b"]], root=str(tmp_path))
+    first.record("a", 1)
+    first.flush()
+    second = Checkpoint("job", [["a", "b"]], root=str(tmp_path))
+    first.record("b", 2)
+    first.close()
+    second.close()
+    assert first.token == second.token
+    assert read_checkpoint("job", first.token, str(tmp_path))["done"] == {"a": 1, "b": 2}
+
+
+def test_timer_flushes_a_slow_tail(tmp_path, monkeypatch):
+    monkeypatch.setattr(mcp_checkpoint, "FLUSH_EVERY_S", 0.05)
+    run = Checkpoint("job", [["a", "b"]], root=str(tmp_path))
+    run.record("a", 1)
+    time.sleep(0.3)
+    assert read_checkpoint("job", run.token, str(tmp_path))["done"] == {"a": 1}
+    run.close()
+
+
+def test_explicit_token_reads_every_run(tmp_path):
+    for run in ("b", "c"):
+        checkpoint = Checkpoint("job", [], resume_token="t1", root=str(tmp_path))
+        checkpoint.record(run, 1)
+        checkpoint.close()
+    resumed = Checkpoint("job", [], resume_token="t1", root=str(tmp_path))
+    assert set(resumed.done) == {"b", "c"}
+    resumed.close()
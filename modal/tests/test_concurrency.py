@@ -0,0 +1,122 @@
+"""Adaptive concurrency: latency feedback, memory watermarks and the in-flight byte budget"""
+
+import threading
+
+import pytest
+
+import mcp_concurrency
+from mcp_concurrency import PARSE_MEMORY_FACTOR, AdaptiveConcurrency
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def rss(monkeypatch):
+    """Resident set size the limiter sees, settable by the test"""
+    current = {"bytes": 100 * MB}
+    monkeypatch.setattr(mcp_concurrency, "current_rss_bytes", lambda: current["bytes"])
+    return current
+
+
+def acquire_in_thread(limiter):
+    """Start an acquire() in the background; the returned event is set once it is admitted"""
+    admitted = threading.Event()
+    threading.Thread(target=lambda: (limiter.acquire(), admitted.set()), daemon=True).start()
+    return admitted
+
+
+def run_items(limiter, count, latency_s):
+    for _ in range(count):
+        limiter.release(limiter.acquire(), latency_s)
+
+
+def test_limit_grows_one_per_round_at_steady_latency(rss):
+    limiter = AdaptiveConcurrency(initial=2, memory_limit=1024 * MB)
+    # Rounds of 2, 3 and 4 completions
+    run_items(limiter, 9, 0.1)
+    assert limiter.limit == 5
+    assert [p["reason"] for p in limiter.trajectory] == ["initial", "increase", "increase", "increase"]
+
+
+def test_limit_backs_off_when_latency_climbs(rss):
+    limiter = AdaptiveConcurrency(initial=8, memory_limit=1024 * MB)
+    run_items(limiter, 8, 0.1)
+    assert limiter.limit == 9
+    run_items(limiter, 9, 1.0)
+    assert limiter.limit == 6
+    assert limiter.trajectory[-1]["reason"] == "latency"
+    assert limiter.report()["latency_baseline_s"] == pytest.approx(0.1, abs=0.01)
+
+
+def test_limit_stays_within_bounds(rss):
+    limiter = AdaptiveConcurrency(initial=3, max_limit=3, memory_limit=1024 * MB)
+    run_items(limiter, 12, 0.1)
+    assert limiter.limit == 3
+
+
+def test_hard_watermark_halves_the_limit_immediately(rss):
+    limiter = AdaptiveConcurrency(initial=8, memory_limit=1024 * MB)
+    reserved = limiter.acquire()
+    rss["bytes"] = 900 * MB
+    limiter.release(reserved, 0.1)
+    assert limiter.limit == 4
+    assert limiter.trajectory[-1]["reason"] == "memory"
+    assert limiter.report()["peak_rss_mb"] == 900
+
+
+def test_no_second_slot_above_the_hard_watermark(rss):
+    limiter = AdaptiveConcurrency(initial=8, memory_limit=1024 * MB)
+    held = limiter.acquire()
+    rss["bytes"] = 900 * MB
+    admitted = acquire_in_thread(limiter)
+    assert not admitted.wait(0.2)
+    assert limiter.memory_waits == 1
+    rss["bytes"] = 100 * MB
+    assert admitted.wait(2)
+    assert limiter.in_flight == 2
+    limiter.release(held)
+
+
+def test_byte_budget_tracks_observed_page_sizes(rss):
+    rss["bytes"] = 50 * MB
+    # Soft watermark (70 MB) minus start RSS is below the floor, so the budget is 64 MB
+    limiter = AdaptiveConcurrency(initial=8, memory_limit=100 * MB)
+    assert limiter.byte_budget == 64 * MB
+    with limiter.slot() as slot:
+        assert limiter.in_flight_bytes == slot.reserved == 256 * 1024 * PARSE_MEMORY_FACTOR
+        slot.observe_bytes(7 * MB)
+        assert limiter.in_flight_bytes == slot.reserved == 7 * MB * PARSE_MEMORY_FACTOR
+        # The page-size estimate moved towards 7 MB, so the next reservation no longer fits
+        admitted = acquire_in_thread(limiter)
+        assert not admitted.wait(0.2)
+        assert limiter.memory_waits == 1
+        # A smaller real size hands the difference back to the budget
+        slot.observe_bytes(1 * MB)
+        assert limiter.in_flight_bytes == 1 * MB * PARSE_MEMORY_FACTOR
+        assert admitted.wait(2)
+    assert limiter.in_flight == 1
+    assert limiter.report()["peak_in_flight_mb"] == 7 * PARSE_MEMORY_FACTOR
+
+
+def test_single_oversized_item_is_always_admitted(rss):
+    rss["bytes"] = 50 * MB
+    limiter = AdaptiveConcurrency(initial=4, memory_limit=100 * MB)
+    with limiter.slot() as slot:
+        slot.observe_bytes(64 * MB)
+    # The next estimate alone exceeds the byte budget and memory is over the hard watermark,
+    # but with nothing in flight the item still runs
+    rss["bytes"] = 90 * MB
+    assert limiter.page_bytes * PARSE_MEMORY_FACTOR > limiter.byte_budget
+    admitted = acquire_in_thread(limiter)
+    assert admitted.wait(2)
+    assert limiter.in_flight == 1
+    assert not acquire_in_thread(limiter).wait(0.2)
+
+
+def test_failed_items_do_not_feed_latency(rss):
+    limiter = AdaptiveConcurrency(initial=2, memory_limit=1024 * MB)
+    with pytest.raises(RuntimeError):
+        with limiter.slot():
+            raise RuntimeError("fetch failed")
+    assert limiter.latency_ewma is None
+    assert limiter.in_flight == 0 and limiter.in_flight_bytes == 0
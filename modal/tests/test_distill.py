@@ -0,0 +1,70 @@
+"""Boilerplate stripping, chunking and budget packing (word-piece token estimate without tiktoken)"""
+
+from mcp_distill import chunk_blocks, count_tokens, distill, pack_chunks
+
+PROSE = "Solar panel efficiency improved again this year thanks to perovskite tandem cells. "
+
+
+def test_strips_chrome_and_keeps_content():
+    html = f"""<html><body>
+      <nav><a href="/">Home</a><a href="/about">About us and the team</a></nav>
+      <div class="cookie-banner">We use cookies to improve your experience on this website.</div>
+      <div class="has-sidebar"><p>{PROSE}</p></div>
+      <footer><p>Copyright 2026 Example Corp, all rights reserved worldwide.</p></footer>
+    </body></html>"""
+    result = distill(html, "solar")
+    assert "perovskite" in result["text"]
+    for chrome in ("About us", "cookies", "Copyright"):
+        assert chrome not in result["text"]
+    assert result["fallback"] is None
+    assert result["chars_removed"] > 0
+
+
+def test_large_prose_container_with_chrome_class_is_kept():
+    html = f"<div class='sidebar'><p>{PROSE * 10}</p></div>"
+    assert "perovskite" in distill(html)["text"]
+
+
+def test_chunks_repeat_their_heading_and_stay_small():
+    blocks = [("h2", "Results"), ("p", PROSE * 20), ("h2", "Methods"), ("p", PROSE)]
+    chunks = chunk_blocks(blocks, max_tokens=64)
+    assert len(chunks) > 2
+    assert all(c["tokens"] <= 64 + count_tokens("## Results\n") for c in chunks)
+    assert chunks[0]["text"].startswith("## Results")
+    assert chunks[-1]["heading"] == "Methods"
+
+
+def test_block_without_sentence_breaks_is_split():
+    html = "<div class='content'><p>" + "word " * 2000 + "</p></div>"
+    result = distill(html, "word", token_budget=300)
+    assert result["chunks_kept"] >= 1
+    assert 0 < result["tokens_after"] <= 300
+
+
+def test_oversized_single_token_run_is_split():
+    blocks = [("pre", "x" * 5000)]
+    assert all(c["tokens"] <= 64 for c in chunk_blocks(blocks, max_tokens=64))
+
+
+def test_packing_prefers_relevant_chunks_in_document_order():
+    chunks = chunk_blocks([("h2", "Weather"), ("p", "Rain and wind are forecast for the coast tomorrow " * 3),
+                           ("h2", "Energy"), ("p", "Solar panel efficiency records were broken this spring " * 3)],
+                          max_tokens=64)
+    budget = max(c["tokens"] for c in chunks)
+    selected = pack_chunks(chunks, "solar panel efficiency", budget)
+    assert [c["heading"] for c in selected] == ["Energy"]
+    everything = pack_chunks(chunks, "solar", sum(c["tokens"] for c in chunks))
+    assert [c["position"] for c in everything] == sorted(c["position"] for c in chunks)
+
+
+def test_falls_back_when_stripping_leaves_nothing():
+    html = f"<nav><p>{PROSE}</p></nav>"
+    result = distill(html, "solar")
+    assert result["fallback"] == "blocks"
+    assert "perovskite" in result["text"]
+
+
+def test_empty_page_counts_no_savings():
+    result = distill("<html><body><script>var x = 1;</script></body></html>")
+    assert result["text"] == ""
+    assert result["chars_removed"] == 0 and result["tokens_saved"] == 0
@@ -0,0 +1,49 @@
+"""Field mapping and submit detection from recorded agent steps"""
+
+from mcp_form_cache import learn_mapping, match_fields
+
+FIELDS = [
+    {"tag": "input", "type": "text", "name": "email", "id": "", "label": "Email", "selector": 'input[name="email"]'},
+    {"tag": "input", "type": "radio", "name": "plan", "value": "free", "selector": 'input[name="plan"][value="free"]',
+     "group": 'input[type="radio"][name="plan"]'},
+    {"tag": "input", "type": "radio", "name": "plan", "value": "pro", "selector": 'input[name="plan"][value="pro"]',
+     "group": 'input[type="radio"][name="plan"]'},
+    {"tag": "input", "type": "checkbox", "name": "terms", "value": "on", "selector": 'input[name="terms"][value="on"]'},
+    {"tag": "button", "type": "submit", "name": "", "id": "go", "selector": '[id="go"]'}
+]
+
+
+def step(action, selector=None, url="https://example.com/form", **extra):
+    return {"action": action, "selector": selector, "checkpoint": {"url": url}, **extra}
+
+
+def test_radio_maps_to_its_group():
+    mapping = match_fields({"plan": "pro"}, FIELDS)
+    assert mapping["plan"] == {"selector": 'input[type="radio"][name="plan"]', "type": "radio"}
+
+
+def test_radio_click_is_not_the_submit():
+    steps = [
+        step("fill", 'input[name="email"]', text="a@example.com"),
+        step("click", '[id="go"]'),
+        step("click", 'input[name="plan"][value="pro"]'),
+        step("done", url="https://example.com/thanks")
+    ]
+    mapping = learn_mapping({"email": "a@example.com", "plan": "pro"}, steps, FIELDS)
+    assert mapping["submit_selector"] == '[id="go"]'
+    assert mapping["fields"]["plan"]["selector"] == 'input[type="radio"][name="plan"]'
+    assert mapping["fields"]["email"] == {"selector": 'input[name="email"]', "type": "text"}
+
+
+def test_click_before_navigation_is_the_submit_without_a_submit_control():
+    steps = [
+        step("click", 'input[name="terms"][value="on"]'),
+        step("click", "xpath=/html/body/div/a"),
+        step("done", url="https://example.com/thanks")
+    ]
+    assert learn_mapping({}, steps, FIELDS)["submit_selector"] == "xpath=/html/body/div/a"
+
+
+def test_no_submit_when_nothing_navigated():
+    steps = [step("click", 'input[name="terms"][value="on"]'), step("done")]
+    assert learn_mapping({}, steps, FIELDS)["submit_selector"] is None
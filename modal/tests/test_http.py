@@ -0,0 +1,40 @@
+"""Phase-timed fetching against a local HTTP server"""
+
+import socket
+
+import pytest
+
+import mcp_http
+from mcp_http import HostPool, timed_get
+
+ROUTES = {
+    "/caf%C3%A9": (200, {}, b"unicode path"),
+    "/a%20b": (200, {}, b"spaced path"),
+    "/start": (302, {"Location": "/a b"}, b"")
+}
+
+
+@pytest.mark.parametrize("pooled", [False, True])
+@pytest.mark.parametrize("path, body", [("/café", b"unicode path"), ("/a b", b"spaced path"),
+                                        ("/a%20b", b"spaced path"), ("/start", b"spaced path")])
+def test_paths_are_percent_encoded(server_url, pooled, path, body):
+    pool = HostPool() if pooled else None
+    response = timed_get(server_url + path, timeout=5, pool=pool)
+    assert (response.status_code, response.content) == (200, body)
+
+
+def test_rejects_host_less_urls():
+    with pytest.raises(ValueError):
+        timed_get("example.com/path")
+
+
+def test_falls_back_to_the_next_address(server_url, monkeypatch):
+    port = int(server_url.rsplit(":", 1)[1])
+    # A closed port first, as an unreachable IPv6 address would be
+    with socket.socket() as closed:
+        closed.bind(("127.0.0.1", 0))
+        dead = closed.getsockname()
+    infos = [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", dead),
+             (socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", ("127.0.0.1", port))]
+    monkeypatch.setattr(mcp_http.socket, "getaddrinfo", lambda *args, **kwargs: infos)
+    assert timed_get(server_url + "/a%20b", timeout=5).content == b"spaced path"
@@ -0,0 +1,75 @@
+"""MicroBatcher coalescing and the CPU test mode of the inference client"""
+
+import asyncio
+import math
+
+from mcp_inference import InferenceClient, InferenceEngine, MicroBatcher
+
+
+def run_batcher(items, **kwargs):
+    batches = []
+
+    def run_batch(batch):
+        batches.append(list(batch))
+        return [item * 10 for item in batch]
+
+    async def main():
+        batcher = MicroBatcher(run_batch, **kwargs)
+        results = await asyncio.gather(*(batcher.submit(item) for item in items))
+        return results, batcher.report()
+
+    results, report = asyncio.run(main())
+    return results, batches, report
+
+
+def test_concurrent_requests_share_one_batch():
+    results, batches, report = run_batcher(list(range(10)), max_wait_ms=50)
+    assert results == [i * 10 for i in range(10)]
+    assert batches == [list(range(10))]
+    assert report["batches"] == 1
+    assert report["max_batch"] == 10
+
+
+def test_full_batches_run_without_waiting():
+    _, batches, _ = run_batcher(list(range(10)), max_batch_size=4, max_wait_ms=100)
+    assert [len(b) for b in batches] == [4, 4, 2]
+
+
+def test_buckets_are_batched_separately():
+    results, batches, _ = run_batcher(list(range(8)), bucket_of=lambda item: item % 2, max_wait_ms=20)
+    assert results == [i * 10 for i in range(8)]
+    assert sorted(batches) == [[0, 2, 4, 6], [1, 3, 5, 7]]
+
+
+def test_batch_errors_reach_every_caller():
+    def run_batch(batch):
+        raise RuntimeError("model failed")
+
+    async def main():
+        batcher = MicroBatcher(run_batch, max_wait_ms=5)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in asyncio.run(main()))
+
+
+def test_hashed_engine_buckets_texts_by_length():
+    engine = InferenceEngine(backend="hashed", max_wait_ms=20)
+    texts = ["short text", "another short one", " ".join(["word"] * 100)]
+    vectors = asyncio.run(engine.embed_texts(texts))
+    report = engine.report()["text"]
+    assert len(vectors) == 3
+    assert report["items"] == 3
+    assert report["batches"] == 2
+
+
+def test_local_client_cpu_mode(monkeypatch):
+    monkeypatch.setenv("MCP_INFERENCE_MODE", "local")
+    monkeypatch.setenv("MCP_INFERENCE_BACKEND", "hashed")
+    client = InferenceClient(service=object)
+    assert client.local
+    first, second, other = client.embed_texts(["solar panels", "solar panels", "roman history"])
+    assert first == second
+    assert math.isclose(sum(v * v for v in first), 1.0)
+    assert sum(a * b for a, b in zip(first, other)) < 0.5
+    assert client.embed_text("solar panels") == first
+    assert client.embed_texts([]) == []
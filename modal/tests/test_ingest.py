@@ -0,0 +1,52 @@
+"""Source kind dispatch (local and remote) and digest deduplication"""
+
+import pytest
+
+from mcp_ingest import DigestSet, iter_source, source_kind, unique_urls
+
+SITEMAP = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+<url><loc>https://example.com/a</loc></url><url><loc>https://example.com/b</loc></url>
+</urlset>"""
+
+ROUTES = {
+    "/list": (200, {"Content-Type": "text/plain"}, b"https://example.com/1\n# comment\nhttps://example.com/2\n"),
+    "/export.csv": (200, {"Content-Type": "application/octet-stream"}, b"id,url\n1,https://example.com/c\n"),
+    "/feed": (200, {"Content-Type": "application/xml"}, SITEMAP),
+    "/unlabelled": (200, {"Content-Type": "application/octet-stream"}, b"  " + SITEMAP)
+}
+
+
+def test_local_kinds_by_extension():
+    assert source_kind("urls.csv.gz") == "csv"
+    assert source_kind("sitemap.xml") == "sitemap"
+    assert source_kind("urls") == "lines"
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("/list", ["https://example.com/1", "https://example.com/2"]),
+    ("/export.csv?token=x", ["https://example.com/c"]),
+    ("/feed", ["https://example.com/a", "https://example.com/b"]),
+    ("/unlabelled", ["https://example.com/a", "https://example.com/b"])
+])
+def test_remote_sources_dispatch_on_extension_and_content(server_url, path, expected):
+    assert list(iter_source(server_url + path)) == expected
+
+
+def test_local_csv_column(tmp_path):
+    (tmp_path / "urls.csv").write_text("name,link\nx,https://example.com/x\n")
+    assert list(iter_source({"path": "urls.csv", "column": "link"}, root=str(tmp_path))) == ["https://example.com/x"]
+
+
+def test_digest_set_is_exact():
+    seen = DigestSet()
+    assert seen.add(5) and seen.add(2 ** 64 - 1) and seen.add(5 << 50)
+    assert not seen.add(5)
+    assert 5 in seen and 6 not in seen and len(seen) == 3
+
+
+def test_unique_urls_counts():
+    stats = {}
+    urls = list(unique_urls(["https://A.com/x", "https://a.com/x#top", "mailto:me@a.com", "https://a.com/y"], stats))
+    assert urls == ["https://a.com/x", "https://a.com/y"]
+    assert stats == {"read": 4, "invalid": 1, "duplicates": 1}
@@ -0,0 +1,48 @@
+"""Link graph interning, redirects and checkpoint replay"""
+
+from mcp_linkgraph import LinkGraphBuilder, analyze_link_graph
+
+A = "https://example.com/"
+B = "https://example.com/b"
+C = "https://example.com/c"
+OLD_B = "https://example.com/old-b"
+
+
+def test_redirected_page_is_one_node():
+    graph = LinkGraphBuilder()
+    # a links to b's old address before b's fetch (requested as old-b) lands on b
+    graph.add_page(A, [OLD_B, C])
+    graph.add_page(B, [A], aliases=[OLD_B])
+    result = analyze_link_graph(graph)
+    assert result["nodes"] == 3
+    assert result["pages"][B]["in_degree"] == 1
+    assert result["orphan_pages"] == []
+
+
+def test_alias_seen_after_the_page():
+    graph = LinkGraphBuilder()
+    graph.add_page(B, [A], aliases=[OLD_B])
+    graph.add_page(A, [OLD_B])
+    result = analyze_link_graph(graph)
+    assert result["nodes"] == 2
+    assert result["pages"][B]["in_degree"] == 1
+
+
+def test_replayed_records_rebuild_the_graph():
+    graph = LinkGraphBuilder()
+    records = []
+    graph.add_page(A, [B, C], on_record=records.append)
+    graph.add_page(B, [A, OLD_B], aliases=[OLD_B], on_record=records.append)
+    replayed = LinkGraphBuilder()
+    assert all(replayed.add_record(record) for record in records)
+    assert replayed.urls == graph.urls
+    assert (replayed.to_csr() != graph.to_csr()).nnz == 0
+    assert analyze_link_graph(replayed) == analyze_link_graph(graph)
+
+
+def test_out_of_order_record_is_rejected():
+    graph = LinkGraphBuilder()
+    records = []
+    graph.add_page(A, [B], on_record=records.append)
+    graph.add_page(C, [A], on_record=records.append)
+    assert not LinkGraphBuilder().add_record(records[1])
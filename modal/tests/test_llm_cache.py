@@ -0,0 +1,119 @@
+"""Response cache behaviour with the offline StubLLM (no API keys or Modal Dict needed)"""
+
+import asyncio
+import json
+import time
+
+from mcp_llm import PRUNE_INTERVAL_S, PRUNE_MARKER_KEY, CachedLLM, LLMCache, StubLLM, research_llm
+
+
+def ask(llm, *messages):
+    return asyncio.run(llm.ainvoke(list(messages)))
+
+
+def test_exact_hit_skips_the_model():
+    stub = StubLLM(latency_s=0)
+    llm = CachedLLM(stub, LLMCache(store={}))
+    first = ask(llm, {"role": "user", "content": "Summarize example.com"})
+    second = ask(llm, {"role": "user", "content": "Summarize example.com"})
+    assert stub.calls == 1
+    assert second.completion == first.completion
+    assert llm.report()["exact_hits"] == 1
+    assert llm.report()["hit_ratio"] == 0.5
+
+
+def test_exact_key_ignores_whitespace_and_timestamps():
+    stub = StubLLM(latency_s=0)
+    llm = CachedLLM(stub, LLMCache(store={}))
+    ask(llm, {"role": "user", "content": "State at 2025-01-06 12:00:01:  page   loaded"})
+    ask(llm, {"role": "user", "content": "State at 2025-01-07 08:30:59: page loaded"})
+    assert stub.calls == 1
+
+
+def test_exact_key_keeps_dates_in_content():
+    stub = StubLLM(latency_s=0)
+    llm = CachedLLM(stub, LLMCache(store={}))
+    ask(llm, {"role": "user", "content": "Book the 2025-01-06 12:00 flight"})
+    ask(llm, {"role": "user", "content": "Book the 2025-01-07 12:00 flight"})
+    ask(llm, {"role": "user", "content": "Current date and time: 2025-01-07 09:15\nBook the 2025-01-07 12:00 flight"})
+    ask(llm, {"role": "user", "content": "Current date and time: 2025-01-08 10:40\nBook the 2025-01-07 12:00 flight"})
+    assert stub.calls == 3
+
+
+def test_shared_store_serves_other_containers():
+    store = {}
+    ask(CachedLLM(StubLLM(latency_s=0), LLMCache(store=store)), {"role": "user", "content": "hello"})
+    stub = StubLLM(latency_s=0)
+    llm = CachedLLM(stub, LLMCache(store=store))
+    ask(llm, {"role": "user", "content": "hello"})
+    assert stub.calls == 0
+    assert llm.report()["exact_hits"] == 1
+
+
+def test_semantic_hit_for_near_duplicate_prompt():
+    stub = StubLLM(latency_s=0)
+    llm = CachedLLM(stub, LLMCache(store={}, semantic=True, similarity=0.85))
+    system = {"role": "system", "content": "You are a research analyst."}
+    ask(llm, system, {"role": "user", "content": "What are the main findings about solar panel efficiency in 2024?"})
+    ask(llm, system, {"role": "user", "content": "What are the main findings about solar panel efficiency in 2025?"})
+    ask(llm, system, {"role": "user", "content": "Summarize the history of the Roman empire"})
+    report = llm.report()
+    assert stub.calls == 2
+    assert report["semantic_hits"] == 1
+    assert report["misses"] == 2
+
+
+def test_semantic_tier_is_scoped_by_system_prompt():
+    stub = StubLLM(latency_s=0)
+    llm = CachedLLM(stub, LLMCache(store={}, semantic=True, similarity=0.85))
+    question = {"role": "user", "content": "What are the main findings about solar panel efficiency?"}
+    ask(llm, {"role": "system", "content": "Answer briefly."}, question)
+    ask(llm, {"role": "system", "content": "Answer in French."}, question)
+    assert stub.calls == 2
+
+
+def test_cache_off_always_calls_the_model():
+    stub = StubLLM(latency_s=0)
+    llm = CachedLLM(stub, None)
+    ask(llm, {"role": "user", "content": "hello"})
+    ask(llm, {"role": "user", "content": "hello"})
+    assert stub.calls == 2
+    assert llm.report()["misses"] == 2
+
+
+def test_stub_selected_by_environment(monkeypatch):
+    monkeypatch.setenv("MCP_LLM_STUB", "1")
+    assert isinstance(research_llm("off").llm, StubLLM)
+
+
+def test_expired_shared_entry_is_deleted_on_read():
+    store = {}
+    ask(CachedLLM(StubLLM(latency_s=0), LLMCache(store=store)), {"role": "user", "content": "hello"})
+    key = next(k for k in store if k != PRUNE_MARKER_KEY)
+    stub = StubLLM(latency_s=0)
+    llm = CachedLLM(stub, LLMCache(store=store, ttl_s=0.01))
+    time.sleep(0.02)
+    assert llm.cache.get_exact(key) is None
+    assert key not in store
+
+
+def test_prune_removes_only_expired_entries():
+    now = time.time()
+    store = {
+        "old": json.dumps({"completion": {"kind": "text", "value": "a"}, "created_at": now - 100}),
+        "new": json.dumps({"completion": {"kind": "text", "value": "b"}, "created_at": now}),
+        "broken": "{",
+        PRUNE_MARKER_KEY: json.dumps(now)
+    }
+    assert LLMCache(store=store, ttl_s=50).prune(now) == 2
+    assert set(store) == {"new", PRUNE_MARKER_KEY}
+
+
+def test_put_prunes_at_most_once_per_interval():
+    now = time.time()
+    store = {PRUNE_MARKER_KEY: json.dumps(now)}
+    ask(CachedLLM(StubLLM(latency_s=0), LLMCache(store=store)), {"role": "user", "content": "hello"})
+    assert json.loads(store[PRUNE_MARKER_KEY]) == now
+    store[PRUNE_MARKER_KEY] = json.dumps(now - PRUNE_INTERVAL_S - 1)
+    ask(CachedLLM(StubLLM(latency_s=0), LLMCache(store=store)), {"role": "user", "content": "other"})
+    assert json.loads(store[PRUNE_MARKER_KEY]) > now - 1
@@ -0,0 +1,47 @@
+"""Metrics shards: exact merge on read and compaction of exited containers' shards"""
+
+import json
+
+from mcp_metrics import (
+    COMPACTED_KEY, COMPACTION_LEASE_KEY, SHARD_PREFIX, SHARD_STALE_S, MetricsRegistry, load_merged_metrics
+)
+
+NOW = 1_700_000_000.0
+
+
+def shard(calls: int, updated_at: float) -> str:
+    registry = MetricsRegistry()
+    for _ in range(calls):
+        registry.record("lightweight_web_scraping", 0.2)
+    return json.dumps({**registry.snapshot(), "updated_at": updated_at})
+
+
+def total_calls(registry: MetricsRegistry) -> int:
+    return sum(histogram.total for histogram in registry.series.values())
+
+
+def test_stale_shards_are_compacted_without_changing_totals():
+    store = {
+        SHARD_PREFIX + "live": shard(3, NOW - 30),
+        SHARD_PREFIX + "exited-1": shard(5, NOW - SHARD_STALE_S - 1),
+        SHARD_PREFIX + "exited-2": shard(7, NOW - 2 * SHARD_STALE_S)
+    }
+    assert total_calls(load_merged_metrics(store, now=NOW)) == 15
+    assert sorted(store) == [COMPACTED_KEY, SHARD_PREFIX + "live"]
+    # The compacted shard accumulates across compactions
+    store[SHARD_PREFIX + "exited-3"] = shard(2, NOW - SHARD_STALE_S - 1)
+    assert total_calls(load_merged_metrics(store, now=NOW)) == 17
+    assert SHARD_PREFIX + "exited-3" not in store
+    assert total_calls(MetricsRegistry.from_snapshot(json.loads(store[COMPACTED_KEY]))) == 14
+
+
+def test_compaction_waits_for_another_readers_lease():
+    store = {
+        SHARD_PREFIX + "exited": shard(4, NOW - SHARD_STALE_S - 1),
+        COMPACTION_LEASE_KEY: json.dumps(NOW - 5)
+    }
+    assert total_calls(load_merged_metrics(store, now=NOW)) == 4
+    assert SHARD_PREFIX + "exited" in store and COMPACTED_KEY not in store
+    # An abandoned lease is taken over
+    assert total_calls(load_merged_metrics(store, now=NOW + 120)) == 4
+    assert sorted(store) == [COMPACTED_KEY]
@@ -0,0 +1,16 @@
+"""Site checks against a local HTTP server"""
+
+from mcp_monitoring import check_sites
+
+STATUSES = {"/ok": 200, "/moved": 301, "/gone": 410, "/forbidden": 403, "/broken": 503}
+ROUTES = {path: (status, {"Location": "/ok"} if status == 301 else {}, b"page") for path, status in STATUSES.items()}
+
+
+def test_client_errors_are_failed_checks(server_url):
+    checks = {c["url"].rsplit("/", 1)[1]: c for c in check_sites([server_url + path for path in STATUSES])}
+    assert checks["ok"]["success"] and checks["moved"]["success"]
+    for name in ("gone", "forbidden"):
+        assert not checks[name]["success"]
+        assert checks[name]["client_error"] is True
+        assert checks[name]["error"] == f"HTTP {checks[name]['status_code']}"
+    assert not checks["broken"]["success"] and checks["broken"]["client_error"] is False
@@ -0,0 +1,111 @@
+"""Router scheduler: class ordering, weighted fair queuing, SLO shedding and waiter cleanup"""
+
+import threading
+
+import pytest
+
+from mcp_scheduler import RouterScheduler, Shed
+
+
+def dispatch_order(scheduler, tickets, label):
+    """Labels of `tickets` in the order the scheduler lets them run, one slot at a time"""
+    holder = scheduler.submit("web_scraping", {"urls": ["u"]}, priority="interactive", caller="holder")
+    order = []
+
+    def run(ticket):
+        with scheduler.running(ticket):
+            order.append(ticket[label])
+
+    with scheduler.running(holder):
+        threads = [threading.Thread(target=run, args=(ticket,)) for ticket in tickets]
+        for thread in threads:
+            thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    return order
+
+
+def test_priority_classes_are_strictly_ordered():
+    scheduler = RouterScheduler(tier_limits={"cpu": 1})
+    tickets = [
+        scheduler.submit("web_scraping", {"urls": ["u"]}, priority=priority)
+        for priority in ("batch", "standard", "interactive", "batch", "interactive")
+    ]
+    assert dispatch_order(scheduler, tickets, "priority") == [
+        "interactive", "interactive", "standard", "batch", "batch"
+    ]
+
+
+def test_priority_defaults_to_task_size():
+    scheduler = RouterScheduler()
+    assert scheduler.submit("web_scraping", {"urls": ["u"]})["priority"] == "interactive"
+    assert scheduler.submit("web_scraping", {"urls": ["u"] * 5})["priority"] == "standard"
+    assert scheduler.submit("bulk_scraping", {"source": "urls.csv"})["priority"] == "batch"
+
+
+def test_weighted_fair_queuing_between_callers():
+    scheduler = RouterScheduler(tier_limits={"cpu": 1}, weights={"a": 3})
+    tickets = []
+    for _ in range(6):
+        for caller in ("a", "b"):
+            tickets.append(scheduler.submit("web_scraping", {"urls": ["u", "v"]}, "standard", caller))
+    order = dispatch_order(scheduler, tickets, "caller")
+    # Weight 3 against 1: a gets three dispatches for each of b's while both have work queued
+    assert order[:4].count("a") == 3
+    assert order[:8].count("a") == 6
+
+
+def test_burst_does_not_starve_a_late_caller():
+    scheduler = RouterScheduler(tier_limits={"cpu": 1})
+    tickets = [scheduler.submit("web_scraping", {"urls": ["u"] * 2}, "standard", "burst") for _ in range(5)]
+    tickets.append(scheduler.submit("web_scraping", {"urls": ["u"] * 2}, "standard", "late"))
+    assert dispatch_order(scheduler, tickets, "caller").index("late") == 1
+
+
+def test_sheds_with_retry_after_once_the_slo_would_be_missed():
+    scheduler = RouterScheduler(tier_limits={"T4": 1})
+    # Enough completed dispatches to trust the estimate, at 10 s per record
+    scheduler.tiers["T4"].update(samples=3, unit_s=10.0)
+    running = scheduler.submit("data_processing", {"data": [1] * 4}, "standard")
+    with scheduler.running(running):
+        scheduler.submit("data_processing", {"data": [1] * 10}, "standard")
+        # Nothing interactive is queued, but the running job holds the only slot for ~20 s
+        with pytest.raises(Shed) as shed:
+            scheduler.submit("data_processing", {"data": [1]}, "interactive")
+        assert shed.value.retry_after == 18.0
+        assert shed.value.info["tier"] == "T4"
+        with pytest.raises(Shed) as shed:
+            scheduler.submit("data_processing", {"data": [1] * 2}, "standard")
+        assert shed.value.retry_after == 90.0
+        # 120 s is within the batch SLO
+        assert scheduler.submit("data_processing", {"data": [1] * 2}, "batch")["estimated_wait_s"] == 120.0
+        assert scheduler.stats()["T4"]["shed"] == 2
+
+
+def test_sheds_on_queue_depth_before_any_samples():
+    scheduler = RouterScheduler(max_queue_depth=2)
+    for _ in range(2):
+        scheduler.submit("web_scraping", {"urls": ["u"]})
+    with pytest.raises(Shed) as shed:
+        scheduler.submit("web_scraping", {"urls": ["u"]})
+    assert shed.value.retry_after == 1.0
+
+
+def test_interrupted_waiter_leaves_the_queue(monkeypatch):
+    scheduler = RouterScheduler(tier_limits={"cpu": 1})
+    holder = scheduler.submit("web_scraping", {"urls": ["u"]})
+    waiter = scheduler.submit("web_scraping", {"urls": ["u"]})
+    behind = scheduler.submit("web_scraping", {"urls": ["u"]})
+    with scheduler.running(holder):
+        def interrupted():
+            raise KeyboardInterrupt
+        monkeypatch.setattr(scheduler._cond, "wait", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            with scheduler.running(waiter):
+                pass
+        monkeypatch.undo()
+        assert scheduler.stats()["cpu"]["queue_depth"] == 1
+    # The ticket behind the interrupted one is now first and runs
+    with scheduler.running(behind):
+        stats = scheduler.stats()["cpu"]
+        assert (stats["in_flight"], stats["queue_depth"]) == (1, 0)
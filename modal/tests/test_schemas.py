@@ -0,0 +1,55 @@
+"""Typed wire formats round-trip to the worker's exact dicts"""
+
+import pytest
+
+import mcp_schemas
+from mcp_schemas import ScrapeResult, UrlAnalysisResult, pack_result, result_to_dict, unpack_result
+
+HEADERS = {"content-type": "text/html", "server": "nginx"}
+
+
+@pytest.fixture(autouse=True)
+def no_published_dictionary(monkeypatch):
+    monkeypatch.setattr(mcp_schemas, "load_dictionary", lambda dict_id=None, store=None: None)
+
+
+ANALYSIS = {
+    "success": True,
+    "analysis_type": "comprehensive",
+    "aggregated_stats": {"total_urls": 3},
+    "link_graph": None,
+    "detailed_results": [
+        {"url": "https://a.example/", "success": True, "load_time": 0.2, "status_code": 200, "title": None,
+         "meta_description": "", "response_headers": dict(HEADERS), "dns_ms": None},
+        {"url": "https://b.example/", "success": True, "load_time": 0.3, "status_code": 200, "title": "B",
+         "meta_description": "", "response_headers": {**HEADERS, "etag": "x"}, "dns_ms": 1.5},
+        {"url": "https://c.example/", "success": False, "error": "timeout", "load_time": 0}
+    ],
+    "checkpoint": {"resume_token": "t"},
+    "processing_info": {"gpu_used": "A10G"}
+}
+
+
+@pytest.mark.parametrize("wire_format", ["msgpack", "msgpack+zstd"])
+def test_analysis_round_trip_keeps_key_sets(wire_format):
+    payload = pack_result(ANALYSIS, UrlAnalysisResult, wire_format)
+    assert result_to_dict(unpack_result(payload, UrlAnalysisResult)) == ANALYSIS
+
+
+def test_error_result_gains_no_records():
+    error = {"success": False, "error": "No URLs provided", "urls_count": 0}
+    payload = pack_result(error, UrlAnalysisResult, "msgpack")
+    assert result_to_dict(unpack_result(payload, UrlAnalysisResult)) == error
+
+
+def test_scrape_round_trip_with_interned_content():
+    page = "same mirror page " * 10
+    scrape = {
+        "success": True,
+        "results": [{"url": f"https://{n}.example/", "success": True, "content": page, "status_code": 200,
+                     "content_type": None} for n in "ab"],
+        "total_urls": 2,
+        "successful_extractions": 2
+    }
+    payload = pack_result(scrape, ScrapeResult, "msgpack+zstd")
+    assert result_to_dict(unpack_result(payload, ScrapeResult)) == scrape
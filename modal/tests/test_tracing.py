@@ -0,0 +1,16 @@
+"""Tracer.finish: span summary and sampled payload measurement"""
+
+from mcp_tracing import Tracer
+
+
+def test_finish_skips_payload_measurement_unless_sampled():
+    result = Tracer("fn", {"measure_payload": False}).finish({"success": True, "data": "x" * 1000})
+    assert "serialize" not in result["processing_info"]["trace"]["stages"]
+
+
+def test_finish_measures_payload_when_asked():
+    tracer = Tracer("fn", {"measure_payload": True, "include_spans": True})
+    result = tracer.finish({"success": True, "data": "x" * 1000})
+    assert result["processing_info"]["trace"]["stages"]["serialize"]["count"] == 1
+    serialize = next(span for span in tracer.spans() if span["name"] == "serialize")
+    assert serialize["attributes"]["payload_bytes"] > 1000